@@ -1,15 +1,144 @@
+import os
+import threading
+import click
 from flask import Flask
 from flask_cors import CORS
 from routes import init_routes
+from db import configure as configure_database, setup_database
+from facets import facet_lists
+from images import image_cache
+from json_provider import FastJSONProvider
+from clusters import cluster_pyramid
+from heatmap import sighting_points
+from snapshot import snapshot
+from trigrams import trigram_index
+from stats import sighting_stats
+from loader import LOAD_BATCH_SIZE, LOAD_WORKERS, load_csv, needs_full_load, sync_csv
 
-# Initialize Flask app
-app = Flask(__name__, static_folder="static/dist", static_url_path="/")
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
 
-# Enable Cross-Origin Resource Sharing (CORS)
-CORS(app, resources={r"/*": {"origins": "*", "allow_headers": ["Content-Type"]}})
 
-# Initialize routes
-init_routes(app)
+def warm_up(config):
+    """Prepare a serving process: build the in-memory indexes and start the background refreshes.
+
+    ``SETUP_DATABASE`` runs setup_database() first, ``UFO_SNAPSHOT`` serves searches from
+    the snapshot (cold-starting from ``UFO_SNAPSHOT_FILE``) and ``UFO_IMAGE_WARMUP``
+    preloads the referenced GridFS images.
+    """
+    try:
+        if config["SETUP_DATABASE"]:
+            setup_database()
+        facet_lists.warm()
+        sighting_stats.refresh()
+        cluster_pyramid.build()
+        sighting_points.load()
+        trigram_index.build()
+        if config["UFO_SNAPSHOT"]:
+            snapshot.start(config["UFO_SNAPSHOT_FILE"])
+        if config["UFO_IMAGE_WARMUP"]:
+            image_cache.warm()
+    except Exception as e:
+        # Every structure still builds itself on first use
+        print(f"Warm-up failed: {e}")
+
+
+def start_warm_up(config):
+    """Run warm_up() in a background thread, once per process (a no-op without ``WARM_UP``)."""
+    global _warm_up_thread
+    if not config["WARM_UP"]:
+        return
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=warm_up, args=(config,), name="warm-up", daemon=True)
+            _warm_up_thread.start()
+
+
+def create_app(config=None):
+    """Build the Flask app. ``MONGO_*`` keys in ``config`` override the MongoDB client settings.
+
+    Nothing connects to MongoDB until the first query. The first request starts
+    warm_up() in the background, whichever server runs the app (``WARM_UP``, from
+    ``UFO_WARMUP=0``, turns it off); CLI commands never trigger it.
+    """
+    app = Flask(__name__, static_folder="static/dist", static_url_path="/")
+    if config:
+        app.config.from_mapping(config)
+    configure_database(app.config)
+    app.config.setdefault("WARM_UP", os.environ.get("UFO_WARMUP", "1") != "0")
+    app.config.setdefault("SETUP_DATABASE", False)
+    # Serve searches from an in-memory snapshot with UFO_SNAPSHOT=1, cold-starting from UFO_SNAPSHOT_FILE
+    app.config.setdefault("UFO_SNAPSHOT", os.environ.get("UFO_SNAPSHOT") == "1")
+    app.config.setdefault("UFO_SNAPSHOT_FILE", os.environ.get("UFO_SNAPSHOT_FILE"))
+    # Preload the referenced GridFS images unless disabled with UFO_IMAGE_WARMUP=0
+    app.config.setdefault("UFO_IMAGE_WARMUP", os.environ.get("UFO_IMAGE_WARMUP", "1") != "0")
+
+    @app.before_request
+    def warm_up_on_first_request():
+        start_warm_up(app.config)
+
+    # Serialize responses with orjson when available (ObjectId and datetime handled natively)
+    app.json = FastJSONProvider(app)
+
+    # Enable Cross-Origin Resource Sharing (CORS)
+    CORS(app, resources={r"/*": {"origins": "*", "allow_headers": ["Content-Type"]}})
+
+    # Initialize routes
+    init_routes(app)
+
+    @app.cli.command("setup-db")
+    def setup_database_command():
+        """Backfill derived fields and create the MongoDB indexes used by the API (for WSGI deployments, e.g. gunicorn)."""
+        setup_database()
+
+    @app.cli.command("load-dataset")
+    @click.argument("csv_path")
+    @click.option("--incremental", is_flag=True,
+                  help="Only write new and changed rows and remove deleted ones, resuming an interrupted run.")
+    @click.option("--batch-size", default=LOAD_BATCH_SIZE, show_default=True, help="Sightings per insert_many.")
+    @click.option("--workers", default=LOAD_WORKERS, show_default=True, help="Concurrent insert_many calls.")
+    def load_dataset_command(csv_path, incremental, batch_size, workers):
+        """Load ufo_scrubbed.csv into the sightings collection, replacing its contents (GridFS images must be loaded first)."""
+        if incremental and needs_full_load():
+            click.echo("No previously loaded sightings to compare with, running a full load")
+            incremental = False
+        if incremental:
+            result = sync_csv(csv_path)
+            if result.resumed_from:
+                click.echo(f"Resumed after line {result.resumed_from}")
+            click.echo(f"Inserted {result.inserted}, updated {result.updated}, removed {result.removed}, "
+                       f"unchanged {result.unchanged} sightings, rejected {result.rejected} rows")
+        else:
+            result = load_csv(csv_path, batch_size=batch_size, workers=workers)
+            click.echo(f"Loaded {result.inserted} sightings, rejected {result.rejected} rows")
+        for error in result.errors:
+            click.echo(f"  line {error['line']}: {error['error']}")
+        if not incremental:
+            # sync_csv() keeps the rollups current itself
+            sighting_stats.rebuild()
+
+    @app.cli.command("refresh-stats")
+    @click.option("--rebuild", is_flag=True, help="Recompute every rollup instead of folding in new sightings.")
+    def refresh_stats_command(rebuild):
+        """Fold newly inserted sightings into the materialized /stats rollups."""
+        if rebuild:
+            sighting_stats.rebuild()
+        else:
+            sighting_stats.refresh()
+
+    @app.cli.command("save-snapshot")
+    @click.argument("path")
+    def save_snapshot_command(path):
+        """Read the searchable fields from MongoDB into a snapshot file for UFO_SNAPSHOT_FILE."""
+        snapshot.build()
+        snapshot.save(path)
+
+    return app
+
+# Initialize Flask app (the target of `flask --app app` and `gunicorn app:app`)
+app = create_app()
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", debug=True, port=3000) 
+    # The development server also prepares the collection (flask setup-db for other servers)
+    app.config["SETUP_DATABASE"] = True
+    app.run(host="0.0.0.0", debug=True, port=3000)
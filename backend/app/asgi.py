@@ -0,0 +1,68 @@
+"""ASGI serving mode: ``uvicorn asgi:app --workers 4`` (or ``hypercorn asgi:app``) from backend/app.
+
+The search and sighting detail routes run natively on an async Quart app with the
+async MongoDB driver, so a worker keeps serving other requests while it waits on
+MongoDB and independent queries of one request run concurrently. Every other route
+(and ``format=`` exports) is served by the regular Flask app through an ASGI-to-WSGI
+adapter, so both modes expose the same API.
+"""
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart
+from werkzeug.exceptions import HTTPException
+from app import app as wsgi_app, start_warm_up
+from async_routes import init_async_routes
+from db import configure as configure_database
+from json_provider import FastJSONProvider
+
+
+def create_async_app(config=None):
+    """Build the Quart app serving the async routes (``MONGO_*`` keys as in create_app())."""
+    app = Quart(__name__)
+    if config:
+        app.config.from_mapping(config)
+    configure_database(app.config)
+    app.json = FastJSONProvider(app)
+    init_async_routes(app)
+
+    @app.before_serving
+    async def warm_up():
+        # Same startup work as the WSGI app, which shares this process's indexes
+        start_warm_up(wsgi_app.config)
+
+    @app.after_request
+    async def allow_any_origin(response):
+        # Same CORS policy as the WSGI app (whose flask-cors also answers the preflight requests)
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        return response
+
+    return app
+
+
+class AsyncDispatcher:
+    """ASGI app sending the requests the async app has a route for to it, and the rest to the WSGI app."""
+
+    def __init__(self, async_app, wsgi_app):
+        self.async_app = async_app
+        self.wsgi_app = WsgiToAsgi(wsgi_app)
+        self.adapter = async_app.url_map.bind("")
+
+    def handles(self, scope):
+        if scope["type"] != "http":
+            return True  # lifespan events
+        if scope["method"] == "OPTIONS" or b"format" in parse_qs(scope.get("query_string", b"")):
+            return False
+        try:
+            self.adapter.match(scope["path"], method=scope["method"])
+        except HTTPException:
+            return False
+        return True
+
+    async def __call__(self, scope, receive, send):
+        if self.handles(scope):
+            await self.async_app(scope, receive, send)
+        else:
+            await self.wsgi_app(scope, receive, send)
+
+
+app = AsyncDispatcher(create_async_app(), wsgi_app)
@@ -0,0 +1,212 @@
+import asyncio
+from bson import ObjectId
+from pymongo.errors import ExecutionTimeout
+from quart import request, jsonify
+from db import ufoSightingsAsync, fsAsync
+from images import image_cache, image_mimetype
+from snapshot import snapshot
+from trigrams import trigram_index
+from routes import (
+    ESTIMATE_COUNT_CAP, ESTIMATE_COUNT_TIMEOUT_MS, IMAGE_MODES, LIMIT, TEXT_SCORE,
+    add_comment_count, add_coordinates, bbox_query, build_page, field_query, keyword_query,
+    keyset_filter, match_mode, nearby_query, nearest_pipeline, page_body, parse_page_args,
+    query_key, search_options, search_projection, total_counts
+)
+
+# Field search routes and the name of their URL parameter
+FIELD_ROUTES = {"country": "country_code", "city": "city_name", "shape": "shape_name", "state": "state_code"}
+
+
+async def estimate_total(query):
+    """Async counterpart of routes.estimate_total()."""
+    try:
+        return await ufoSightingsAsync.count_documents(query, limit=ESTIMATE_COUNT_CAP, maxTimeMS=ESTIMATE_COUNT_TIMEOUT_MS)
+    except ExecutionTimeout:
+        return await ufoSightingsAsync.estimated_document_count()
+
+
+async def paginate(query, page, sort_field="_id", sort_order=1, after=None, projection=None, estimate=False, text_score=False):
+    """Async counterpart of routes.paginate().
+
+    Instead of one ``$facet`` round trip, an uncached total is counted concurrently
+    with the page query, so the page does not wait for the count to scan every match.
+    """
+    if not text_score and sort_field == "_id" and sort_order == 1:
+        served = snapshot.search(query, (page - 1) * LIMIT, after[1] if after else None, LIMIT + 1)
+        if served is not None:
+            return build_page(*served)
+
+    sort = [(sort_field, sort_order)]
+    if sort_field != "_id":
+        sort.append(("_id", sort_order))
+    if text_score:
+        after = None
+        sort = [("score", TEXT_SCORE), ("_id", 1)]
+        projection = dict(projection or {}, score=TEXT_SCORE)
+
+    mongo_query = trigram_index.narrow(query)
+    page_filter = keyset_filter(after, sort_field, sort_order) if after is not None else None
+    page_query = {"$and": [mongo_query, page_filter]} if page_filter else mongo_query
+    offset = 0 if after is not None else (page - 1) * LIMIT
+    fetch_page = (
+        ufoSightingsAsync.find(page_query, projection)
+        .sort(sort)
+        .skip(offset)
+        .limit(LIMIT + 1)
+        .to_list()
+    )
+
+    count_key = query_key(query)
+    total_results = total_counts.get(count_key)
+    estimated = False
+    if total_results is not None:
+        results = await fetch_page
+    elif estimate:
+        results, total_results = await asyncio.gather(fetch_page, estimate_total(mongo_query))
+        estimated = True
+    else:
+        results, total_results = await asyncio.gather(fetch_page, ufoSightingsAsync.count_documents(mongo_query))
+        total_counts.set(count_key, total_results)
+
+    return build_page(results, total_results, None if text_score else sort_field, estimated)
+
+
+async def paginate_nearest(query, near, page, after=None, projection=None):
+    """Async counterpart of routes.paginate_nearest(), with the count run concurrently."""
+    lon, lat, _ = near
+    served = snapshot.nearest(query, lon, lat, (page - 1) * LIMIT, after, LIMIT + 1)
+    if served is not None:
+        return build_page(*served, sort_field="distance_miles")
+
+    async def fetch_page():
+        cursor = await ufoSightingsAsync.aggregate(nearest_pipeline(query, near, page, after, projection))
+        return await cursor.to_list()
+
+    count_key = query_key(query)
+    total_results = total_counts.get(count_key)
+    if total_results is None:
+        results, total_results = await asyncio.gather(fetch_page(), ufoSightingsAsync.count_documents(query))
+        total_counts.set(count_key, total_results)
+    else:
+        results = await fetch_page()
+    return build_page(results, total_results, "distance_miles")
+
+
+async def paginated_response(query, sort_field="_id", sort_order=1, text_score=False, near=None):
+    """Async counterpart of routes.paginated_response() (``format=`` exports stay on the WSGI app)."""
+    try:
+        page, after, fields, estimate = parse_page_args(request.args)
+        query, sort_field, sort_order, text_score = search_options(
+            request.args, query, sort_field, sort_order, text_score, near
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    projection = search_projection(fields)
+    projection.setdefault(sort_field, 1)
+
+    if near is not None:
+        results, total, next_cursor, estimated = await paginate_nearest(query, near, page, after, projection)
+    else:
+        results, total, next_cursor, estimated = await paginate(
+            query, page, sort_field, sort_order, after, projection, estimate=estimate, text_score=text_score
+        )
+    return jsonify(page_body(results, total, next_cursor, estimated, page, fields))
+
+
+async def get_base64_encoded_image(img_id):
+    """Fetch and encode an image to Base64 through the shared image cache, reading misses with the async driver."""
+    try:
+        entry = image_cache.lookup(img_id)
+        if entry is None:
+            grid_out = await fsAsync.get(ObjectId(img_id))
+            entry = image_cache.put(img_id, await grid_out.read(), image_mimetype(grid_out))
+        return image_cache.encode(img_id, entry)
+    except Exception as e:
+        print(f"Error fetching image with ID {img_id}: {e}")
+        return None
+
+
+async def no_image():
+    return None
+
+
+def init_async_routes(app):
+
+    @app.route("/search_word", methods=['GET'])
+    async def search_sightings():
+        """Search for sightings using a keyword with pagination (see routes.search_sightings)."""
+        try:
+            query, text_score = keyword_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return await paginated_response(query, text_score=text_score)
+
+    @app.route("/search_nearby", methods=['GET'])
+    async def search_nearby():
+        """Find sightings within a radius with pagination (see routes.search_nearby)."""
+        try:
+            query, near = nearby_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return await paginated_response(query, near=near)
+
+    @app.route("/search_viewport", methods=['GET'])
+    async def search_viewport():
+        """Find sightings inside the map's visible area with pagination (see routes.search_viewport)."""
+        try:
+            query = bbox_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return await paginated_response(query)
+
+    def field_route(field, param):
+        async def search_field(**kwargs):
+            try:
+                match = match_mode(request.args)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            try:
+                return await paginated_response(field_query(field, kwargs[param], match))
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+        search_field.__name__ = f"search_{field}"
+        search_field.__doc__ = f"Search for sightings using a {field} (match=contains|exact|prefix) with pagination."
+        app.route(f"/sightings/{field}/<{param}>", methods=['GET'])(search_field)
+
+    for field, param in FIELD_ROUTES.items():
+        field_route(field, param)
+
+    @app.route("/sightings/comments/<comment>", methods=['GET'])
+    async def search_comments(comment):
+        """Search for sightings using a comment with pagination."""
+        return await paginated_response({"comments": {"$regex": comment, "$options": "i"}})
+
+    @app.route("/sighting/<sighting_id>", methods=['GET'])
+    async def get_sighting(sighting_id):
+        """Fetch full sighting details; the state and shape images are read concurrently."""
+        images = request.args.get("images", "base64")
+        if images not in IMAGE_MODES:
+            return jsonify({"error": f"Invalid images, expected one of {', '.join(IMAGE_MODES)}"}), 400
+
+        doc = await ufoSightingsAsync.find_one({"_id": ObjectId(sighting_id)})
+        if not doc:
+            return jsonify({"error": "Sighting not found"}), 404
+
+        img_id = doc.pop("image", None)
+        ufo_img_id = doc.pop("ufo_image", None)
+
+        doc["_id"] = str(doc["_id"])
+        if images == "url":
+            # /image is served by the WSGI app
+            doc["image_url"] = f"/image/{img_id}" if img_id else None
+            doc["ufo_image_url"] = f"/image/{ufo_img_id}" if ufo_img_id else None
+        else:
+            doc["image"], doc["ufo_image"] = await asyncio.gather(
+                get_base64_encoded_image(img_id) if img_id else no_image(),
+                get_base64_encoded_image(ufo_img_id) if ufo_img_id else no_image()
+            )
+
+        add_coordinates(doc)
+        add_comment_count(doc)
+        return jsonify(doc)
@@ -0,0 +1,199 @@
+import math
+import threading
+import time
+from collections import Counter
+from db import sightings_generation, ufoSightings
+
+# Zoom levels with precomputed clusters; deeper map zooms reuse the last level
+MAX_CLUSTER_ZOOM = 12
+
+# Each tile is split into 2**CELL_BITS x 2**CELL_BITS grid cells (8 x 8)
+CELL_BITS = 3
+
+# Finest grid resolution, in cells per axis across the whole world
+FINEST_BITS = MAX_CLUSTER_ZOOM + CELL_BITS
+
+# Newly inserted sightings are folded in at most this often
+CLUSTER_REFRESH_INTERVAL = 60  # seconds
+
+# Web Mercator cannot represent the poles
+MAX_MERCATOR_LAT = 85.05112878
+
+LOAD_BATCH_SIZE = 5000
+
+
+def mercator(lon, lat):
+    """Project a lon/lat pair to Web Mercator coordinates in [0, 1) x [0, 1), origin at the top left."""
+    lat = max(min(lat, MAX_MERCATOR_LAT), -MAX_MERCATOR_LAT)
+    x = (lon + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+
+def wrap_lon(lon):
+    """Bring a longitude from a panned map (which may exceed +/-180) back into range."""
+    return lon if -180 <= lon <= 180 else (lon + 180) % 360 - 180
+
+
+class Cell:
+    """Running totals of the sightings that fall into one grid cell."""
+
+    __slots__ = ("count", "sum_lon", "sum_lat", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.sum_lon = 0.0
+        self.sum_lat = 0.0
+        self.shapes = Counter()
+
+    def to_json(self):
+        shape = self.shapes.most_common(1)[0][0] if self.shapes else None
+        return {
+            "count": self.count,
+            "latitude": self.sum_lat / self.count,
+            "longitude": self.sum_lon / self.count,
+            "shape": shape
+        }
+
+
+class ClusterPyramid:
+    """Precomputed clusters of sighting locations for every map zoom level.
+
+    For each zoom ``z`` the pyramid holds per-tile dicts of grid cells (tiles are the
+    standard ``z/x/y`` slippy-map tiles), each with a count, the centroid and the shape
+    mix of its sightings. It is built from the ``location`` coordinates on first use.
+    Inserted sightings (new ``_id``s) are folded in incrementally by refresh(), which
+    runs at most every ``refresh_interval`` seconds; updates and deletes are applied
+    with remove() of the old version and add() of the new one.
+    """
+
+    def __init__(self, refresh_interval=CLUSTER_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._levels = None
+        self._last_id = None
+        self._generation = None
+        self._refreshed_at = 0.0
+        self._lock = threading.RLock()
+
+    def _points(self, query):
+        projection = {"location.coordinates": 1, "shape": 1}
+        cursor = ufoSightings.find(query, projection).sort([("_id", 1)]).batch_size(LOAD_BATCH_SIZE)
+        for doc in cursor:
+            self._last_id = doc["_id"]
+            yield doc
+
+    def _update(self, doc, sign):
+        coordinates = (doc.get("location") or {}).get("coordinates")
+        if not coordinates:
+            return
+        lon, lat = coordinates
+        x, y = mercator(lon, lat)
+        fx, fy = int(x * (1 << FINEST_BITS)), int(y * (1 << FINEST_BITS))
+        shape = doc.get("shape") or "unknown"
+
+        for z, tiles in enumerate(self._levels):
+            shift = MAX_CLUSTER_ZOOM - z
+            cx, cy = fx >> shift, fy >> shift
+            tile = (cx >> CELL_BITS, cy >> CELL_BITS)
+            cells = tiles.setdefault(tile, {})
+            cell = cells.get((cx, cy))
+            if cell is None:
+                cell = cells[(cx, cy)] = Cell()
+            cell.count += sign
+            cell.sum_lon += sign * lon
+            cell.sum_lat += sign * lat
+            cell.shapes[shape] += sign
+            if cell.count <= 0:
+                del cells[(cx, cy)]
+                if not cells:
+                    del tiles[tile]
+            elif cell.shapes[shape] <= 0:
+                del cell.shapes[shape]
+
+    def build(self):
+        """(Re)build every level from the collection."""
+        with self._lock:
+            self._levels = [{} for _ in range(MAX_CLUSTER_ZOOM + 1)]
+            self._last_id = None
+            self._generation = sightings_generation()
+            for doc in self._points({"location": {"$ne": None}}):
+                self._update(doc, 1)
+            self._refreshed_at = time.monotonic()
+
+    def refresh(self):
+        """Fold in sightings inserted since the last build or refresh, or rebuild after a load."""
+        with self._lock:
+            if self._levels is None or sightings_generation() != self._generation:
+                return self.build()
+            query = {"location": {"$ne": None}}
+            if self._last_id is not None:
+                query["_id"] = {"$gt": self._last_id}
+            for doc in self._points(query):
+                self._update(doc, 1)
+            self._refreshed_at = time.monotonic()
+
+    def add(self, doc):
+        """Count the new version of an updated sighting."""
+        with self._lock:
+            if self._levels is not None:
+                self._update(doc, 1)
+
+    def remove(self, doc):
+        """Uncount a deleted sighting, or the previous version of an updated one."""
+        with self._lock:
+            if self._levels is not None:
+                self._update(doc, -1)
+
+    def clear(self):
+        """Drop the pyramid; it is rebuilt on next use."""
+        with self._lock:
+            self._levels = None
+            self._last_id = None
+
+    def _ensure_fresh(self):
+        if self._levels is None:
+            self.build()
+        elif time.monotonic() - self._refreshed_at > self.refresh_interval:
+            self.refresh()
+
+    def tile(self, z, x, y):
+        """Clusters of one ``z/x/y`` tile (zooms past MAX_CLUSTER_ZOOM use the covering tile)."""
+        with self._lock:
+            self._ensure_fresh()
+            if z > MAX_CLUSTER_ZOOM:
+                shift = z - MAX_CLUSTER_ZOOM
+                z, x, y = MAX_CLUSTER_ZOOM, x >> shift, y >> shift
+            cells = self._levels[z].get((x, y), {})
+            return [cell.to_json() for cell in cells.values()]
+
+    def clusters(self, zoom, west, south, east, north):
+        """Clusters of the grid cells intersecting a lon/lat bounding box at a zoom level.
+
+        Returns the zoom actually used (clamped to the precomputed levels) and the clusters.
+        """
+        zoom = max(0, min(int(zoom), MAX_CLUSTER_ZOOM))
+        per_axis = 1 << (zoom + CELL_BITS)
+        if east - west >= 360:
+            x_spans = [(0, per_axis - 1)]
+        else:
+            first = int(mercator(wrap_lon(west), 0)[0] * per_axis)
+            last = int(mercator(wrap_lon(east), 0)[0] * per_axis)
+            x_spans = [(first, last)] if first <= last else [(first, per_axis - 1), (0, last)]
+        top = int(mercator(0, north)[1] * per_axis)
+        bottom = int(mercator(0, south)[1] * per_axis)
+
+        result = []
+        with self._lock:
+            self._ensure_fresh()
+            tiles = self._levels[zoom]
+            for first, last in x_spans:
+                for tx in range(first >> CELL_BITS, (last >> CELL_BITS) + 1):
+                    for ty in range(top >> CELL_BITS, (bottom >> CELL_BITS) + 1):
+                        for (cx, cy), cell in tiles.get((tx, ty), {}).items():
+                            if first <= cx <= last and top <= cy <= bottom:
+                                result.append(cell.to_json())
+        return zoom, result
+
+
+cluster_pyramid = ClusterPyramid()
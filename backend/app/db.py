@@ -1,29 +1,346 @@
+import datetime
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
 import gridfs
-from pymongo import MongoClient
-
-# Hardcoded MongoDB Credentials
-MONGO_USER = "mongoapp"
-MONGO_PASS = "huMONGOu5"
-MONGO_DB = "MongoProject"
-MONGO_HOST = "localhost"
-MONGO_PORT = "27017"
-MONGO_AUTH = True
-
-# MongoDB Connection URI with Authentication
-MONGO_URI = f"mongodb://{MONGO_USER}:{MONGO_PASS}@{MONGO_HOST}:{MONGO_PORT}/{MONGO_DB}?authSource={MONGO_DB}"
+from bson import ObjectId
+from pymongo import ASCENDING, GEOSPHERE, TEXT, AsyncMongoClient, IndexModel, MongoClient, ReadPreference, UpdateOne
 
+# MongoDB credentials, overridable from the environment
+MONGO_USER = os.environ.get("MONGO_USER", "mongoapp")
+MONGO_PASS = os.environ.get("MONGO_PASS", "huMONGOu5")
+MONGO_DB = os.environ.get("MONGO_DB", "MongoProject")
+MONGO_HOST = os.environ.get("MONGO_HOST", "localhost")
+MONGO_PORT = os.environ.get("MONGO_PORT", "27017")
+MONGO_AUTH = os.environ.get("MONGO_AUTH", "1") != "0"
 
+# MongoDB Connection URI with Authentication (for local debugging MONGO_AUTH=0 skips authentication)
 if MONGO_AUTH:
-    # Initialize MongoDB connection
-    client = MongoClient(MONGO_URI)
+    DEFAULT_MONGO_URI = f"mongodb://{MONGO_USER}:{MONGO_PASS}@{MONGO_HOST}:{MONGO_PORT}/{MONGO_DB}?authSource={MONGO_DB}"
 else:
-    # For local debugging not bothering with authentication
-    client = MongoClient("mongodb://localhost:27017/")
+    DEFAULT_MONGO_URI = f"mongodb://{MONGO_HOST}:{MONGO_PORT}/"
+
+# Client settings; set from the environment, or from app.config through configure() before first use
+settings = {
+    "MONGO_URI": os.environ.get("MONGO_URI", DEFAULT_MONGO_URI),
+    "MONGO_DB": MONGO_DB,
+    "MONGO_MAX_POOL_SIZE": int(os.environ.get("MONGO_MAX_POOL_SIZE", 100)),
+    "MONGO_MIN_POOL_SIZE": int(os.environ.get("MONGO_MIN_POOL_SIZE", 0)),
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+    # Wire compression in order of preference; zstd and snappy need their Python packages
+    "MONGO_COMPRESSORS": os.environ.get("MONGO_COMPRESSORS", "zlib"),
+    # Where read-only queries go; on a replica set secondaryPreferred spreads searches over the secondaries
+    "MONGO_READ_PREFERENCE": os.environ.get("MONGO_READ_PREFERENCE", "secondaryPreferred")
+}
+
+_client = None
+_async_client = None
+_collections = {}
+_lock = threading.Lock()
+
+# Set while a request must read its own writes, see use_primary()
+_primary_reads = ContextVar("primary_reads", default=False)
+
+
+def configure(config):
+    """Override client settings from a mapping (e.g. ``app.config``); only ``MONGO_*`` keys are used."""
+    changes = {key: value for key, value in config.items() if key in settings and settings[key] != value}
+    if changes and (_client is not None or _async_client is not None):
+        raise RuntimeError("MongoDB client already connected; configure() must run before first use")
+    settings.update(changes)
+
+
+def client_options():
+    """Keyword arguments shared by the synchronous and asynchronous clients."""
+    return {
+        "maxPoolSize": settings["MONGO_MAX_POOL_SIZE"],
+        "minPoolSize": settings["MONGO_MIN_POOL_SIZE"],
+        "serverSelectionTimeoutMS": settings["MONGO_SERVER_SELECTION_TIMEOUT_MS"],
+        "compressors": settings["MONGO_COMPRESSORS"],
+        "readPreference": settings["MONGO_READ_PREFERENCE"]
+    }
+
+
+def get_client():
+    """The process-wide MongoClient, created on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = MongoClient(settings["MONGO_URI"], **client_options())
+    return _client
+
+
+def get_async_client():
+    """The AsyncMongoClient of the ASGI mode, created on first use (inside the serving event loop)."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncMongoClient(settings["MONGO_URI"], **client_options())
+    return _async_client
+
+
+def get_database(asynchronous=False):
+    client = get_async_client() if asynchronous else get_client()
+    return client[settings["MONGO_DB"]]
+
+
+def get_collection(name, primary=False, asynchronous=False):
+    """A collection handle reading with the configured read preference, or from the primary."""
+    key = (name, primary, asynchronous)
+    if key not in _collections:
+        read_preference = ReadPreference.PRIMARY if primary else None  # None inherits the client's
+        _collections[key] = get_database(asynchronous).get_collection(name, read_preference=read_preference)
+    return _collections[key]
+
+
+@contextmanager
+def primary_reads():
+    """Route the reads of the lazy collections to the primary within the block."""
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+def use_primary(view):
+    """Decorate a write route so its reads (e.g. existence checks) see the primary's current data."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with primary_reads():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class LazyCollection:
+    """Stand-in for a collection that connects on first use.
+
+    Attribute access is forwarded to the real collection (an AsyncCollection with
+    ``asynchronous``), read with the configured read preference or, inside
+    primary_reads(), from the primary.
+    """
+
+    def __init__(self, name, asynchronous=False):
+        self.name = name
+        self.asynchronous = asynchronous
+
+    def __getattr__(self, attr):
+        return getattr(get_collection(self.name, _primary_reads.get(), self.asynchronous), attr)
+
+
+class LazyGridFS:
+    """Stand-in for the GridFS store (AsyncGridFS with ``asynchronous``) that connects on first use."""
+
+    def __init__(self, asynchronous=False):
+        self.asynchronous = asynchronous
+        self._fs = None
+
+    def __getattr__(self, attr):
+        if self._fs is None:
+            grid = gridfs.AsyncGridFS if self.asynchronous else gridfs.GridFS
+            self._fs = grid(get_database(self.asynchronous))
+        return getattr(self._fs, attr)
 
-db = client[MONGO_DB]
 
 # Initialize GridFS
-fs = gridfs.GridFS(db)
+fs = LazyGridFS()
+
+# GridFS file metadata, for looking images up by filename
+imageFiles = LazyCollection("fs.files")
 
 # Define the GeoUFOSightings collection
-ufoSightings = db.GeoUFOSightings  # Collection for UFO reports
+ufoSightings = LazyCollection("GeoUFOSightings")  # Collection for UFO reports
+
+# Materialized per shape/state/country/year counts, maintained by stats.py
+sightingStats = LazyCollection("SightingStats")
+
+# User comments, one document per comment: {sighting_id, comment, created_at}
+sightingComments = LazyCollection("SightingComments")
+
+# Progress of interrupted incremental dataset loads, see loader.sync_csv()
+ingestCheckpoints = LazyCollection("IngestCheckpoints")
+
+# Generation counter of the sightings, see sightings_generation()
+sightingVersions = LazyCollection("SightingVersions")
+GENERATION_ID = "sightings"
+
+# The same stores through the async driver, used by the ASGI mode (asgi.py)
+fsAsync = LazyGridFS(asynchronous=True)
+ufoSightingsAsync = LazyCollection("GeoUFOSightings", asynchronous=True)
+
+# /stats reads one rollup's summaries, largest first
+STATS_INDEX = [("rollup", 1), ("count", -1)]
+
+# Fields with a lower-cased shadow copy (e.g. city_lc) so exact and prefix matches can use an index
+LOWERCASE_FIELDS = ("city", "state", "country", "shape")
+
+# Documents updated per bulk write while backfilling sighted_at
+BACKFILL_BATCH_SIZE = 1000
+
+# Latest user comments embedded in each sighting as user_comments (all of them are in SightingComments)
+COMMENT_PREVIEW = 5
+
+# Field claiming a sighting while its comments are migrated, see migrate_sighting_comments()
+MIGRATION_MARKER = "comments_migrating"
+
+# A claim older than this is taken to be left by a process that died while migrating
+MIGRATION_CLAIM_TIMEOUT = datetime.timedelta(seconds=30)
+
+# How often to check whether another process finished migrating a sighting
+MIGRATION_POLL_INTERVAL = 0.05  # seconds
+
+# Weights for the full-text index: a hit in city, state or shape outranks one in the free-form comments
+TEXT_INDEX_WEIGHTS = {"comments": 1, "city": 3, "state": 3, "shape": 3}
+
+
+def backfill_lowercase_fields():
+    """Populate the lower-cased shadow fields on documents that do not have them yet."""
+    missing = {"$or": [{f"{field}_lc": {"$exists": False}} for field in LOWERCASE_FIELDS]}
+    update = [{"$set": {f"{field}_lc": {"$toLower": f"${field}"} for field in LOWERCASE_FIELDS}}]
+    return ufoSightings.update_many(missing, update).modified_count
+
+
+def parse_sighting_datetime(value):
+    """Parse the CSV's "M/D/YYYY H:MM" datetime into a datetime, or None if malformed.
+
+    The data uses "24:00" for midnight at the end of the day.
+    """
+    if isinstance(value, datetime.datetime):
+        return value
+    try:
+        date, _, time = str(value).strip().partition(" ")
+        month, day, year = (int(part) for part in date.split("/"))
+        hour, minute = (int(part) for part in (time or "0:00").split(":")[:2])
+        return datetime.datetime(year, month, day) + datetime.timedelta(hours=hour, minutes=minute)
+    except ValueError:
+        return None
+
+
+def backfill_sighted_at():
+    """Store the parsed ``datetime`` as the BSON date ``sighted_at`` (null if unparseable) where missing."""
+    cursor = ufoSightings.find({"sighted_at": {"$exists": False}}, {"datetime": 1})
+    updates, modified = [], 0
+    for doc in cursor:
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"sighted_at": parse_sighting_datetime(doc.get("datetime"))}}))
+        if len(updates) == BACKFILL_BATCH_SIZE:
+            modified += ufoSightings.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        modified += ufoSightings.bulk_write(updates, ordered=False).modified_count
+    return modified
+
+
+def migrate_sighting_comments(sighting_id):
+    """Move one sighting's ``user_comments`` into SightingComments, keeping the latest few and a count.
+
+    The sighting is first claimed with a conditional update, so only one process
+    deletes the leftovers of an interrupted migration and inserts its comments; the
+    others wait until it is migrated (or the claim expires). Returns the number of
+    comments moved, 0 when the sighting was migrated elsewhere or does not exist.
+    """
+    while True:
+        claim = ObjectId()
+        stale = ObjectId.from_datetime(claim.generation_time - MIGRATION_CLAIM_TIMEOUT)
+        doc = ufoSightings.find_one_and_update(
+            {
+                "_id": sighting_id,
+                "comment_count": {"$exists": False},
+                "$or": [{MIGRATION_MARKER: {"$exists": False}}, {MIGRATION_MARKER: {"$lt": stale}}]
+            },
+            {"$set": {MIGRATION_MARKER: claim}},
+            projection={"user_comments": 1}
+        )
+        if doc is not None:
+            break
+        with primary_reads():
+            current = ufoSightings.find_one({"_id": sighting_id}, {"comment_count": 1})
+        if current is None or "comment_count" in current:
+            return 0
+        time.sleep(MIGRATION_POLL_INTERVAL)
+
+    comments = doc.get("user_comments") or []
+    if comments:
+        created_at = datetime.datetime.now(datetime.timezone.utc)
+        # Comments left over from an interrupted migration of this sighting
+        sightingComments.delete_many({"sighting_id": sighting_id})
+        sightingComments.insert_many([
+            {"sighting_id": sighting_id, "comment": comment, "created_at": created_at} for comment in comments
+        ])
+    ufoSightings.update_one(
+        {"_id": sighting_id, MIGRATION_MARKER: claim},
+        {"$set": {"comment_count": len(comments), "user_comments": comments[-COMMENT_PREVIEW:]}, "$unset": {MIGRATION_MARKER: ""}}
+    )
+    return len(comments)
+
+
+def migrate_user_comments():
+    """Move unbounded ``user_comments`` arrays into SightingComments (see migrate_sighting_comments).
+
+    Sightings that already have a ``comment_count`` are migrated and left alone.
+    """
+    cursor = ufoSightings.find({"comment_count": {"$exists": False}, "user_comments.0": {"$exists": True}}, {"_id": 1})
+    return sum(migrate_sighting_comments(doc["_id"]) for doc in cursor)
+
+
+def sightings_generation():
+    """Generation of the sightings collection, 0 until the first bump_sightings_generation().
+
+    The in-memory indexes only fetch sightings with an ``_id`` above the last one they
+    saw; a changed generation tells them to rebuild instead.
+    """
+    doc = sightingVersions.find_one({"_id": GENERATION_ID})
+    return doc["generation"] if doc else 0
+
+
+def bump_sightings_generation():
+    """Record a change other than inserting sightings with new ObjectIds (a load, an in-place update, a delete)."""
+    sightingVersions.update_one(
+        {"_id": GENERATION_ID},
+        {"$inc": {"generation": 1}, "$set": {"changed_at": datetime.datetime.now(datetime.timezone.utc)}},
+        upsert=True
+    )
+
+
+def sighting_indexes():
+    """IndexModels of the sightings collection, built by ensure_indexes() and after a full load (see loader.py)."""
+    return [
+        # $geoNear, $geoWithin and the viewport searches
+        IndexModel([("location", GEOSPHERE)]),
+        # Full-text index backing /search_word?mode=text (a collection can only have one)
+        IndexModel(
+            [(field, TEXT) for field in TEXT_INDEX_WEIGHTS],
+            name="sightings_text",
+            weights=TEXT_INDEX_WEIGHTS,
+            default_language="english"
+        ),
+        IndexModel([("city", ASCENDING)]),
+        IndexModel([("state", ASCENDING)]),
+        IndexModel([("country", ASCENDING)]),
+        # Exact and prefix matching on the field routes (match=exact|prefix)
+        IndexModel([("shape", ASCENDING)]),
+        *(IndexModel([(f"{field}_lc", ASCENDING)]) for field in LOWERCASE_FIELDS),
+        # Date-range filters, sort=datetime and /timeline (optionally per shape)
+        IndexModel([("sighted_at", ASCENDING)]),
+        IndexModel([("shape", ASCENDING), ("sighted_at", ASCENDING)])
+    ]
+
+
+def ensure_indexes():
+    """Create the indexes the API relies on. Safe to run on every startup."""
+    ufoSightings.create_indexes(sighting_indexes())
+
+    sightingStats.create_index(STATS_INDEX)
+
+    # A sighting's comments, newest first
+    sightingComments.create_index([("sighting_id", 1), ("created_at", -1), ("_id", -1)])
+
+
+def setup_database():
+    """Prepare the collection for the API: backfill derived fields, then build the indexes."""
+    backfill_lowercase_fields()
+    backfill_sighted_at()
+    migrate_user_comments()
+    ensure_indexes()
@@ -0,0 +1,72 @@
+import csv
+import io
+import zlib
+
+# Documents fetched per round trip while exporting, and emitted per response chunk
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+def _chunks(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def encode_ndjson(batches, dumps):
+    """Encode batches of result dicts as newline-delimited JSON."""
+    for batch in batches:
+        yield "".join(dumps(row) + "\n" for row in batch).encode("utf-8")
+
+
+def encode_csv(batches, columns):
+    """Encode batches of result dicts as CSV with a header row."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_stream(chunks):
+    """Gzip a byte stream incrementally, flushing after every chunk so the client sees progress."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(cursor, serialize, fmt, columns, dumps, gzip=False):
+    """Stream every document of a server-side cursor in the given export format.
+
+    Documents are pulled in EXPORT_BATCH_SIZE batches, so memory stays flat regardless of
+    the number of matches. The cursor is closed when the export finishes or when the
+    WSGI server closes the generator because the client disconnected.
+    """
+    try:
+        batches = _chunks((serialize(doc) for doc in cursor), EXPORT_BATCH_SIZE)
+        if fmt == "csv":
+            chunks = encode_csv(batches, columns)
+        else:
+            chunks = encode_ndjson(batches, dumps)
+        if gzip:
+            chunks = gzip_stream(chunks)
+        yield from chunks
+    finally:
+        cursor.close()
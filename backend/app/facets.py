@@ -0,0 +1,63 @@
+import hashlib
+import json
+from db import sightings_generation, ufoSightings
+from cache import TTLCache
+
+# Facet lists are recomputed at most this often, or sooner when the sightings changed
+FACET_TTL = 3600  # seconds
+
+# Fields served as dropdown facet lists
+FACET_FIELDS = ("country", "state", "shape")
+
+
+def data_version():
+    """The sightings generation (bumped by loads and syncs) and the newest ``_id`` (moved by inserts)."""
+    newest = list(ufoSightings.find({}, {"_id": 1}).sort([("_id", -1)]).limit(1))
+    return sightings_generation(), newest[0]["_id"] if newest else None
+
+
+class FacetLists:
+    """In-memory distinct values (with counts) of the dropdown fields.
+
+    Each list is computed with a single ``$group`` over the collection the first time
+    it is requested and then served from memory until it expires, is invalidated, or
+    the sightings changed in any process: every list is stored with the version it was
+    computed from (see data_version), which is checked with two indexed reads.
+    """
+
+    def __init__(self, ttl=FACET_TTL):
+        self._cache = TTLCache(maxsize=len(FACET_FIELDS), ttl=ttl)
+
+    def get(self, field):
+        """Return ``(values, etag)`` for a field; values are ``{"value", "count"}`` dicts, most frequent first."""
+        version = data_version()
+        cached = self._cache.get(field)
+        if cached is not None and cached[2] == version:
+            return cached[:2]
+
+        pipeline = [
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}}
+        ]
+        values = [
+            {"value": r["_id"], "count": r.get("count", 0)}
+            for r in ufoSightings.aggregate(pipeline) if r["_id"]
+        ]
+        etag = hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+        # Empty lists are not cached so a freshly loaded collection shows up immediately
+        if values:
+            self._cache.set(field, (values, etag, version))
+        return values, etag
+
+    def warm(self):
+        """Compute every facet list ahead of the first request."""
+        for field in FACET_FIELDS:
+            self.get(field)
+
+    def invalidate(self):
+        """Drop the cached lists after the underlying data changed."""
+        self._cache.clear()
+
+
+facet_lists = FacetLists()
@@ -0,0 +1,153 @@
+import datetime
+import threading
+import time
+import numpy as np
+from db import sightings_generation, ufoSightings
+
+# Newly inserted sightings are appended to the arrays at most this often
+HEATMAP_REFRESH_INTERVAL = 60  # seconds
+
+# Grid resolution bounds, in cells per axis
+DEFAULT_GRID_SIZE = 64
+MAX_GRID_SIZE = 512
+
+# Filters accepted by the heatmap, each backed by a coded array
+HEATMAP_FILTERS = ("shape", "state", "year")
+
+# Code stored for a missing shape/state or an unparseable year
+MISSING = -1
+
+LOAD_BATCH_SIZE = 5000
+
+
+def sighting_year(doc):
+    """Year of a sighting from its ``datetime`` ("10/10/1949 20:30") or a BSON date, else None."""
+    value = doc.get("sighted_at") or doc.get("datetime")
+    if isinstance(value, datetime.datetime):
+        return value.year
+    try:
+        return int(str(value).split()[0].split("/")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class SightingPoints:
+    """Coordinates of every located sighting held in contiguous NumPy arrays.
+
+    ``lon`` and ``lat`` are float64 arrays; ``shape`` and ``state`` are int32 codes into
+    the ``shapes``/``states`` vocabularies and ``year`` is an int16, all aligned by index.
+    They are loaded with one pass over the collection on first use. Inserted sightings
+    (new ``_id``s) are appended by refresh(), which runs at most every
+    ``refresh_interval`` seconds; invalidate() after updates or deletes reloads them.
+    """
+
+    def __init__(self, refresh_interval=HEATMAP_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._arrays = None
+        self._vocabularies = {"shape": {}, "state": {}}
+        self._last_id = None
+        self._generation = None
+        self._refreshed_at = 0.0
+        self._lock = threading.RLock()
+
+    def _code(self, field, value):
+        if not value:
+            return MISSING
+        vocabulary = self._vocabularies[field]
+        return vocabulary.setdefault(value, len(vocabulary))
+
+    def _fetch(self, query):
+        projection = {"location.coordinates": 1, "shape": 1, "state": 1, "datetime": 1, "sighted_at": 1}
+        cursor = ufoSightings.find(query, projection).sort([("_id", 1)]).batch_size(LOAD_BATCH_SIZE)
+        lon, lat, shape, state, year = [], [], [], [], []
+        for doc in cursor:
+            self._last_id = doc["_id"]
+            coordinates = (doc.get("location") or {}).get("coordinates")
+            if not coordinates:
+                continue
+            lon.append(coordinates[0])
+            lat.append(coordinates[1])
+            shape.append(self._code("shape", doc.get("shape")))
+            state.append(self._code("state", doc.get("state")))
+            year.append(sighting_year(doc) or MISSING)
+        return {
+            "lon": np.array(lon, dtype=np.float64),
+            "lat": np.array(lat, dtype=np.float64),
+            "shape": np.array(shape, dtype=np.int32),
+            "state": np.array(state, dtype=np.int32),
+            "year": np.array(year, dtype=np.int16)
+        }
+
+    def load(self):
+        """(Re)load every array from the collection."""
+        with self._lock:
+            self._vocabularies = {"shape": {}, "state": {}}
+            self._last_id = None
+            self._generation = sightings_generation()
+            self._arrays = self._fetch({"location": {"$ne": None}})
+            self._refreshed_at = time.monotonic()
+
+    def refresh(self):
+        """Append sightings inserted since the last load or refresh, or reload after a dataset load."""
+        with self._lock:
+            if self._arrays is None or sightings_generation() != self._generation:
+                return self.load()
+            query = {"location": {"$ne": None}}
+            if self._last_id is not None:
+                query["_id"] = {"$gt": self._last_id}
+            new = self._fetch(query)
+            if len(new["lon"]):
+                self._arrays = {name: np.concatenate((array, new[name])) for name, array in self._arrays.items()}
+            self._refreshed_at = time.monotonic()
+
+    def invalidate(self):
+        """Drop the arrays after sightings were updated or deleted; they are reloaded on next use."""
+        with self._lock:
+            self._arrays = None
+            self._last_id = None
+
+    def _ensure_fresh(self):
+        if self._arrays is None:
+            self.load()
+        elif time.monotonic() - self._refreshed_at > self.refresh_interval:
+            self.refresh()
+
+    def histogram(self, west, south, east, north, width=DEFAULT_GRID_SIZE, height=DEFAULT_GRID_SIZE,
+                  shape=None, state=None, year=None):
+        """Count sightings per cell of a ``height`` x ``width`` grid over a lon/lat bounding box.
+
+        Rows run from north to south and columns from west to east. A box with
+        ``west > east`` crosses the antimeridian. Returns an int64 array.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            arrays = self._arrays
+            mask = np.ones(len(arrays["lon"]), dtype=bool)
+            for field, value in (("shape", shape), ("state", state)):
+                if value is not None:
+                    mask &= arrays[field] == self._vocabularies[field].get(value, -2)
+            if year is not None:
+                mask &= arrays["year"] == year
+
+        lon, lat = arrays["lon"][mask], arrays["lat"][mask]
+        if west > east:
+            # Shift the western hemisphere past 180 so the box is contiguous
+            lon = np.where(lon < west, lon + 360, lon)
+            east += 360
+        counts, _, _ = np.histogram2d(lat, lon, bins=(height, width), range=((south, north), (west, east)))
+        return counts[::-1].astype(np.int64)
+
+    def stats(self):
+        """Report the number of points and the memory held by the arrays."""
+        with self._lock:
+            arrays = self._arrays or {}
+            return {
+                "points": len(arrays["lon"]) if arrays else 0,
+                "bytes": sum(array.nbytes for array in arrays.values()),
+                "arrays": {name: array.nbytes for name, array in arrays.items()},
+                "shapes": len(self._vocabularies["shape"]),
+                "states": len(self._vocabularies["state"])
+            }
+
+
+sighting_points = SightingPoints()
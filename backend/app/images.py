@@ -0,0 +1,142 @@
+import base64
+import mimetypes
+import threading
+from collections import OrderedDict
+from bson import ObjectId
+from db import ufoSightings, fs
+
+# Upper bound on the bytes held by the image cache (raw bytes plus Base64 encodings)
+IMAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def image_mimetype(grid_out):
+    """Content type of a GridFS file, falling back to a guess from its filename."""
+    content_type = getattr(grid_out, "content_type", None)
+    if content_type:
+        return content_type
+    return mimetypes.guess_type(getattr(grid_out, "filename", None) or "")[0] or "image/jpeg"
+
+
+class CachedImage:
+    """Bytes of one GridFS file, with its Base64 encoding filled in on first use."""
+
+    __slots__ = ("data", "content_type", "encoded")
+
+    def __init__(self, data, content_type):
+        self.data = data
+        self.content_type = content_type
+        self.encoded = None
+
+    @property
+    def size(self):
+        return len(self.data) + len(self.encoded or "")
+
+
+class ImageCache:
+    """Process-wide LRU cache of GridFS images keyed by file ObjectId and bounded by total size.
+
+    The collection only references a few dozen state and shape pictures, so once
+    warm the detail and image endpoints never go back to GridFS.
+    """
+
+    def __init__(self, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, file_id):
+        """Return the cached CachedImage for a file id, or None (counted as a miss)."""
+        file_id = ObjectId(file_id)
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is not None:
+                self._entries.move_to_end(file_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        return None
+
+    def put(self, file_id, data, content_type):
+        """Cache the bytes of a file read from GridFS and return its CachedImage."""
+        entry = CachedImage(data, content_type)
+        self._store(ObjectId(file_id), entry)
+        return entry
+
+    def get(self, file_id):
+        """Return the CachedImage for a file id, reading it from GridFS on a miss.
+
+        Raises gridfs.errors.NoFile if the file does not exist.
+        """
+        entry = self.lookup(file_id)
+        if entry is None:
+            with fs.get(ObjectId(file_id)) as grid_out:
+                entry = self.put(file_id, grid_out.read(), image_mimetype(grid_out))
+        return entry
+
+    def encode(self, file_id, entry):
+        """Return the Base64 encoding of a cached file, caching it alongside the bytes."""
+        if entry.encoded is None:
+            encoded = base64.b64encode(entry.data).decode("utf-8")
+            with self._lock:
+                if entry.encoded is None:
+                    entry.encoded = encoded
+                    if self._entries.get(ObjectId(file_id)) is entry:
+                        self._size += len(encoded)
+                        self._evict()
+        return entry.encoded
+
+    def get_base64(self, file_id):
+        """Return the Base64 encoding of a file, reading it from GridFS on a miss."""
+        return self.encode(file_id, self.get(file_id))
+
+    def warm(self):
+        """Preload every image referenced by a sighting; returns the number of files loaded."""
+        file_ids = set(ufoSightings.distinct("image")) | set(ufoSightings.distinct("ufo_image"))
+        for file_id in file_ids:
+            if file_id:
+                self.get_base64(file_id)
+        return len(file_ids)
+
+    def stats(self):
+        """Hit, miss and eviction counters plus current occupancy."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def clear(self):
+        """Drop every cached image and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def _store(self, file_id, entry):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(file_id, None)
+            if previous is not None:
+                self._size -= previous.size
+            self._entries[file_id] = entry
+            self._size += entry.size
+            self._evict()
+
+    def _evict(self):
+        # Caller holds the lock
+        while self._size > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.size
+            self.evictions += 1
+
+
+image_cache = ImageCache()
@@ -0,0 +1,187 @@
+import threading
+import zlib
+from pymongo.errors import BulkWriteError
+from db import LOWERCASE_FIELDS, imageFiles, parse_sighting_datetime, ufoSightings
+
+# Columns of the source dataset (ufo_scrubbed.csv) stored as they are
+SIGHTING_FIELDS = (
+    "datetime", "city", "state", "country", "shape",
+    "duration (seconds)", "duration (hours/min)", "comments", "date posted"
+)
+
+# Columns turned into the GeoJSON location point
+COORDINATE_FIELDS = ("latitude", "longitude")
+
+# Sightings inserted per insert_many
+INGEST_BATCH_SIZE = 1000
+
+# States with a map image named <state>.jpg; others get UNKNOWN_STATE_IMAGE
+STATE_IMAGES = frozenset((
+    "al", "ak", "az", "ar", "ca", "co", "ct", "de", "fl", "ga", "hi", "id", "il", "in", "ia",
+    "ks", "ky", "la", "me", "md", "ma", "mi", "mn", "ms", "mo", "mt", "ne", "nv", "nh", "nj",
+    "nm", "ny", "nc", "nd", "oh", "ok", "or", "pa", "ri", "sc", "sd", "tn", "tx", "ut", "vt",
+    "va", "wa", "wv", "wi", "wy", "pr"
+))
+UNKNOWN_STATE_IMAGE = "unknown_state.jpg"
+
+# Illustrations per shape (<name>.jpg); other shapes get DEFAULT_UFO_IMAGE
+UFO_IMAGES = {
+    "chevron": ("chevron_a", "chevron_b"),
+    "cigar": ("cigar_a", "cigar_b", "cigar_c"),
+    "cone": ("cone_a",),
+    "crescent": ("crescent_a", "crescent_b"),
+    "cross": ("cross_a",),
+    "cylinder": ("cylinder_a", "cylinder_b", "cylinder_c"),
+    "disk": ("disk_a", "disk_b", "disk_c"),
+    "dome": ("dome_a", "dome_b", "dome_c"),
+    "pyramid": ("pyramid_a", "pyramid_b"),
+    "sphere": ("sphere_a", "sphere_b", "sphere_c"),
+    "triangle": ("triangle_a", "triangle_b", "triangle_c")
+}
+DEFAULT_UFO_IMAGE = "default.jpg"
+
+
+class ImageRefs:
+    """GridFS filename to ObjectId map of the state and shape images, read with one query on first use."""
+
+    def __init__(self):
+        self._ids = None
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        if self._ids is None:
+            with self._lock:
+                if self._ids is None:
+                    self._ids = {f["filename"]: f["_id"] for f in imageFiles.find({}, {"filename": 1})}
+        return self._ids.get(filename)
+
+    def invalidate(self):
+        """Forget the map after images were added or replaced."""
+        self._ids = None
+
+
+image_refs = ImageRefs()
+
+
+def image_filenames(doc):
+    """Filenames of a sighting's state image and shape illustration.
+
+    Shapes with several illustrations pick one from a hash of the sighting, so the
+    same row always gets the same image.
+    """
+    state = (doc.get("state") or "").lower()
+    shape = (doc.get("shape") or "").lower()
+    state_image = f"{state}.jpg" if state in STATE_IMAGES else UNKNOWN_STATE_IMAGE
+    choices = UFO_IMAGES.get(shape)
+    if not choices:
+        return state_image, DEFAULT_UFO_IMAGE
+    seed = f"{doc.get('datetime')}|{doc.get('city')}|{state}|{shape}".encode("utf-8")
+    return state_image, f"{choices[zlib.crc32(seed) % len(choices)]}.jpg"
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def coordinate(value, name, limit):
+    """Parse a latitude/longitude (a number or numeric string), or None when blank."""
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value!r}")
+    if not -limit <= number <= limit:
+        raise ValueError(f"{name} out of range: {value!r}")
+    return number
+
+
+def build_sighting(row, images=image_refs):
+    """Validate one source row and build the stored sighting document.
+
+    Adds the GeoJSON ``location`` (null without coordinates), ``sighted_at``, the
+    lower-cased shadow fields, the ``image``/``ufo_image`` GridFS refs and an empty
+    comment summary (so the first comment needs no migration, see
+    db.migrate_sighting_comments). Raises ValueError describing the first problem found.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("Expected a JSON object")
+    unknown = [key for key in row if key not in SIGHTING_FIELDS and key not in COORDINATE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields {', '.join(unknown)}")
+
+    doc = {field: row[field] for field in SIGHTING_FIELDS if field in row}
+    for field, value in doc.items():
+        # Stored and served as they are, so only the scalar types the CSV holds
+        text_only = field in LOWERCASE_FIELDS
+        if value is not None and not (isinstance(value, str) or (not text_only and is_number(value))):
+            raise ValueError(f"Invalid {field}: {value!r}")
+    sighted_at = parse_sighting_datetime(doc.get("datetime"))
+    if sighted_at is None:
+        raise ValueError(f"Invalid datetime: {doc.get('datetime')!r}, expected M/D/YYYY H:MM")
+
+    lat = coordinate(row.get("latitude"), "latitude", 90)
+    lon = coordinate(row.get("longitude"), "longitude", 180)
+    if (lat is None) != (lon is None):
+        raise ValueError("latitude and longitude must be given together")
+    doc["location"] = {"type": "Point", "coordinates": [lon, lat]} if lat is not None else None
+    doc["sighted_at"] = sighted_at
+    for field in LOWERCASE_FIELDS:
+        value = doc.get(field)
+        doc[f"{field}_lc"] = value.lower() if value is not None else None
+
+    state_image, ufo_image = image_filenames(doc)
+    for field, filename in (("image", state_image), ("ufo_image", ufo_image)):
+        file_id = images.get(filename)
+        if file_id is not None:
+            doc[field] = file_id
+    doc["comment_count"] = 0
+    doc["user_comments"] = []
+    return doc
+
+
+def insert_sightings(docs):
+    """Insert built sightings with one unordered insert_many.
+
+    Returns the number inserted and ``{index: message}`` for the documents the server rejected.
+    """
+    if not docs:
+        return 0, {}
+    try:
+        return len(ufoSightings.insert_many(docs, ordered=False).inserted_ids), {}
+    except BulkWriteError as e:
+        errors = {error["index"]: error.get("errmsg", "Write error") for error in e.details.get("writeErrors", [])}
+        return e.details.get("nInserted", len(docs) - len(errors)), errors
+
+
+def ingest_rows(rows, batch_size=INGEST_BATCH_SIZE):
+    """Build and insert ``(line, row)`` pairs in batches.
+
+    A row given as a ValueError (e.g. a JSON syntax error) is reported as that line's error.
+    Returns the number inserted and a list of ``{"line", "error"}`` dicts; bad rows
+    never fail the rest of the batch.
+    """
+    inserted, errors = 0, []
+    batch, lines = [], []
+
+    def flush():
+        nonlocal inserted
+        count, failed = insert_sightings(batch)
+        inserted += count
+        errors.extend({"line": lines[index], "error": message} for index, message in sorted(failed.items()))
+        batch.clear()
+        lines.clear()
+
+    for line, row in rows:
+        try:
+            if isinstance(row, ValueError):
+                raise row
+            batch.append(build_sighting(row))
+            lines.append(line)
+        except ValueError as e:
+            errors.append({"line": line, "error": str(e)})
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    errors.sort(key=lambda error: error["line"])
+    return inserted, errors
@@ -0,0 +1,311 @@
+import csv
+import datetime
+import hashlib
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from bson import ObjectId
+from pymongo import UpdateMany, UpdateOne
+from db import (
+    COMMENT_PREVIEW, bump_sightings_generation, get_collection, get_database, ingestCheckpoints, migrate_user_comments,
+    primary_reads, sighting_indexes, sightingComments, ufoSightings
+)
+from ingest import ImageRefs, build_sighting
+from stats import KEY_PROJECTION, sighting_stats
+
+# Sightings per insert_many, and insert_many calls in flight at once
+LOAD_BATCH_SIZE = 5000
+LOAD_WORKERS = 4
+
+# Columns mongoimport stored as numbers
+NUMERIC_FIELDS = ("duration (seconds)",)
+
+# Columns identifying a sighting; rows equal in all of them are told apart by their order
+IDENTITY_FIELDS = ("datetime", "city", "state", "country", "shape", "latitude", "longitude")
+
+# The same columns as stored, with the coordinates in the GeoJSON location (see document_key)
+STORED_IDENTITY_FIELDS = ("datetime", "city", "state", "country", "shape", "location")
+
+# Fields of a built sighting that a sync only sets on insert
+COMMENT_SUMMARY_FIELDS = ("comment_count", "user_comments")
+
+# Rows compared and written per round trip by sync_csv(); progress is checkpointed after each
+SYNC_BATCH_SIZE = 1000
+
+# Ids per $in query, e.g. per delete_many when removing sightings whose rows are gone
+DELETE_BATCH_SIZE = 1000
+
+# Rejected rows kept in a LoadResult, for reporting
+MAX_REPORTED_ERRORS = 100
+
+LoadResult = namedtuple("LoadResult", ["inserted", "rejected", "errors"])
+SyncResult = namedtuple("SyncResult", ["inserted", "updated", "unchanged", "removed", "rejected", "errors", "resumed_from"])
+
+
+def number(value):
+    """A CSV number as an int or float, or the string unchanged if it is not one."""
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def csv_rows(path):
+    """Stream ``(line, row)`` pairs from a ufo_scrubbed.csv file, with typed numeric columns."""
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader)]
+        for values in reader:
+            row = dict(zip(header, values))
+            for field in NUMERIC_FIELDS:
+                if row.get(field):
+                    row[field] = number(row[field])
+            yield reader.line_num, row
+
+
+def identity_key(row):
+    return "\x1f".join(str(row.get(field, "")).strip() for field in IDENTITY_FIELDS)
+
+
+def document_key(doc):
+    """Identity of a stored sighting, comparable between documents built by other means (e.g.
+    build_project_db.js) and by this module, whose coordinates both end up as doubles in ``location``."""
+    coordinates = (doc.get("location") or {}).get("coordinates") or (None, None)
+    values = [doc.get(field) for field in STORED_IDENTITY_FIELDS[:-1]] + list(coordinates)
+    return "\x1f".join("" if value is None else str(value).strip() for value in values)
+
+
+def sighting_id(key, occurrence):
+    """Deterministic ``_id`` of the ``occurrence``-th row with an identity key.
+
+    Reloading the same file gives every sighting the same ``_id``, so comments and
+    links survive a reload. The timestamp bytes are zero, so these ids sort below the
+    ObjectIds of sightings inserted through the API; loads and syncs therefore bump
+    the sightings generation for the in-memory indexes, which otherwise only fetch
+    ``_id``s above the last one they saw.
+    """
+    digest = hashlib.sha1(f"{key}\x1f{occurrence}".encode("utf-8")).digest()
+    return ObjectId(bytes(4) + digest[:8])
+
+
+def fingerprint(row):
+    """Hash of every column of a source row, stored as ``source_fingerprint`` to detect changed rows."""
+    canonical = "\x1f".join(f"{field}={row[field]}" for field in sorted(row))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def keyed_rows(rows):
+    """Yield ``(line, row, _id)`` for ``(line, row)`` pairs, numbering rows with the same identity key."""
+    seen = {}
+    for line, row in rows:
+        key = identity_key(row)
+        # Counted by a short digest so tens of millions of rows fit in memory
+        digest = hashlib.sha1(key.encode("utf-8")).digest()[:12]
+        occurrence = seen[digest] = seen.get(digest, -1) + 1
+        yield line, row, sighting_id(key, occurrence)
+
+
+def load_csv(path, collection_name=None, batch_size=LOAD_BATCH_SIZE, workers=LOAD_WORKERS):
+    """Load a ufo_scrubbed.csv file into the sightings collection, replacing its contents (see load_rows)."""
+    return load_rows(csv_rows(path), collection_name, batch_size, workers)
+
+
+def load_rows(rows, collection_name=None, batch_size=LOAD_BATCH_SIZE, workers=LOAD_WORKERS):
+    """Load ``(line, row)`` source rows into the sightings collection, replacing its contents.
+
+    Rows are built in memory (see ingest.build_sighting, with the GridFS image map read
+    once) and inserted into an empty staging collection with ``workers`` concurrent
+    unordered insert_many calls. The indexes are built once all rows are in, then the
+    staging collection is renamed over the target, so readers switch to the new data
+    at once and a failed load leaves the old data in place. Returns a LoadResult.
+
+    Loading over the sightings collection keeps user comments attached: sightings with
+    comments that were not loaded by this module (so their ``_id``s are not derived
+    from their rows) are matched to their new documents by document_key, in ``_id``
+    order among equal keys, and their SightingComments are moved over before the swap.
+    Comments of sightings that match no row are left behind with the old ``_id``.
+    """
+    database = get_database()
+    target = collection_name or ufoSightings.name
+    staging = database[f"{target}_loading"]
+    staging.drop()
+    renumbered = commented_sightings(database[target]) if target == ufoSightings.name else {}
+    moved = []
+
+    images = ImageRefs()
+    inserted, rejected, errors = 0, 0, []
+    pending = set()
+
+    def collect(done):
+        nonlocal inserted
+        for future in done:
+            inserted += len(future.result().inserted_ids)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        batch = []
+        for line, row, _id in keyed_rows(rows):
+            try:
+                doc = build_sighting(row, images)
+            except ValueError as e:
+                rejected += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"line": line, "error": str(e)})
+                continue
+            doc["_id"] = _id
+            doc["source_fingerprint"] = fingerprint(row)
+            old_ids = renumbered.get(document_key(doc)) if renumbered else None
+            if old_ids:
+                moved.append((old_ids.pop(0), _id))
+            batch.append(doc)
+            if len(batch) == batch_size:
+                # Bound the batches held in memory while inserts are slower than parsing
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(pool.submit(staging.insert_many, batch, ordered=False))
+                batch = []
+        if batch:
+            pending.add(pool.submit(staging.insert_many, batch, ordered=False))
+        collect(wait(pending).done)
+
+    staging.create_indexes(sighting_indexes())
+    if moved:
+        sightingComments.bulk_write(
+            [UpdateMany({"sighting_id": old}, {"$set": {"sighting_id": new}}) for old, new in moved], ordered=False
+        )
+    restore_comment_summaries(staging.name)
+    staging.rename(target, dropTarget=True)
+    bump_sightings_generation()
+    return LoadResult(inserted, rejected, errors)
+
+
+def commented_sightings(collection):
+    """document_key to ``_id``s, in order, of the sightings with comments that a full load gives new ``_id``s.
+
+    Comments still embedded as ``user_comments`` are first moved into SightingComments
+    (see db.migrate_user_comments), so they move with the rest. Sightings loaded by this
+    module get the same ``_id`` again and are left out.
+    """
+    migrate_user_comments()
+    ids = sightingComments.distinct("sighting_id")
+    renumbered = {}
+    for start in range(0, len(ids), DELETE_BATCH_SIZE):
+        query = {"_id": {"$in": ids[start:start + DELETE_BATCH_SIZE]}, "source_fingerprint": {"$exists": False}}
+        for doc in collection.find(query, {field: 1 for field in STORED_IDENTITY_FIELDS}):
+            renumbered.setdefault(document_key(doc), []).append(doc["_id"])
+    for old_ids in renumbered.values():
+        old_ids.sort()
+    return renumbered
+
+
+def restore_comment_summaries(collection_name):
+    """Set ``comment_count`` and the latest ``user_comments`` of freshly loaded sightings from SightingComments."""
+    sightingComments.aggregate([
+        {"$sort": {"created_at": 1, "_id": 1}},
+        {"$group": {"_id": "$sighting_id", "comment_count": {"$sum": 1}, "user_comments": {"$push": "$comment"}}},
+        {"$project": {"comment_count": 1, "user_comments": {"$slice": ["$user_comments", -COMMENT_PREVIEW]}}},
+        {"$merge": {"into": collection_name, "whenMatched": "merge", "whenNotMatched": "discard"}}
+    ])
+
+
+def checkpoint_id(path, collection_name):
+    """Identify a load of one version of a file: a changed file starts over instead of resuming."""
+    stat = os.stat(path)
+    return f"{collection_name}:{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def sync_csv(path, collection_name=None, batch_size=SYNC_BATCH_SIZE):
+    """Bring the sightings collection in line with a ufo_scrubbed.csv file, writing only what changed.
+
+    Each row's deterministic ``_id`` (see sighting_id) is looked up with its stored
+    ``source_fingerprint``: new rows are inserted, rows whose fingerprint differs are
+    updated in place (keeping their comments) and unchanged rows are skipped. Loaded
+    sightings whose rows are gone are removed at the end; sightings added through the
+    API have no fingerprint and are left alone. The /stats rollups of the sightings
+    collection are updated along with every batch (see SightingStats.update_many).
+    Progress is checkpointed after every batch, so running again after an
+    interruption resumes after the last written batch. Returns a SyncResult.
+    """
+    target = collection_name or ufoSightings.name
+    # Compare against, and resume from, what was actually written
+    collection = get_collection(target, primary=True)
+    track_stats = target == ufoSightings.name
+    checkpoint_key = checkpoint_id(path, target)
+    with primary_reads():
+        checkpoint = ingestCheckpoints.find_one({"_id": checkpoint_key}) or {}
+    resumed_from = checkpoint.get("line", 0)
+    counts = checkpoint.get("counts") or {"inserted": 0, "updated": 0, "unchanged": 0, "rejected": 0}
+    images = ImageRefs()
+    seen, errors = set(), []
+
+    def write(batch):
+        existing = {
+            doc["_id"]: doc
+            for doc in collection.find({"_id": {"$in": [_id for _, _, _id in batch]}}, dict(KEY_PROJECTION, source_fingerprint=1))
+        }
+        operations, changes = [], []
+        for line, row, _id in batch:
+            row_fingerprint = fingerprint(row)
+            if _id in existing and existing[_id].get("source_fingerprint") == row_fingerprint:
+                counts["unchanged"] += 1
+                seen.add(_id)
+                continue
+            try:
+                doc = build_sighting(row, images)
+            except ValueError as e:
+                counts["rejected"] += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"line": line, "error": str(e)})
+                continue
+            doc["source_fingerprint"] = row_fingerprint
+            counts["updated" if _id in existing else "inserted"] += 1
+            # An updated sighting keeps its comments
+            comment_summary = {field: doc.pop(field) for field in COMMENT_SUMMARY_FIELDS}
+            operations.append(UpdateOne({"_id": _id}, {"$set": doc, "$setOnInsert": comment_summary}, upsert=True))
+            changes.append((existing.get(_id), doc))
+            seen.add(_id)
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+            if track_stats:
+                sighting_stats.update_many(changes)
+            bump_sightings_generation()
+        ingestCheckpoints.update_one(
+            {"_id": checkpoint_key},
+            {"$set": {"line": batch[-1][0], "counts": dict(counts), "updated_at": datetime.datetime.now(datetime.timezone.utc)}},
+            upsert=True
+        )
+
+    batch = []
+    for line, row, _id in keyed_rows(csv_rows(path)):
+        if line <= resumed_from:
+            # Written before the interruption; only needed to know which sightings to keep
+            seen.add(_id)
+            continue
+        batch.append((line, row, _id))
+        if len(batch) == batch_size:
+            write(batch)
+            batch = []
+    if batch:
+        write(batch)
+
+    removed = 0
+    gone = [doc["_id"] for doc in collection.find({"source_fingerprint": {"$exists": True}}, {"_id": 1}) if doc["_id"] not in seen]
+    for start in range(0, len(gone), DELETE_BATCH_SIZE):
+        chunk = {"_id": {"$in": gone[start:start + DELETE_BATCH_SIZE]}}
+        old = list(collection.find(chunk, KEY_PROJECTION)) if track_stats else []
+        removed += collection.delete_many(chunk).deleted_count
+        if old:
+            sighting_stats.update_many([(doc, None) for doc in old])
+    if removed:
+        bump_sightings_generation()
+    ingestCheckpoints.delete_one({"_id": checkpoint_key})
+    return SyncResult(removed=removed, errors=errors, resumed_from=resumed_from, **counts)
+
+
+def needs_full_load(collection_name=None):
+    """Whether the collection was not loaded by this module (e.g. by build_project_db.js), so it has no fingerprints to compare."""
+    collection = get_database()[collection_name or ufoSightings.name]
+    return collection.find_one({"source_fingerprint": {"$exists": True}}, {"_id": 1}) is None
@@ -1,45 +1,634 @@
 import base64
-from flask import request, jsonify, send_from_directory
-from bson import ObjectId
-from db import ufoSightings, fs
+import datetime
+import math
+import re
+from collections import namedtuple
+from flask import Response, current_app, request, jsonify, send_from_directory, url_for
+from bson import ObjectId, json_util
+from bson.errors import InvalidId
+from gridfs.errors import NoFile
+from pymongo.errors import ExecutionTimeout
+from db import COMMENT_PREVIEW, migrate_sighting_comments, ufoSightings, sightingComments, use_primary
+from cache import TTLCache
+from facets import facet_lists
+from images import image_cache
+from export import EXPORT_BATCH_SIZE, EXPORT_FORMATS, stream_export
+from clusters import cluster_pyramid
+from heatmap import DEFAULT_GRID_SIZE, MAX_GRID_SIZE, sighting_points
+from snapshot import EARTH_RADIUS_METERS, METERS_PER_MILE, snapshot
+from trigrams import trigram_index
+from stats import ROLLUPS, sighting_stats
+from ingest import ingest_rows
 
 # Set a fixed limit for pagination
 LIMIT = 10
 
+# Exact totals are cached per normalized query so page turns skip the count
+COUNT_CACHE_SIZE = 1024
+COUNT_CACHE_TTL = 300  # seconds
+total_counts = TTLCache(maxsize=COUNT_CACHE_SIZE, ttl=COUNT_CACHE_TTL)
+
+# Bounds for the opt-in estimated totals (total=estimate)
+ESTIMATE_COUNT_CAP = 1000
+ESTIMATE_COUNT_TIMEOUT_MS = 50
+
+# Relevance score of a $text match, usable in projections and sorts
+TEXT_SCORE = {"$meta": "textScore"}
+
+# Matching modes for the country/state/city/shape routes
+MATCH_MODES = ("contains", "exact", "prefix")
+
+# Keyword search modes for /search_word
+SEARCH_MODES = ("substring", "text")
+
+# How /sighting/<id> returns its images
+IMAGE_MODES = ("base64", "url")
+
+# Most sightings /sightings/batch resolves in one request
+MAX_BATCH_IDS = 100
+
+# GridFS images never change, so browsers may keep them for a year
+IMAGE_MAX_AGE = 365 * 24 * 3600
+
+# Fields returned for each search result (besides _id) and the document paths they are read from
+RESULT_FIELDS = ("city", "comments", "country", "shape", "state", "latitude", "longitude")
+FIELD_PATHS = {"latitude": "location.coordinates", "longitude": "location.coordinates"}
+
+# Fields only returned when requested with fields=
+OPTIONAL_FIELDS = ("sighted_at",)
+
+# Per-query values added to results when present (text relevance, distance from the search center)
+COMPUTED_FIELDS = ("score", "distance_miles")
+
+# Geodesy for the radius and viewport searches; the earth radius (from snapshot.py) is the sphere
+# $geoNear measures on, so $centerSphere totals and distance-ordered pages agree at the edge
+DISTANCE_EPSILON_METERS = 0.01  # slack when resuming $geoNear from the previous page's distance
+VIEWPORT_MAX_SPAN = 90  # degrees of longitude per viewport polygon
+VIEWPORT_EDGE_STEP = 1  # degrees between vertices along a viewport's east-west edges
+
+# Clusters and heatmaps pick up new sightings about once a minute, so browsers may reuse them briefly
+MAP_MAX_AGE = 60
+
+# Deepest /tiles zoom served (slippy maps stop around here); deeper tiles are out of range
+MAX_TILE_ZOOM = 22
+
+# Orderings for /search_nearby
+NEARBY_ORDERS = ("id", "distance")
+
+# Comments per page of /sighting/<id>/comments
+COMMENTS_LIMIT = 20
+
+# Rows accepted per POST /sightings/bulk request
+MAX_BULK_ROWS = 50000
+
+# sort= values of the searches and the field they order by ("-datetime" for newest first)
+SORT_FIELDS = {"datetime": "sighted_at"}
+
+# /timeline buckets: per year, per calendar month, or per hour of the day
+TIMELINE_BUCKETS = {
+    "year": {"$year": "$sighted_at"},
+    "month": {"$dateToString": {"format": "%Y-%m", "date": "$sighted_at"}},
+    "hour": {"$hour": "$sighted_at"}
+}
+TIMELINE_CACHE_TTL = 300  # seconds
+timeline_cache = TTLCache(maxsize=256, ttl=TIMELINE_CACHE_TTL)
+
+Page = namedtuple("Page", ["results", "total", "next_cursor", "estimated"])
+
 # Helper Functions
-def convert_to_str(doc):
-    """Convert ObjectId fields to strings and extract required fields."""
-    return {
-        "_id": str(doc["_id"]),
-        "city": doc.get("city", "N/A"),
-        "comments": doc.get("comments", "N/A"),
-        "country": doc.get("country", "N/A"),
-        "shape": doc.get("shape", "N/A"),
-        "state": doc.get("state", "N/A"),
-        "latitude": doc.get("location", {}).get("coordinates", [None, None])[1],
-        "longitude": doc.get("location", {}).get("coordinates", [None, None])[0]
-    }
+def convert_to_str(doc, fields=RESULT_FIELDS):
+    """Convert ObjectId fields to strings and extract required fields (all result fields, or only ``fields``)."""
+    coordinates = (doc.get("location") or {}).get("coordinates") or [None, None]
+    result = {"_id": str(doc["_id"])}
+    for field in fields:
+        if field == "latitude":
+            result["latitude"] = coordinates[1]
+        elif field == "longitude":
+            result["longitude"] = coordinates[0]
+        else:
+            result[field] = doc.get(field, "N/A")
+    for field in COMPUTED_FIELDS:
+        if field in doc:
+            result[field] = doc[field]
+    return result
+
+def search_projection(fields=RESULT_FIELDS):
+    """Projection that fetches only the document paths needed to serialize ``fields``."""
+    return {FIELD_PATHS.get(field, field): 1 for field in fields}
+
+def parse_fields(value):
+    """Parse a ``fields=`` sparse fieldset, raising ValueError on unknown names."""
+    if not value:
+        return RESULT_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(",") if f.strip() and f.strip() != "_id"))
+    allowed = RESULT_FIELDS + OPTIONAL_FIELDS
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Invalid fields {', '.join(unknown)}, expected any of {', '.join(allowed)}")
+    return fields
 
 def get_base64_encoded_image(img_id):
-    """Fetch and encode an image to Base64 format."""
+    """Fetch and encode an image to Base64 format (served from the process-wide image cache)."""
     try:
-        with fs.get(ObjectId(img_id)) as img:
-            return base64.b64encode(img.read()).decode('utf-8')
+        return image_cache.get_base64(img_id)
     except Exception as e:
         print(f"Error fetching image with ID {img_id}: {e}")
         return None
 
-def paginate(query, page, sort_field="_id", sort_order=1):
-    """Apply pagination to a MongoDB query."""
+def image_url(file_id):
+    """URL of the cacheable binary endpoint for a GridFS image."""
+    return url_for("get_image", file_id=str(file_id))
+
+def add_coordinates(doc):
+    """Expose a detail document's GeoJSON point as top-level latitude/longitude."""
+    coordinates = (doc.get("location") or {}).get("coordinates") or [None, None]
+    doc["longitude"], doc["latitude"] = coordinates
+    return doc
+
+def add_comment_count(doc):
+    """Give a detail document its ``comment_count`` (sightings not yet migrated only have ``user_comments``)."""
+    doc.setdefault("comment_count", len(doc.get("user_comments") or []))
+    return doc
+
+def encode_cursor(doc, sort_field="_id"):
+    """Encode the sort key of the last document on a page as an opaque cursor token."""
+    payload = {"id": doc["_id"]}
+    if sort_field != "_id":
+        payload["v"] = doc.get(sort_field)
+    return base64.urlsafe_b64encode(json_util.dumps(payload).encode("utf-8")).decode("ascii")
+
+def decode_cursor(token):
+    """Decode a cursor token into its (sort value, _id) pair, raising ValueError if malformed."""
+    try:
+        payload = json_util.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        last_id = payload["id"]
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+    if not isinstance(last_id, ObjectId):
+        raise ValueError(f"Invalid cursor: {token}")
+    return payload.get("v"), last_id
+
+def keyset_filter(after, sort_field="_id", sort_order=1):
+    """Build the filter that resumes a sorted scan strictly after the given (sort value, _id) pair."""
+    value, last_id = after
+    op = "$gt" if sort_order == 1 else "$lt"
+    if sort_field == "_id":
+        return {"_id": {op: last_id}}
+    return {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "_id": {op: last_id}}
+    ]}
+
+def query_key(query):
+    """Normalize a MongoDB query into a hashable cache key."""
+    return json_util.dumps(query, sort_keys=True)
+
+def estimate_total(query):
+    """Approximate the number of matches without paying for a full exact count.
+
+    The count stops at ESTIMATE_COUNT_CAP matches and is abandoned after
+    ESTIMATE_COUNT_TIMEOUT_MS, in which case the collection's metadata count is used.
+    """
+    try:
+        return ufoSightings.count_documents(query, limit=ESTIMATE_COUNT_CAP, maxTimeMS=ESTIMATE_COUNT_TIMEOUT_MS)
+    except ExecutionTimeout:
+        return ufoSightings.estimated_document_count()
+
+def build_page(results, total, sort_field="_id", estimated=False):
+    """Build a Page from LIMIT + 1 fetched documents; without ``sort_field`` there is no next cursor."""
+    next_cursor = None
+    if len(results) > LIMIT:
+        results = results[:LIMIT]
+        if sort_field:
+            next_cursor = encode_cursor(results[-1], sort_field)
+    return Page(results, total, next_cursor, estimated)
+
+def paginate(query, page, sort_field="_id", sort_order=1, after=None, projection=None, estimate=False, text_score=False):
+    """Apply pagination to a MongoDB query.
+
+    With ``after`` (a decoded cursor) the page is fetched with a keyset filter on
+    ``(sort_field, _id)`` instead of skipping, so deep pages cost the same as page 1.
+    The first request for a query fetches the page and its exact total in one
+    ``$facet`` aggregation; the total is then cached so later page turns only run
+    the page query. With ``estimate`` an uncached total is approximated instead.
+
+    ``text_score`` orders a ``$text`` query by relevance and adds its ``score``;
+    relevance order cannot be resumed from a cursor, so those pages use offsets.
+
+    ``_id``-ordered pages are served from the in-memory snapshot when it is enabled
+    and fresh and can evaluate the query.
+    """
+    if not text_score and sort_field == "_id" and sort_order == 1:
+        served = snapshot.search(query, (page - 1) * LIMIT, after[1] if after else None, LIMIT + 1)
+        if served is not None:
+            return build_page(*served)
+
+    sort = [(sort_field, sort_order)]
+    if sort_field != "_id":
+        sort.append(("_id", sort_order))
+    agg_sort = dict(sort)
+    agg_projection = projection
+
+    if text_score:
+        after = None
+        sort = [("score", TEXT_SCORE), ("_id", 1)]
+        agg_sort = {"score": -1, "_id": 1}
+        projection = dict(projection or {}, score=TEXT_SCORE)
+        agg_projection = dict(agg_projection, score=1) if agg_projection else None
+
+    # Literal substring regexes are restricted to the trigram index's candidates
+    mongo_query = trigram_index.narrow(query)
+    page_filter = keyset_filter(after, sort_field, sort_order) if after is not None else None
+    offset = 0 if after is not None else (page - 1) * LIMIT
+
+    # Fetch one extra document to know whether a next page exists
+    page_stages = []
+    if page_filter:
+        page_stages.append({"$match": page_filter})
+    if offset:
+        page_stages.append({"$skip": offset})
+    page_stages.append({"$limit": LIMIT + 1})
+    if agg_projection:
+        page_stages.append({"$project": agg_projection})
+
+    count_key = query_key(query)
+    total_results = total_counts.get(count_key)
+    estimated = False
+
+    if total_results is None and not estimate:
+        pipeline = [{"$match": mongo_query}]
+        if text_score:
+            pipeline.append({"$addFields": {"score": TEXT_SCORE}})
+        pipeline += [
+            {"$sort": agg_sort},
+            {"$facet": {"data": page_stages, "total": [{"$count": "count"}]}}
+        ]
+        result = next(iter(ufoSightings.aggregate(pipeline)), {"data": [], "total": []})
+        results = result["data"]
+        total_results = result["total"][0]["count"] if result["total"] else 0
+        total_counts.set(count_key, total_results)
+    else:
+        page_query = {"$and": [mongo_query, page_filter]} if page_filter else mongo_query
+        results = list(
+            ufoSightings.find(page_query, projection)
+            .sort(sort)
+            .skip(offset)
+            .limit(LIMIT + 1)
+        )
+        if total_results is None:
+            total_results = estimate_total(mongo_query)
+            estimated = True
+
+    return build_page(results, total_results, None if text_score else sort_field, estimated)
+
+def paginate_nearest(query, near, page, after=None, projection=None):
+    """Page through the matches of a radius search ordered by distance from its center.
+
+    ``near`` is ``(lon, lat, radius_miles)``. Pages come from ``$geoNear`` on the
+    location index and carry ``distance_miles``; ties are broken by ``_id`` so the order
+    is stable. A cursor resumes after the last ``(distance, _id)`` pair, with
+    ``minDistance`` pruning everything nearer. The total comes from ``query`` (the
+    equivalent ``$geoWithin``) and is cached like paginate()'s.
+    """
+    lon, lat, radius_miles = near
+    served = snapshot.nearest(query, lon, lat, (page - 1) * LIMIT, after, LIMIT + 1)
+    if served is not None:
+        return build_page(*served, sort_field="distance_miles")
+
+    results = list(ufoSightings.aggregate(nearest_pipeline(query, near, page, after, projection)))
+
+    count_key = query_key(query)
+    total_results = total_counts.get(count_key)
+    if total_results is None:
+        total_results = ufoSightings.count_documents(query)
+        total_counts.set(count_key, total_results)
+
+    return build_page(results, total_results, "distance_miles")
+
+def without_location(query):
+    """``query`` minus its ``location`` clause, which ``$geoNear``'s ``maxDistance`` applies instead."""
+    if "$and" in query:
+        clauses = [clause for clause in (without_location(c) for c in query["$and"]) if clause]
+        if len(clauses) > 1:
+            return {"$and": clauses}
+        return clauses[0] if clauses else {}
+    return {field: value for field, value in query.items() if field != "location"}
+
+def nearest_pipeline(query, near, page, after=None, projection=None):
+    """The ``$geoNear`` pipeline fetching one page (LIMIT + 1 documents) of ``query`` for paginate_nearest()."""
+    lon, lat, radius_miles = near
+    geo_near = {
+        "near": {"type": "Point", "coordinates": [lon, lat]},
+        "key": "location",
+        "distanceField": "distance_miles",
+        "distanceMultiplier": 1 / METERS_PER_MILE,
+        "maxDistance": radius_miles * METERS_PER_MILE,
+        "spherical": True
+    }
+    # The other filters (e.g. from/to) still narrow the page
+    rest = without_location(query)
+    if rest:
+        geo_near["query"] = rest
+    pipeline = [{"$geoNear": geo_near}]
     offset = (page - 1) * LIMIT
-    results = (
-        ufoSightings.find(query)
-        .sort([(sort_field, sort_order)])
-        .skip(offset)
-        .limit(LIMIT)
+    if after is not None:
+        geo_near["minDistance"] = max(after[0] * METERS_PER_MILE - DISTANCE_EPSILON_METERS, 0)
+        pipeline.append({"$match": keyset_filter(after, "distance_miles")})
+        offset = 0
+
+    pipeline.append({"$sort": {"distance_miles": 1, "_id": 1}})
+    if offset:
+        pipeline.append({"$skip": offset})
+    pipeline.append({"$limit": LIMIT + 1})
+    if projection:
+        pipeline.append({"$project": dict(projection, distance_miles=1)})
+    return pipeline
+
+def viewport_polygon(west, south, east, north):
+    """GeoJSON polygon for a lon/lat rectangle.
+
+    Polygon edges are geodesics, so the east-west edges get a vertex every
+    VIEWPORT_EDGE_STEP degrees to keep them close to the parallels the map draws.
+    """
+    steps = max(int((east - west) / VIEWPORT_EDGE_STEP), 1)
+    bottom = [[west + (east - west) * i / steps, south] for i in range(steps + 1)]
+    top = [[lon, north] for lon, _ in reversed(bottom)]
+    return {"type": "Polygon", "coordinates": [bottom + top + [bottom[0]]]}
+
+def viewport_query(west, south, east, north):
+    """Filter for the sightings inside a map viewport (a Leaflet ``west,south,east,north`` bbox).
+
+    Viewports crossing the antimeridian or wider than VIEWPORT_MAX_SPAN are split into
+    several polygons, since a GeoJSON polygon must stay within a hemisphere.
+    """
+    if not all(map(math.isfinite, (west, south, east, north))):
+        raise ValueError("Invalid bbox: coordinates must be finite")
+    south, north = max(south, -89.9), min(north, 89.9)
+    if south >= north or east == west:
+        raise ValueError("Invalid bbox: empty area")
+    if east - west >= 360:
+        west, east = -180.0, 180.0
+    else:
+        west = (west + 180) % 360 - 180
+        east = (east + 180) % 360 - 180
+        if east <= west:
+            east += 360
+
+    boxes = []
+    lon = west
+    while lon < east:
+        next_lon = min(lon + VIEWPORT_MAX_SPAN, east)
+        if lon < 180 < next_lon:
+            next_lon = 180
+        boxes.append((lon, next_lon))
+        lon = next_lon
+
+    clauses = []
+    for box_west, box_east in boxes:
+        # Boxes past the antimeridian are shifted back into [-180, 180]
+        shift = 360 if box_west >= 180 else 0
+        polygon = viewport_polygon(box_west - shift, south, box_east - shift, north)
+        clauses.append({"location": {"$geoWithin": {"$geometry": polygon}}})
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+def field_query(field, value, match="contains"):
+    """Build the filter for a field route.
+
+    ``exact`` and ``prefix`` query the indexed lower-cased shadow field (e.g. ``city_lc``)
+    with an equality or an anchored regex; ``contains`` keeps the case-insensitive
+    substring regex on the original field.
+    """
+    if match == "exact":
+        return {f"{field}_lc": value.lower()}
+    if match == "prefix":
+        return {f"{field}_lc": {"$regex": "^" + re.escape(value.lower())}}
+    return {field: {"$regex": value, "$options": "i"}}
+
+def field_search_response(field, value):
+    """Search a single field using the request's ``match`` mode and paginate the results."""
+    try:
+        match = match_mode(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return paginated_response(field_query(field, value, match))
+
+def parse_page_args(args):
+    """Parse the ``page``, ``cursor``/``after``, ``fields`` and ``total`` arguments of a search.
+
+    Returns ``(page, after, fields, estimate)``; raises ValueError on invalid values.
+    """
+    page = int(args.get("page", 1))
+    token = args.get("cursor") or args.get("after")
+    after = decode_cursor(token) if token else None
+    fields = parse_fields(args.get("fields"))
+    return page, after, fields, args.get("total") == "estimate"
+
+def parse_date(value, end=False):
+    """Parse a ``from``/``to`` bound: a year (``1999``), a date (``1999-07-04``) or an ISO datetime.
+
+    With ``end`` a year or date bound is moved to the start of the next year or day,
+    so that ``to`` includes the whole period. Raises ValueError if malformed.
+    """
+    value = value.strip()
+    if len(value) == 4 and value.isdigit():
+        return datetime.datetime(int(value) + (1 if end else 0), 1, 1)
+    parsed = datetime.datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += datetime.timedelta(days=1)
+    return parsed.replace(tzinfo=None) if parsed.tzinfo is None else parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+def date_range_filter(args):
+    """Filter on ``sighted_at`` for the ``from`` (inclusive) and ``to`` arguments, or None without them."""
+    bounds = {}
+    try:
+        if args.get("from"):
+            bounds["$gte"] = parse_date(args["from"])
+        if args.get("to"):
+            bounds["$lt"] = parse_date(args["to"], end=True)
+    except ValueError:
+        raise ValueError("Invalid from/to, expected a year, YYYY-MM-DD or an ISO 8601 datetime")
+    return {"sighted_at": bounds} if bounds else None
+
+def parse_sort(args):
+    """Parse ``sort=datetime`` (oldest first) or ``sort=-datetime`` into ``(sort_field, sort_order)``, or None."""
+    value = args.get("sort")
+    if not value:
+        return None
+    order = -1 if value.startswith("-") else 1
+    field = SORT_FIELDS.get(value.lstrip("-"))
+    if field is None:
+        raise ValueError(f"Invalid sort, expected one of {', '.join(SORT_FIELDS)} (prefixed with - for descending)")
+    return field, order
+
+def search_options(args, query, sort_field="_id", sort_order=1, text_score=False, near=None):
+    """Apply the ``from``/``to`` and ``sort`` arguments shared by every search.
+
+    Returns the possibly narrowed query with the sort to use as
+    ``(query, sort_field, sort_order, text_score)``. Sorting by date replaces
+    relevance order and skips sightings without a date. Raises ValueError on
+    invalid arguments.
+    """
+    date_range = date_range_filter(args)
+    if date_range:
+        query = {"$and": [query, date_range]}
+    sort = parse_sort(args)
+    if sort and near is None:
+        sort_field, sort_order = sort
+        text_score = False
+        if not date_range:
+            query = {"$and": [query, {sort_field: {"$ne": None}}]}
+    return query, sort_field, sort_order, text_score
+
+def page_body(results, total, next_cursor, estimated, page, fields):
+    """JSON body of one page of search results."""
+    return {
+        "data": [convert_to_str(doc, fields) for doc in results],
+        "total": total,
+        "total_estimated": estimated,
+        "page": page,
+        "limit": LIMIT,
+        "next_cursor": next_cursor
+    }
+
+def keyword_query(args):
+    """Build the /search_word filter from ``q`` and ``mode``.
+
+    Returns ``(query, text_score)``; raises ValueError on a missing keyword or an unknown mode.
+    """
+    keyword = args.get("q", "").strip()
+    mode = args.get("mode", "substring")
+
+    if not keyword:
+        raise ValueError("No search term provided")
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Invalid mode, expected one of {', '.join(SEARCH_MODES)}")
+
+    if mode == "text":
+        return {"$text": {"$search": keyword}}, True
+
+    query = {"$or": [
+        {"comments": {"$regex": keyword, "$options": "i"}},
+        {"city": {"$regex": keyword, "$options": "i"}},
+        {"state": {"$regex": keyword, "$options": "i"}},
+        {"shape": {"$regex": keyword, "$options": "i"}}
+    ]}
+    return query, False
+
+def nearby_query(args):
+    """Build the /search_nearby filter from ``lat``, ``lon``, ``radius`` and ``order``.
+
+    Returns ``(query, near)``, where ``near`` is set for ``order=distance`` (see
+    paginate_nearest); raises ValueError on invalid arguments.
+    """
+    try:
+        lat, lon, radius_miles = float(args["lat"]), float(args["lon"]), float(args["radius"])
+    except (KeyError, ValueError):
+        raise ValueError("Invalid latitude, longitude, radius, page, or limit")
+    if not all(map(math.isfinite, (lat, lon, radius_miles))):
+        raise ValueError("Invalid latitude, longitude, radius, page, or limit")
+    order = args.get("order", "id")
+    if order not in NEARBY_ORDERS:
+        raise ValueError(f"Invalid order, expected one of {', '.join(NEARBY_ORDERS)}")
+
+    radius_radians = radius_miles * METERS_PER_MILE / EARTH_RADIUS_METERS  # Convert miles to radians
+    query = {
+        "location": {
+            "$geoWithin": {
+                "$centerSphere": [[lon, lat], radius_radians]  
+            }
+        }
+    }
+    return query, (lon, lat, radius_miles) if order == "distance" else None
+
+def bbox_query(args):
+    """Build the /search_viewport filter from ``bbox``; raises ValueError if it is missing or invalid."""
+    try:
+        west, south, east, north = (float(v) for v in args["bbox"].split(","))
+        return viewport_query(west, south, east, north)
+    except (KeyError, ValueError):
+        raise ValueError("Invalid bbox, expected west,south,east,north")
+
+def match_mode(args):
+    """The ``match`` mode of a field route; raises ValueError if unknown."""
+    match = args.get("match", "contains")
+    if match not in MATCH_MODES:
+        raise ValueError(f"Invalid match, expected one of {', '.join(MATCH_MODES)}")
+    return match
+
+def paginated_response(query, sort_field="_id", sort_order=1, text_score=False, near=None):
+    """Paginate a query using the request's ``page`` or ``cursor``/``after`` arguments and build the JSON response.
+
+    ``total=estimate`` opts into an approximate total when it is not cached yet, and
+    ``fields=city,state,...`` limits each result to the listed fields.
+    ``format=ndjson|csv`` streams every match instead of a single page.
+    ``from``/``to`` restrict the sighting date and ``sort=datetime|-datetime`` orders by it.
+    With ``near`` (see paginate_nearest) pages are ordered by distance.
+    """
+    try:
+        page, after, fields, estimate = parse_page_args(request.args)
+        query, sort_field, sort_order, text_score = search_options(
+            request.args, query, sort_field, sort_order, text_score, near
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    fmt = request.args.get("format")
+    if fmt:
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({"error": f"Invalid format, expected one of {', '.join(EXPORT_FORMATS)}"}), 400
+        return export_response(query, fields, fmt, sort_field, sort_order)
+
+    # Only the serialized fields (plus the sort key the next cursor is built from) cross the wire
+    projection = search_projection(fields)
+    projection.setdefault(sort_field, 1)
+
+    if near is not None:
+        results, total, next_cursor, estimated = paginate_nearest(query, near, page, after, projection)
+    else:
+        results, total, next_cursor, estimated = paginate(
+            query, page, sort_field, sort_order, after, projection, estimate=estimate, text_score=text_score
+        )
+    return jsonify(page_body(results, total, next_cursor, estimated, page, fields))
+
+def export_response(query, fields, fmt, sort_field="_id", sort_order=1):
+    """Stream every match of a query as NDJSON or CSV, gzipped when the client accepts it."""
+    sort = [(sort_field, sort_order)] if sort_field == "_id" else [(sort_field, sort_order), ("_id", sort_order)]
+    cursor = (
+        ufoSightings.find(trigram_index.narrow(query), search_projection(fields))
+        .sort(sort)
+        .batch_size(EXPORT_BATCH_SIZE)
     )
-    total_results = ufoSightings.count_documents(query)
-    return list(results), total_results
+    gzip = request.accept_encodings["gzip"] > 0
+    body = stream_export(
+        cursor,
+        lambda doc: convert_to_str(doc, fields),
+        fmt,
+        ["_id", *fields],
+        current_app.json.dumps,
+        gzip=gzip
+    )
+
+    response = Response(body, mimetype=EXPORT_FORMATS[fmt])
+    response.headers["Content-Disposition"] = f"attachment; filename=sightings.{fmt}"
+    response.vary.add("Accept-Encoding")
+    if gzip:
+        response.content_encoding = "gzip"
+    return response
+
+def facet_response(field, not_found):
+    """Serve a cached facet list with an ETag so unchanged lists revalidate as 304s.
+
+    ``counts=1`` returns ``{"value", "count"}`` entries instead of bare values.
+    """
+    values, etag = facet_lists.get(field)
+    if not values:
+        return jsonify({"error": not_found}), 404
+
+    with_counts = request.args.get("counts") in ("1", "true")
+    response = jsonify(values if with_counts else [v["value"] for v in values])
+    response.set_etag(f"{etag}-counts" if with_counts else etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 # Initialize routes
 def init_routes(app):
@@ -50,251 +639,477 @@ def init_routes(app):
 
     @app.route("/search_word", methods=['GET'])
     def search_sightings():
-        """Search for sightings using a keyword (partial match, case-insensitive) with pagination."""
-        keyword = request.args.get("q", "").strip()
-        page = int(request.args.get("page", 1))
-
-        if not keyword:
-            return jsonify({"error": "No search term provided"}), 400
-
-        query = {"$or": [
-            {"comments": {"$regex": keyword, "$options": "i"}},
-            {"city": {"$regex": keyword, "$options": "i"}},
-            {"state": {"$regex": keyword, "$options": "i"}},
-            {"shape": {"$regex": keyword, "$options": "i"}}
-        ]}
+        """Search for sightings using a keyword with pagination.
 
-        results, total = paginate(query, page)
-        response = {
-            "data": [convert_to_str(doc) for doc in results],
-            "total": total,
-            "page": page,
-            "limit": LIMIT
-        }
-        return jsonify(response)
+        ``mode=substring`` (the default) does a partial, case-insensitive match over
+        comments, city, state and shape. ``mode=text`` uses the full-text index instead,
+        with stemming and results ordered by relevance.
+        """
+        try:
+            query, text_score = keyword_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return paginated_response(query, text_score=text_score)
 
     @app.route("/search_nearby", methods=['GET'])
     def search_nearby():
-        """Find sightings within a geospatial area (latitude, longitude, and radius) with pagination."""
+        """Find sightings within a geospatial area (latitude, longitude, and radius) with pagination.
+
+        ``order=distance`` returns the nearest sightings first, each with ``distance_miles``.
+        """
         try:
-            lat, lon, radius_miles = float(request.args["lat"]), float(request.args["lon"]), float(request.args["radius"])
-            page = int(request.args.get("page", 1))
+            query, near = nearby_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return paginated_response(query, near=near)
+
+    @app.route("/search_viewport", methods=['GET'])
+    def search_viewport():
+        """Find sightings inside the map's visible area with pagination.
+
+        ``bbox`` is ``west,south,east,north`` in degrees, as produced by Leaflet's
+        ``getBounds().toBBoxString()``.
+        """
+        try:
+            query = bbox_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return paginated_response(query)
+
+    @app.route("/clusters", methods=['GET'])
+    def get_clusters():
+        """Aggregated sighting clusters for a map view.
+
+        Takes the Leaflet ``bbox`` (``west,south,east,north``) and ``zoom``, and returns
+        one entry per grid cell with its count, centroid and dominant shape.
+        """
+        try:
+            west, south, east, north = (float(v) for v in request.args["bbox"].split(","))
+            zoom = int(request.args["zoom"])
         except (KeyError, ValueError):
-            return jsonify({"error": "Invalid latitude, longitude, radius, page, or limit"}), 400
-
-        radius_radians = radius_miles / 3959  # Convert miles to radians
-        query = {
-            "location": {
-                "$geoWithin": {
-                    "$centerSphere": [[lon, lat], radius_radians]  
-                }
-            }
-        }
-        results, total = paginate(query, page)
-        response = {
-            "data": [convert_to_str(doc) for doc in results],
-            "total": total,
-            "page": page,
-            "limit": LIMIT
-        }
-        return jsonify(response)
+            return jsonify({"error": "Invalid bbox or zoom, expected bbox=west,south,east,north&zoom=<int>"}), 400
+        if not all(map(math.isfinite, (west, south, east, north))) or south >= north or zoom < 0:
+            return jsonify({"error": "Invalid bbox or zoom, expected bbox=west,south,east,north&zoom=<int>"}), 400
+
+        zoom, clusters = cluster_pyramid.clusters(zoom, west, south, east, north)
+        response = jsonify({"zoom": zoom, "clusters": clusters})
+        response.cache_control.public = True
+        response.cache_control.max_age = MAP_MAX_AGE
+        return response
+
+    @app.route("/tiles/<int:z>/<int:x>/<int:y>", methods=['GET'])
+    def get_tile(z, x, y):
+        """Aggregated sighting clusters of one slippy-map tile."""
+        # Checked before shifting so a huge z cannot allocate a huge integer
+        if z > MAX_TILE_ZOOM or not (x < (1 << z) and y < (1 << z)):
+            return jsonify({"error": "Tile out of range"}), 404
+
+        response = jsonify({"z": z, "x": x, "y": y, "clusters": cluster_pyramid.tile(z, x, y)})
+        response.cache_control.public = True
+        response.cache_control.max_age = MAP_MAX_AGE
+        return response
+
+    @app.route("/heatmap", methods=['GET'])
+    def get_heatmap():
+        """Sighting density grid over a bounding box.
+
+        Takes ``bbox`` (``west,south,east,north``, default the whole world), the grid
+        ``width`` and ``height`` in cells and optional ``shape``, ``state`` and ``year``
+        filters. ``grid`` rows run from north to south.
+        """
+        try:
+            bbox = request.args.get("bbox", "-180,-90,180,90")
+            west, south, east, north = (float(v) for v in bbox.split(","))
+            width = int(request.args.get("width", DEFAULT_GRID_SIZE))
+            height = int(request.args.get("height", DEFAULT_GRID_SIZE))
+            year = int(request.args["year"]) if "year" in request.args else None
+        except ValueError:
+            return jsonify({"error": "Invalid bbox, width, height or year"}), 400
+        finite = all(map(math.isfinite, (west, south, east, north)))
+        if not finite or south >= north or not (0 < width <= MAX_GRID_SIZE and 0 < height <= MAX_GRID_SIZE):
+            return jsonify({"error": f"Invalid bbox, or grid size outside 1-{MAX_GRID_SIZE}"}), 400
+
+        shape = request.args.get("shape", "").strip().lower() or None
+        state = request.args.get("state", "").strip().lower() or None
+        try:
+            counts = sighting_points.histogram(west, south, east, north, width, height, shape, state, year)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+        response = jsonify({
+            "bbox": [west, south, east, north],
+            "width": width,
+            "height": height,
+            "total": int(counts.sum()),
+            "max": int(counts.max()),
+            "grid": counts.tolist()
+        })
+        response.cache_control.public = True
+        response.cache_control.max_age = MAP_MAX_AGE
+        return response
+
+    @app.route("/heatmap/stats", methods=['GET'])
+    def get_heatmap_stats():
+        """Report the size and memory use of the heatmap's coordinate arrays."""
+        return jsonify(sighting_points.stats())
+
+    @app.route("/timeline", methods=['GET'])
+    def get_timeline():
+        """Sighting counts over time.
+
+        ``by`` buckets per ``year`` (default), ``month`` (``YYYY-MM``) or ``hour`` of the
+        day; ``from``/``to``, ``shape`` and ``state`` narrow the sightings counted.
+        """
+        by = request.args.get("by", "year")
+        if by not in TIMELINE_BUCKETS:
+            return jsonify({"error": f"Invalid by, expected one of {', '.join(TIMELINE_BUCKETS)}"}), 400
+        try:
+            date_range = date_range_filter(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        match = date_range or {"sighted_at": {"$ne": None}}
+        for field in ("shape", "state"):
+            value = request.args.get(field, "").strip().lower()
+            if value:
+                match[field] = value
+
+        key = (by, query_key(match))
+        buckets = timeline_cache.get(key)
+        if buckets is None:
+            try:
+                buckets = list(ufoSightings.aggregate([
+                    {"$match": match},
+                    {"$group": {"_id": TIMELINE_BUCKETS[by], "count": {"$sum": 1}}},
+                    {"$sort": {"_id": 1}},
+                    {"$project": {"_id": 0, "bucket": "$_id", "count": 1}}
+                ]))
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+            timeline_cache.set(key, buckets)
+
+        response = jsonify({"by": by, "buckets": buckets, "total": sum(b["count"] for b in buckets)})
+        response.cache_control.public = True
+        response.cache_control.max_age = MAP_MAX_AGE
+        return response
+
+    @app.route("/stats", methods=['GET'])
+    def get_stats_status():
+        """List the materialized rollups and when new sightings were last folded in."""
+        try:
+            return jsonify(sighting_stats.status())
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/stats/<rollup>", methods=['GET'])
+    def get_stats(rollup):
+        """Sighting counts per key of a materialized rollup (e.g. /stats/country_shape?country=us).
+
+        Any of the rollup's fields can be given as an argument to only return its keys with that value.
+        """
+        if rollup not in ROLLUPS:
+            return jsonify({"error": f"Unknown rollup {rollup}, expected one of {', '.join(ROLLUPS)}"}), 404
+        filters = {}
+        for field in ROLLUPS[rollup]:
+            value = request.args.get(field, "").strip().lower()
+            if not value:
+                continue
+            try:
+                filters[field] = int(value) if field == "year" else value
+            except ValueError:
+                return jsonify({"error": "Invalid year"}), 400
+        try:
+            buckets = sighting_stats.rollup(rollup, filters)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+        response = jsonify({
+            "rollup": rollup,
+            "fields": list(ROLLUPS[rollup]),
+            "buckets": buckets,
+            "total": sum(b["count"] for b in buckets)
+        })
+        response.cache_control.public = True
+        response.cache_control.max_age = MAP_MAX_AGE
+        return response
+
+    @app.route("/snapshot/stats", methods=['GET'])
+    def get_snapshot_stats():
+        """Report the in-memory snapshot's size, memory use and age."""
+        return jsonify(snapshot.stats())
 
     @app.route("/sighting/<sighting_id>", methods=['GET'])
     def get_sighting(sighting_id):
-        """Fetch full sighting details including text and images."""
+        """Fetch full sighting details including text and images.
+
+        Images are inlined as Base64 by default; ``images=url`` returns ``image_url`` and
+        ``ufo_image_url`` links to the cacheable /image endpoint instead.
+        """
+        images = request.args.get("images", "base64")
+        if images not in IMAGE_MODES:
+            return jsonify({"error": f"Invalid images, expected one of {', '.join(IMAGE_MODES)}"}), 400
+
         doc = ufoSightings.find_one({"_id": ObjectId(sighting_id)})
         if not doc:
             return jsonify({"error": "Sighting not found"}), 404
 
-        img_id = doc.get("image")
-        encoded_string = get_base64_encoded_image(img_id) if img_id else None
+        img_id = doc.pop("image", None)
+        ufo_img_id = doc.pop("ufo_image", None)
 
-        ufo_img_id = doc.get("ufo_image")
-        ufo_encoded_string = get_base64_encoded_image(ufo_img_id) if ufo_img_id else None
+        doc["_id"] = str(doc["_id"])
+        if images == "url":
+            doc["image_url"] = image_url(img_id) if img_id else None
+            doc["ufo_image_url"] = image_url(ufo_img_id) if ufo_img_id else None
+        else:
+            doc["image"] = get_base64_encoded_image(img_id) if img_id else None  # Base64 encoded string for frontend display
+            doc["ufo_image"] = get_base64_encoded_image(ufo_img_id) if ufo_img_id else None  # Base64 encoded string for frontend display
 
+        add_coordinates(doc)
+        add_comment_count(doc)
+        return jsonify(doc)
 
-        doc["_id"] = str(doc["_id"])
-        doc["image"] = encoded_string  # Base64 encoded string for frontend display
-        doc["ufo_image"] = ufo_encoded_string  # Base64 encoded string for frontend display
+    @app.route("/sightings/batch", methods=['POST'])
+    def get_sightings_batch():
+        """Fetch the details of many sightings with a single query.
 
-        coordinates = doc.get("location", {}).get("coordinates", [None, None])
-        longitude, latitude = coordinates 
-        doc["latitude"] = latitude  
-        doc["longitude"] = longitude  
+        Takes ``{"ids": [...], "images": "base64" | "url"}`` and returns a map of id to
+        detail. Each image is resolved once per batch: details carry ``image_id`` and
+        ``ufo_image_id``, which index the shared ``images`` map.
+        """
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return jsonify({"error": "Expected a JSON object"}), 400
+        ids = body.get("ids")
+        images = body.get("images", "base64")
 
-        return jsonify(doc)
+        if not isinstance(ids, list) or not ids:
+            return jsonify({"error": "Expected a non-empty list of ids"}), 400
+        if len(ids) > MAX_BATCH_IDS:
+            return jsonify({"error": f"At most {MAX_BATCH_IDS} ids per batch"}), 400
+        if images not in IMAGE_MODES:
+            return jsonify({"error": f"Invalid images, expected one of {', '.join(IMAGE_MODES)}"}), 400
+        try:
+            object_ids = list(dict.fromkeys(ObjectId(i) for i in ids))
+        except (InvalidId, TypeError):
+            return jsonify({"error": "Invalid sighting id"}), 400
+
+        details = {}
+        image_ids = set()
+        for doc in ufoSightings.find({"_id": {"$in": object_ids}}, None):
+            img_id = doc.pop("image", None)
+            ufo_img_id = doc.pop("ufo_image", None)
+            image_ids.update(i for i in (img_id, ufo_img_id) if i)
+
+            doc["_id"] = str(doc["_id"])
+            doc["image_id"] = str(img_id) if img_id else None
+            doc["ufo_image_id"] = str(ufo_img_id) if ufo_img_id else None
+            add_coordinates(doc)
+            add_comment_count(doc)
+            details[doc["_id"]] = doc
+
+        if images == "url":
+            resolved = {str(i): image_url(i) for i in image_ids}
+        else:
+            resolved = {str(i): get_base64_encoded_image(i) for i in image_ids}
+
+        response = {
+            "data": details,
+            "images": resolved,
+            "missing": [str(i) for i in object_ids if str(i) not in details]
+        }
+        return jsonify(response)
+
+    @app.route("/image/<file_id>", methods=['GET'])
+    def get_image(file_id):
+        """Serve a GridFS image with long-lived HTTP caching and Range support.
+
+        GridFS files are never modified in place, so the file id is a strong ETag and
+        browsers may cache the response indefinitely.
+        """
+        try:
+            image = image_cache.get(file_id)
+        except InvalidId:
+            return jsonify({"error": "Invalid image id"}), 400
+        except NoFile:
+            return jsonify({"error": "Image not found"}), 404
+
+        response = Response(image.data, mimetype=image.content_type)
+        response.set_etag(file_id)
+        response.cache_control.public = True
+        response.cache_control.max_age = IMAGE_MAX_AGE
+        response.cache_control.immutable = True
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(image.data))
+
+    @app.route("/images/stats", methods=['GET'])
+    def get_image_cache_stats():
+        """Report the image cache's hit, miss and eviction counters."""
+        return jsonify(image_cache.stats())
 
     @app.route("/sighting/<sighting_id>/comment", methods=['POST'])
+    @use_primary
     def add_comment(sighting_id):
-        """Add a comment to a sighting."""
-        doc = ufoSightings.find_one({"_id": ObjectId(sighting_id)})
-        if not doc:
-            return jsonify({"error": "Sighting not found"}), 404
+        """Add a comment to a sighting.
+
+        A single conditional update bumps ``comment_count`` and keeps the latest
+        COMMENT_PREVIEW comments on the sighting (404 when it does not exist); the
+        comment itself is stored in the comments collection. A sighting not migrated
+        yet (see db.migrate_user_comments) is migrated first, so the update neither
+        drops its older comments nor starts its count from zero.
+        """
+        try:
+            oid = ObjectId(sighting_id)
+        except InvalidId:
+            return jsonify({"error": "Invalid sighting id"}), 400
 
-        comment = request.json.get("comment", "").strip()
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or not isinstance(body.get("comment", ""), str):
+            return jsonify({"error": "Expected a JSON object with a comment string"}), 400
+        comment = body.get("comment", "").strip()
         if not comment:
             return jsonify({"error": "Empty comment"}), 400
 
-        ufoSightings.update_one({"_id": ObjectId(sighting_id)}, {"$push": {"user_comments": comment}})
+        migrated = {"_id": oid, "comment_count": {"$exists": True}}
+        update = {
+            "$inc": {"comment_count": 1},
+            "$push": {"user_comments": {"$each": [comment], "$slice": -COMMENT_PREVIEW}}
+        }
+        result = ufoSightings.update_one(migrated, update)
+        if not result.matched_count:
+            migrate_sighting_comments(oid)
+            result = ufoSightings.update_one(migrated, update)
+            if not result.matched_count:
+                return jsonify({"error": "Sighting not found"}), 404
+
+        sightingComments.insert_one({
+            "sighting_id": oid,
+            "comment": comment,
+            "created_at": datetime.datetime.now(datetime.timezone.utc)
+        })
         return jsonify({"success": True, "user_comment": comment})
 
-    @app.route("/sightings/country/<country_code>", methods=['GET'])
-    def search_country(country_code):
-        """Search for sightings using a country with pagination."""
+    @app.route("/sighting/<sighting_id>/comments", methods=['GET'])
+    def get_comments(sighting_id):
+        """Page through a sighting's comments, newest first, with ``cursor`` (or ``page``)."""
+        try:
+            oid = ObjectId(sighting_id)
+        except InvalidId:
+            return jsonify({"error": "Invalid sighting id"}), 400
         try:
             page = int(request.args.get("page", 1))
+            token = request.args.get("cursor")
+            after = decode_cursor(token) if token else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-            query = {"country": {"$regex": country_code, "$options": "i"}}
-            results, total = paginate(query, page)
-            
-            response = {
-                "data": [convert_to_str(doc) for doc in results],
-                "total": total,
-                "page": page,
-                "limit": LIMIT
-            }
-            return jsonify(response)
+        query = {"sighting_id": oid}
+        page_query = {"$and": [query, keyset_filter(after, "created_at", -1)]} if after else query
+        comments = list(
+            sightingComments.find(page_query, {"sighting_id": 0})
+            .sort([("created_at", -1), ("_id", -1)])
+            .skip(0 if after else (page - 1) * COMMENTS_LIMIT)
+            .limit(COMMENTS_LIMIT + 1)
+        )
+        next_cursor = None
+        if len(comments) > COMMENTS_LIMIT:
+            comments = comments[:COMMENTS_LIMIT]
+            next_cursor = encode_cursor(comments[-1], "created_at")
+        return jsonify({
+            "data": [dict(c, _id=str(c["_id"])) for c in comments],
+            "total": sightingComments.count_documents(query),
+            "limit": COMMENTS_LIMIT,
+            "next_cursor": next_cursor
+        })
+
+    @app.route("/sightings/bulk", methods=['POST'])
+    def ingest_sightings():
+        """Insert new sightings from an NDJSON body, one source row (as in ufo_scrubbed.csv) per line.
+
+        Rows are validated and inserted in unordered batches; rejected rows are reported
+        by line number without failing the others. Lines past MAX_BULK_ROWS are not read.
+        """
+        def rows():
+            for line, raw in enumerate(request.stream, start=1):
+                if not raw.strip():
+                    continue
+                if line > MAX_BULK_ROWS:
+                    yield line, ValueError(f"Row limit reached, at most {MAX_BULK_ROWS} rows per request")
+                    return
+                try:
+                    yield line, current_app.json.loads(raw)
+                except ValueError as e:
+                    yield line, ValueError(f"Invalid JSON: {e}")
+
+        try:
+            inserted, errors = ingest_rows(rows())
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        if inserted:
+            # New sightings change the totals and facets; the map structures pick them up on refresh
+            total_counts.clear()
+            facet_lists.invalidate()
+        return jsonify({"inserted": inserted, "failed": len(errors), "errors": errors})
+
+    @app.route("/sightings/country/<country_code>", methods=['GET'])
+    def search_country(country_code):
+        """Search for sightings using a country (match=contains|exact|prefix) with pagination."""
+        try:
+            return field_search_response("country", country_code)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
     @app.route("/sightings/city/<city_name>", methods=['GET'])
     def search_city(city_name):
-        """Search for sightings using a city with pagination."""
+        """Search for sightings using a city (match=contains|exact|prefix) with pagination."""
         try:
-            page = int(request.args.get("page", 1))
-
-            query = {"city": {"$regex": city_name, "$options": "i"}}
-            results, total = paginate(query, page)
-            
-            response = {
-                "data": [convert_to_str(doc) for doc in results],
-                "total": total,
-                "page": page,
-                "limit": LIMIT
-            }
-            return jsonify(response)
+            return field_search_response("city", city_name)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
     @app.route("/sightings/shape/<shape_name>", methods=['GET'])
     def search_shape(shape_name):
-        """Search for sightings using a shape with pagination."""
+        """Search for sightings using a shape (match=contains|exact|prefix) with pagination."""
         try:
-            page = int(request.args.get("page", 1))
-
-            query = {"shape": {"$regex": shape_name, "$options": "i"}}
-            results, total = paginate(query, page)
-
-            response = {
-                "data": [convert_to_str(doc) for doc in results],
-                "total": total,
-                "page": page,
-                "limit": LIMIT
-            }
-            return jsonify(response)
+            return field_search_response("shape", shape_name)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
         
     @app.route("/sightings/comments/<comment>", methods=['GET'])
     def search_comments(comment):
         """Search for sightings using a comment with pagination."""
-        page = int(request.args.get("page", 1))
-        
         query = {"comments": {"$regex": comment, "$options": "i"}}
-        results, total = paginate(query, page)
-        
-        response = {
-            "data": [convert_to_str(doc) for doc in results],
-            "total": total,
-            "page": page,
-            "limit": LIMIT
-        }
-        return jsonify(response)
+        return paginated_response(query)
 
     @app.route("/sightings/state/<state_code>", methods=['GET'])
     def search_state(state_code):
-        """Search for sightings using a state with pagination."""
+        """Search for sightings using a state (match=contains|exact|prefix) with pagination."""
         try:
-            page = int(request.args.get("page", 1))
-
-            query = {"state": {"$regex": state_code, "$options": "i"}}
-            results, total = paginate(query, page)
-            
-            response = {
-                "data": [convert_to_str(doc) for doc in results],
-                "total": total,
-                "page": page,
-                "limit": LIMIT
-            }
-            return jsonify(response)
+            return field_search_response("state", state_code)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
         
     @app.route("/countries", methods=['GET'])
     def get_countries():
         """Fetch list of all countries."""
-        pipeline = [
-            {"$group": {"_id": "$country"}}
-        ]
-        
         try:
-            # Fetch the aggregated results as a list
-            results = list(ufoSightings.aggregate(pipeline))
-            
-            # Check if results are empty
-            if not results:
-                return jsonify({"error": "Countries not found"}), 404
-            
-            # Create a simple list of country names
-            countries = [r["_id"] for r in results if r["_id"]]
-            return jsonify(countries), 200
-
+            return facet_response("country", "Countries not found")
         except Exception as e:
             # Handle unexpected errors
             return jsonify({"error": str(e)}), 500
-        
+
     @app.route("/states", methods=['GET'])
     def get_states():
         """Fetch list of all states."""
-        pipeline = [
-            {"$group": {"_id": "$state"}}
-        ]
-        
         try:
-            # Fetch the aggregated results as a list
-            results = list(ufoSightings.aggregate(pipeline))
-            
-            # Check if results are empty
-            if not results:
-                return jsonify({"error": "States not found"}), 404
-            
-            # Create a simple list of state names
-            states = [r["_id"] for r in results if r["_id"]]
-            return jsonify(states), 200
-
+            return facet_response("state", "States not found")
         except Exception as e:
             # Handle unexpected errors
             return jsonify({"error": str(e)}), 500
-        
+
     @app.route("/shapes", methods=['GET'])
     def get_shapes():
         """Fetch list of all shapes."""
-        pipeline = [
-            {"$group": {"_id": "$shape"}}
-        ]
-        
         try:
-            # Fetch the aggregated results as a list
-            results = list(ufoSightings.aggregate(pipeline))
-            
-            # Check if results are empty
-            if not results:
-                return jsonify({"error": "Shapes not found"}), 404
-            
-            # Create a simple list of country names
-            shapes = [r["_id"] for r in results if r["_id"]]
-            return jsonify(shapes), 200
-
+            return facet_response("shape", "Shapes not found")
         except Exception as e:
             # Handle unexpected errors
             return jsonify({"error": str(e)}), 500
@@ -0,0 +1,342 @@
+import json
+import re
+import threading
+import time
+import numpy as np
+from bson import ObjectId
+from db import ufoSightings
+
+# How often the background thread rebuilds the snapshot from MongoDB
+SNAPSHOT_REFRESH_INTERVAL = 60  # seconds
+
+# Searches fall back to MongoDB when the snapshot is older than this (e.g. MongoDB is unreachable)
+SNAPSHOT_MAX_STALENESS = 300  # seconds
+
+# Dictionary-encoded string columns; comments are mostly unique and are stored as is
+CATEGORY_FIELDS = ("city", "state", "country", "shape")
+TEXT_FIELDS = ("comments",)
+
+# $geoNear reports distances on a sphere of this radius
+EARTH_RADIUS_METERS = 6378100
+METERS_PER_MILE = 1609.344
+
+# Code of a missing (or non-string) value in a dictionary-encoded column
+MISSING = -1
+
+LOAD_BATCH_SIZE = 5000
+
+
+class Unsupported(Exception):
+    """The query uses an operator the snapshot cannot evaluate; MongoDB answers it instead."""
+
+
+def _string_matcher(condition):
+    """Predicate over strings for an equality or ``$regex`` condition, following MongoDB's semantics."""
+    if isinstance(condition, str):
+        return lambda s: s == condition
+    if not isinstance(condition, dict) or set(condition) - {"$regex", "$options"}:
+        raise Unsupported(condition)
+    options = condition.get("$options", "")
+    if set(options) - {"i"}:
+        raise Unsupported(condition)
+    pattern = condition["$regex"]
+    if "i" in options and re.escape(pattern) == pattern:
+        # Plain keywords skip the regex engine
+        needle = pattern.lower()
+        return lambda s: needle in s.lower()
+    try:
+        compiled = re.compile(pattern, re.IGNORECASE if "i" in options else 0)
+    except re.error as e:
+        raise Unsupported(condition) from e
+    return lambda s: compiled.search(s) is not None
+
+
+class Columns:
+    """One immutable, fully built generation of the snapshot."""
+
+    def __init__(self, ids, lon, lat, sighted_at, codes, dictionaries, texts, built_at, loaded_at=None):
+        self.ids = ids                    # ObjectId bytes, ascending (S12)
+        self.lon = lon                    # float64, NaN without a location
+        self.lat = lat
+        self.sighted_at = sighted_at      # datetime64[us], NaT without a parsed date
+        self.codes = codes                # field -> int32 codes into dictionaries[field]
+        self.dictionaries = dictionaries  # field -> list of distinct raw values
+        self.texts = texts                # field -> list of raw values per row
+        self.built_at = built_at          # wall-clock time of the data's MongoDB read
+        self.loaded_at = loaded_at        # wall-clock time it was read from a file, None when built
+        self._lowered = {
+            field: [v.lower() if isinstance(v, str) else None for v in values]
+            for field, values in dictionaries.items()
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.lon.nbytes + self.lat.nbytes + self.sighted_at.nbytes + sum(c.nbytes for c in self.codes.values())
+
+    def _category_mask(self, field, values, matches):
+        table = np.fromiter((v is not None and matches(v) for v in values), dtype=bool, count=len(values))
+        codes = self.codes[field]
+        return np.where(codes == MISSING, False, table[codes]) if len(table) else np.zeros(len(self), dtype=bool)
+
+    def mask(self, query):
+        """Evaluate the subset of MongoDB filters built by the routes as a boolean row mask."""
+        mask = np.ones(len(self), dtype=bool)
+        for key, condition in query.items():
+            if key in ("$or", "$and"):
+                parts = [self.mask(clause) for clause in condition]
+                combined = np.logical_or.reduce(parts) if key == "$or" else np.logical_and.reduce(parts)
+                mask &= combined
+            elif key in CATEGORY_FIELDS:
+                values = [v if isinstance(v, str) else None for v in self.dictionaries[key]]
+                mask &= self._category_mask(key, values, _string_matcher(condition))
+            elif key.endswith("_lc") and key[:-3] in CATEGORY_FIELDS:
+                field = key[:-3]
+                mask &= self._category_mask(field, self._lowered[field], _string_matcher(condition))
+            elif key in TEXT_FIELDS:
+                matches = _string_matcher(condition)
+                values = self.texts[key]
+                mask &= np.fromiter((isinstance(v, str) and matches(v) for v in values), dtype=bool, count=len(values))
+            elif key == "location":
+                mask &= self._location_mask(condition)
+            else:
+                raise Unsupported(key)
+        return mask
+
+    def _location_mask(self, condition):
+        located = ~np.isnan(self.lon)
+        if condition == {"$ne": None}:
+            return located
+        try:
+            (lon, lat), radius = condition["$geoWithin"]["$centerSphere"]
+        except (KeyError, TypeError, ValueError) as e:
+            raise Unsupported(condition) from e
+        with np.errstate(invalid="ignore"):
+            return located & (self.angles(lon, lat) <= radius)
+
+    def angles(self, lon, lat):
+        """Great-circle angle in radians from a point to every row (haversine)."""
+        lon1, lat1 = np.radians(self.lon), np.radians(self.lat)
+        lon0, lat0 = np.radians(lon), np.radians(lat)
+        a = np.sin((lat1 - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat1) * np.sin((lon1 - lon0) / 2) ** 2
+        return 2 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+    def document(self, row):
+        """Rebuild the search fields of a row as MongoDB would return them."""
+        # NumPy drops trailing NUL bytes from S12 items (without changing their order)
+        doc = {"_id": ObjectId(bytes(self.ids[row]).ljust(12, b"\0"))}
+        for field in CATEGORY_FIELDS:
+            code = self.codes[field][row]
+            if code != MISSING:
+                doc[field] = self.dictionaries[field][code]
+        for field in TEXT_FIELDS:
+            if self.texts[field][row] is not None:
+                doc[field] = self.texts[field][row]
+        if not np.isnan(self.lon[row]):
+            doc["location"] = {"coordinates": [float(self.lon[row]), float(self.lat[row])]}
+        if not np.isnat(self.sighted_at[row]):
+            doc["sighted_at"] = self.sighted_at[row].item()
+        return doc
+
+
+def _build_columns(docs, built_at):
+    ids, lon, lat, sighted_at = [], [], [], []
+    vocabularies = {field: {} for field in CATEGORY_FIELDS}
+    codes = {field: [] for field in CATEGORY_FIELDS}
+    texts = {field: [] for field in TEXT_FIELDS}
+    for doc in docs:
+        ids.append(doc["_id"].binary)
+        coordinates = (doc.get("location") or {}).get("coordinates") or [np.nan, np.nan]
+        lon.append(coordinates[0])
+        lat.append(coordinates[1])
+        sighted_at.append(doc.get("sighted_at") or np.datetime64("NaT"))
+        for field in CATEGORY_FIELDS:
+            value = doc.get(field)
+            codes[field].append(MISSING if value is None else vocabularies[field].setdefault(value, len(vocabularies[field])))
+        for field in TEXT_FIELDS:
+            texts[field].append(doc.get(field))
+    return Columns(
+        np.array(ids, dtype="S12"),
+        np.array(lon, dtype=np.float64),
+        np.array(lat, dtype=np.float64),
+        np.array(sighted_at, dtype="datetime64[us]"),
+        {field: np.array(c, dtype=np.int32) for field, c in codes.items()},
+        {field: list(v) for field, v in vocabularies.items()},
+        texts,
+        built_at
+    )
+
+
+def _encode_json(value):
+    return np.frombuffer(json.dumps(value).encode("utf-8"), dtype=np.uint8)
+
+
+def _decode_json(array):
+    return json.loads(array.tobytes().decode("utf-8"))
+
+
+class ColumnarSnapshot:
+    """Read-only, in-process copy of the searchable sighting fields.
+
+    The collection is small and read-mostly, so field, keyword and radius searches
+    can be answered from memory: ``_id``, coordinates and ``sighted_at`` are NumPy arrays and
+    city/state/country/shape are dictionary-encoded, so a regex is evaluated once
+    per distinct value and expanded to rows with a lookup. Filters the snapshot
+    cannot evaluate, and every search while it is older than ``max_staleness``,
+    go to MongoDB, which stays the write store. A background thread rebuilds it
+    every ``refresh_interval`` seconds; save()/load() keep a compact copy on disk
+    so a restart can serve searches before MongoDB has been read. A loaded copy
+    is served however old it is until the first rebuild replaces it, for at most
+    ``max_staleness`` after loading.
+    """
+
+    def __init__(self, refresh_interval=SNAPSHOT_REFRESH_INTERVAL, max_staleness=SNAPSHOT_MAX_STALENESS):
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self._columns = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def build(self):
+        """Rebuild the snapshot from MongoDB and swap it in."""
+        built_at = time.time()
+        projection = {field: 1 for field in CATEGORY_FIELDS + TEXT_FIELDS + ("sighted_at",)}
+        projection["location.coordinates"] = 1
+        cursor = ufoSightings.find({}, projection).sort([("_id", 1)]).batch_size(LOAD_BATCH_SIZE)
+        self._columns = _build_columns(cursor, built_at)
+
+    def save(self, path):
+        """Write the current snapshot to a compressed ``.npz`` file."""
+        columns = self._columns
+        if columns is None:
+            raise RuntimeError("No snapshot to save")
+        arrays = {
+            "ids": columns.ids, "lon": columns.lon, "lat": columns.lat,
+            "sighted_at": columns.sighted_at, "built_at": np.array(columns.built_at)
+        }
+        for field in CATEGORY_FIELDS:
+            arrays[f"{field}_codes"] = columns.codes[field]
+            arrays[f"{field}_values"] = _encode_json(columns.dictionaries[field])
+        for field in TEXT_FIELDS:
+            arrays[f"{field}_text"] = _encode_json(columns.texts[field])
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    def load(self, path):
+        """Swap in a snapshot saved by save()."""
+        with np.load(path, allow_pickle=False) as data:
+            self._columns = Columns(
+                data["ids"],
+                data["lon"],
+                data["lat"],
+                data["sighted_at"],
+                {field: data[f"{field}_codes"] for field in CATEGORY_FIELDS},
+                {field: _decode_json(data[f"{field}_values"]) for field in CATEGORY_FIELDS},
+                {field: _decode_json(data[f"{field}_text"]) for field in TEXT_FIELDS},
+                float(data["built_at"]),
+                time.time()
+            )
+
+    def clear(self):
+        self._columns = None
+
+    def start(self, path=None):
+        """Load ``path`` if it exists, then keep the snapshot fresh from a daemon thread (saving to ``path``)."""
+        if path:
+            try:
+                self.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not load snapshot {path}: {e}")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(path,), name="snapshot-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, path):
+        columns = self._columns
+        delay = 0 if columns is None else max(self.refresh_interval - (time.time() - columns.built_at), 0)
+        while not self._stop.wait(delay):
+            try:
+                self.build()
+                if path:
+                    self.save(path)
+            except Exception as e:
+                print(f"Snapshot refresh failed: {e}")
+            delay = self.refresh_interval
+
+    def _current(self):
+        columns = self._columns
+        if columns is None:
+            return None
+        fresh_at = columns.built_at if columns.loaded_at is None else columns.loaded_at
+        if time.time() - fresh_at > self.max_staleness:
+            return None
+        return columns
+
+    def search(self, query, offset, after_id=None, limit=None):
+        """Rows matching ``query`` in ``_id`` order, as ``(documents, total)``, or None to use MongoDB.
+
+        The page starts after ``after_id`` (a keyset cursor) or at ``offset``.
+        """
+        columns = self._current()
+        if columns is None:
+            return None
+        try:
+            rows = np.flatnonzero(columns.mask(query))
+        except Unsupported:
+            return None
+        total = len(rows)
+        if after_id is not None:
+            start = np.searchsorted(columns.ids[rows], after_id.binary, side="right")
+        else:
+            start = offset
+        page = rows[start:start + limit] if limit is not None else rows[start:]
+        return [columns.document(row) for row in page], total
+
+    def nearest(self, query, lon, lat, offset, after=None, limit=None):
+        """Rows matching ``query`` nearest to a point first, each with ``distance_miles``, or None to use MongoDB.
+
+        ``after`` is a decoded ``(distance_miles, _id)`` cursor.
+        """
+        columns = self._current()
+        if columns is None:
+            return None
+        try:
+            rows = np.flatnonzero(columns.mask(query) & ~np.isnan(columns.lon))
+        except Unsupported:
+            return None
+        total = len(rows)
+        distances = columns.angles(lon, lat)[rows] * EARTH_RADIUS_METERS / METERS_PER_MILE
+        order = np.lexsort((columns.ids[rows], distances))
+        rows, distances = rows[order], distances[order]
+        if after is not None:
+            value, last_id = after
+            keep = (distances > value) | ((distances == value) & (columns.ids[rows] > last_id.binary))
+            rows, distances = rows[keep], distances[keep]
+            offset = 0
+        end = offset + limit if limit is not None else None
+        documents = []
+        for row, distance in zip(rows[offset:end], distances[offset:end]):
+            doc = columns.document(row)
+            doc["distance_miles"] = float(distance)
+            documents.append(doc)
+        return documents, total
+
+    def stats(self):
+        """Report the snapshot's size, memory use and age."""
+        columns = self._columns
+        if columns is None:
+            return {"rows": 0, "bytes": 0, "age_seconds": None, "serving": False}
+        return {
+            "rows": len(columns),
+            "bytes": columns.nbytes,
+            "age_seconds": round(time.time() - columns.built_at, 3),
+            "serving": self._current() is not None
+        }
+
+
+snapshot = ColumnarSnapshot()
@@ -0,0 +1,201 @@
+import datetime
+import threading
+import time
+from bson import ObjectId
+from pymongo import UpdateOne
+from db import STATS_INDEX, ufoSightings, sightingStats
+
+# Rollups kept in the summary collection and the fields each one groups by
+ROLLUPS = {
+    "shape": ("shape",),
+    "state": ("state",),
+    "country": ("country",),
+    "year": ("year",),
+    "country_shape": ("country", "shape"),
+    "state_shape": ("state", "shape"),
+    "state_year": ("state", "year")
+}
+
+# Expression computing each grouped field from a sighting
+ROLLUP_FIELDS = {
+    "shape": {"$ifNull": ["$shape", None]},
+    "state": {"$ifNull": ["$state", None]},
+    "country": {"$ifNull": ["$country", None]},
+    "year": {"$year": "$sighted_at"}
+}
+
+# _id of the document holding the last folded-in sighting _id
+META_ID = "refresh"
+
+# The largest _id with zero timestamp bytes, as loader.sighting_id() derives them. Loaded sightings
+# are counted by rebuild() or, when synced, by update_many(); refresh() only folds in ids above this
+LOADED_ID_MAX = ObjectId(bytes(4) + b"\xff" * 8)
+
+# Sighting fields the rollups group by, for reading the previous version of changed sightings
+KEY_PROJECTION = {"shape": 1, "state": 1, "country": 1, "sighted_at": 1}
+
+# Sightings inserted since the last refresh are folded in at most this often
+STATS_REFRESH_INTERVAL = 60  # seconds
+
+
+def summary_id(rollup, key):
+    """_id of the summary document of one rollup key, with the key's fields in ROLLUPS order."""
+    return {"rollup": rollup, "key": {field: key[field] for field in ROLLUPS[rollup]}}
+
+
+def document_key(doc):
+    """The grouped field values of a sighting document, as the $group stage computes them."""
+    sighted_at = doc.get("sighted_at")
+    return {
+        "shape": doc.get("shape"),
+        "state": doc.get("state"),
+        "country": doc.get("country"),
+        "year": sighted_at.year if isinstance(sighted_at, datetime.datetime) else None
+    }
+
+
+def merge_pipeline(rollup, match, into=None):
+    """Count the sightings matching ``match`` per key of a rollup and add them into the summary collection (or ``into``)."""
+    return [
+        {"$match": match},
+        {"$group": {"_id": {field: ROLLUP_FIELDS[field] for field in ROLLUPS[rollup]}, "count": {"$sum": 1}}},
+        {"$project": {
+            "_id": {"rollup": {"$literal": rollup}, "key": "$_id"},
+            "rollup": {"$literal": rollup},
+            "key": "$_id",
+            "count": 1
+        }},
+        {"$merge": {
+            "into": into or sightingStats.name,
+            "on": "_id",
+            "whenMatched": [{"$set": {"count": {"$add": ["$count", "$$new.count"]}}}],
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+
+class SightingStats:
+    """Per shape/state/country/year sighting counts materialized in the summary collection.
+
+    Each summary document holds the count of one key of one rollup (e.g. the
+    ``country_shape`` count of ``{"country": "us", "shape": "light"}``), so a rollup is
+    read with one indexed query instead of a ``$group`` over every sighting. The counts
+    are built and kept current with ``$merge`` pipelines: refresh() adds the sightings
+    inserted through the API past the stored high-water ``_id`` (claimed atomically,
+    so concurrent workers never fold a range in twice). update_many() applies loaded
+    sightings inserted, updated or deleted by incremental syncs (see loader.sync_csv).
+    rebuild() recomputes everything.
+    """
+
+    def __init__(self, refresh_interval=STATS_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _newest_id(self):
+        newest = list(ufoSightings.find({}, {"_id": 1}).sort([("_id", -1)]).limit(1))
+        return newest[0]["_id"] if newest else None
+
+    def _merge(self, match, into=None):
+        for rollup in ROLLUPS:
+            ufoSightings.aggregate(merge_pipeline(rollup, match, into))
+
+    def rebuild(self):
+        """Recompute every rollup from the whole collection.
+
+        The rollups are built in a staging collection of their own, then renamed over
+        the summary collection: readers never see partial counts, and rebuilds that
+        overlap (e.g. a worker's first refresh during ``flask load-dataset``) each
+        produce complete counts instead of adding into the same documents.
+        """
+        newest = self._newest_id()
+        staging = sightingStats.database[f"{sightingStats.name}_rebuild_{ObjectId()}"]
+        if newest is not None:
+            self._merge({"_id": {"$lte": newest}}, staging.name)
+        staging.insert_one({"_id": META_ID, "last_id": newest, "refreshed_at": datetime.datetime.now(datetime.timezone.utc)})
+        staging.create_index(STATS_INDEX)
+        staging.rename(sightingStats.name, dropTarget=True)
+        self._checked_at = time.monotonic()
+
+    def refresh(self):
+        """Fold in the sightings inserted since the last refresh (building the rollups if there are none).
+
+        Returns the high-water ``_id`` range folded in, or None when there was nothing new.
+        """
+        meta = sightingStats.find_one({"_id": META_ID})
+        if meta is None:
+            self.rebuild()
+            return None
+        self._checked_at = time.monotonic()
+        last_id, newest = meta.get("last_id"), self._newest_id()
+        # Synced sightings can sort above last_id, but update_many() already counted them
+        floor = max(last_id, LOADED_ID_MAX) if last_id is not None else LOADED_ID_MAX
+        if newest is None or newest <= floor:
+            return None
+        claimed = sightingStats.find_one_and_update(
+            {"_id": META_ID, "last_id": last_id},
+            {"$set": {"last_id": newest, "refreshed_at": datetime.datetime.now(datetime.timezone.utc)}}
+        )
+        if claimed is None:
+            # Another worker claimed the range first
+            return None
+        self._merge({"_id": {"$gt": floor, "$lte": newest}})
+        return last_id, newest
+
+    def update(self, old, new):
+        """Move the counts of an updated sighting from its previous version's keys to the new ones."""
+        return self.update_many([(old, new)])
+
+    def update_many(self, changes):
+        """Apply ``(old, new)`` sighting versions to the counts with one bulk write.
+
+        ``old`` is None for an inserted sighting and ``new`` is None for a deleted one.
+        Returns the number of summary documents written.
+        """
+        operations = []
+        for old, new in changes:
+            old_key = document_key(old) if old is not None else None
+            new_key = document_key(new) if new is not None else None
+            for rollup, fields in ROLLUPS.items():
+                if old_key and new_key and all(old_key[field] == new_key[field] for field in fields):
+                    continue
+                for key, step in ((old_key, -1), (new_key, 1)):
+                    if key is None:
+                        continue
+                    _id = summary_id(rollup, key)
+                    operations.append(UpdateOne(
+                        {"_id": _id},
+                        {"$inc": {"count": step}, "$setOnInsert": {"rollup": rollup, "key": _id["key"]}},
+                        upsert=True
+                    ))
+        if operations:
+            sightingStats.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    def rollup(self, name, filters=None):
+        """Summaries of one rollup as ``{field: value, ..., "count"}`` dicts, largest first.
+
+        ``filters`` restricts some of the rollup's fields to a value. Newly inserted
+        sightings are folded in first if the last refresh is older than ``refresh_interval``.
+        """
+        if time.monotonic() - self._checked_at > self.refresh_interval:
+            with self._lock:
+                if time.monotonic() - self._checked_at > self.refresh_interval:
+                    self.refresh()
+        query = {"rollup": name, "count": {"$gt": 0}}
+        for field, value in (filters or {}).items():
+            query[f"key.{field}"] = value
+        cursor = sightingStats.find(query, {"_id": 0, "key": 1, "count": 1}).sort([("count", -1)])
+        return [dict(doc["key"], count=doc["count"]) for doc in cursor]
+
+    def status(self):
+        """The rollups and when new sightings were last folded in."""
+        meta = sightingStats.find_one({"_id": META_ID}) or {}
+        return {
+            "rollups": {name: list(fields) for name, fields in ROLLUPS.items()},
+            "last_id": meta.get("last_id"),
+            "refreshed_at": meta.get("refreshed_at")
+        }
+
+
+sighting_stats = SightingStats()
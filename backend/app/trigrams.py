@@ -0,0 +1,227 @@
+import re
+import threading
+import time
+from array import array
+import numpy as np
+from db import sightings_generation, ufoSightings
+
+# Fields searched with case-insensitive substring regexes by the routes
+TRIGRAM_FIELDS = ("comments", "city", "state", "shape")
+
+# Above this many candidates a plain collection scan is as cheap as an $in lookup
+TRIGRAM_MAX_CANDIDATES = 2000
+
+# Newly inserted sightings (and loads, see db.sightings_generation) are picked up at most this often
+TRIGRAM_REFRESH_INTERVAL = 60  # seconds
+
+LOAD_BATCH_SIZE = 5000
+
+# A $regex without any of these characters is a plain substring
+REGEX_METACHARACTERS = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+
+def trigrams(text):
+    """Distinct three-character substrings of a case-folded string."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def substring_keyword(condition):
+    """The literal keyword of a case-insensitive ``$regex`` condition, or None if it is a real pattern.
+
+    Only ASCII keywords of three or more characters qualify, so case-folding both sides
+    finds every string MongoDB's caseless match would.
+    """
+    if not isinstance(condition, dict) or set(condition) != {"$regex", "$options"}:
+        return None
+    keyword, options = condition["$regex"], condition["$options"]
+    if not isinstance(keyword, str) or options != "i" or REGEX_METACHARACTERS.search(keyword):
+        return None
+    if len(keyword) < 3 or not keyword.isascii():
+        return None
+    return keyword.casefold()
+
+
+class TrigramIndex:
+    """In-memory trigram inverted index over the substring-searched fields.
+
+    Each field maps every trigram of its case-folded values to a posting list of row
+    numbers (compact ``array('i')``, appended in row order so they stay sorted). narrow()
+    rewrites a literal ``$regex`` condition into the same condition restricted to the
+    ``_id``s whose values contain all of the keyword's trigrams; MongoDB still verifies
+    the regex, so results are identical to a collection scan. Sightings inserted since
+    the last refresh are always included as candidates.
+
+    Only inserts with new ObjectIds are tracked incrementally. Updates and deletes
+    happen through dataset loads and syncs (see loader.py), which bump the sightings
+    generation; the next refresh then rebuilds the whole index.
+    """
+
+    def __init__(self, refresh_interval=TRIGRAM_REFRESH_INTERVAL, max_candidates=TRIGRAM_MAX_CANDIDATES):
+        self.refresh_interval = refresh_interval
+        self.max_candidates = max_candidates
+        self._lock = threading.RLock()
+        self._refreshing = False
+        self._refresh_thread = None
+        self.clear()
+
+    def clear(self):
+        """Drop the index; searches scan the collection until build() runs again."""
+        with self._lock:
+            self._built = False
+            self._ids = []
+            self._postings = {field: {} for field in TRIGRAM_FIELDS}
+            self._last_id = None
+            self._generation = None
+            self._refreshed_at = 0.0
+
+    @staticmethod
+    def _index(docs, ids, postings):
+        """Append ``docs`` to the row ``ids`` and their trigrams to ``postings``; returns the last ``_id`` or None."""
+        last_id = None
+        for doc in docs:
+            row = len(ids)
+            ids.append(doc["_id"])
+            for field in TRIGRAM_FIELDS:
+                value = doc.get(field)
+                if not isinstance(value, str):
+                    continue
+                field_postings = postings[field]
+                for gram in trigrams(value.casefold()):
+                    rows = field_postings.get(gram)
+                    if rows is None:
+                        rows = field_postings[gram] = array("i")
+                    rows.append(row)
+            last_id = doc["_id"]
+        return last_id
+
+    def _fetch(self, query):
+        projection = {field: 1 for field in TRIGRAM_FIELDS}
+        return ufoSightings.find(query, projection).sort([("_id", 1)]).batch_size(LOAD_BATCH_SIZE)
+
+    def build(self, docs=None):
+        """(Re)build the index from the collection, or from ``docs`` in ``_id`` order.
+
+        The new postings are built without holding the lock and swapped in at the end,
+        so searches keep using the previous index (or none) meanwhile.
+        """
+        generation = sightings_generation()
+        ids, postings = [], {field: {} for field in TRIGRAM_FIELDS}
+        last_id = self._index(self._fetch({}) if docs is None else docs, ids, postings)
+        with self._lock:
+            self._ids, self._postings, self._last_id = ids, postings, last_id
+            self._generation = generation
+            self._refreshed_at = time.monotonic()
+            self._built = True
+
+    def refresh(self):
+        """Index sightings inserted since the last build or refresh, or rebuild after a load.
+
+        Does nothing while another refresh is running.
+        """
+        with self._lock:
+            if not self._built or self._refreshing:
+                return
+            self._refreshing = True
+        try:
+            if sightings_generation() != self._generation:
+                # Loaded sightings can sort below _last_id, and synced ones change in place
+                self.build()
+                return
+            last_id = self._last_id
+            docs = list(self._fetch({"_id": {"$gt": last_id}} if last_id is not None else {}))
+            with self._lock:
+                if self._last_id == last_id:
+                    self._last_id = self._index(docs, self._ids, self._postings) or last_id
+                self._refreshed_at = time.monotonic()
+        finally:
+            self._refreshing = False
+
+    def _run_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Trigram index refresh failed: {e}")
+
+    def _schedule_refresh(self):
+        """Start a refresh in a daemon thread, at most once per ``refresh_interval``."""
+        with self._lock:
+            if time.monotonic() - self._refreshed_at <= self.refresh_interval or self._refreshing:
+                return
+            # Pushed back so the next searches do not start another refresh meanwhile
+            self._refreshed_at = time.monotonic()
+            self._refresh_thread = threading.Thread(target=self._run_refresh, name="trigram-refresh", daemon=True)
+            self._refresh_thread.start()
+
+    def candidates(self, field, keyword):
+        """``_id``s whose ``field`` may contain the case-folded ``keyword``, or None when there are too many."""
+        postings = self._postings[field]
+        lists = []
+        for gram in trigrams(keyword):
+            rows = postings.get(gram)
+            if rows is None:
+                return []
+            lists.append(rows)
+        lists.sort(key=len)
+        # Keywords made only of very common trigrams are not worth intersecting
+        if len(lists[0]) > self.max_candidates * 4:
+            return None
+        rows = np.frombuffer(lists[0], dtype=np.int32)
+        for other in lists[1:]:
+            rows = np.intersect1d(rows, np.frombuffer(other, dtype=np.int32), assume_unique=True)
+            if not len(rows):
+                break
+        if len(rows) > self.max_candidates:
+            return None
+        return [self._ids[row] for row in rows.tolist()]
+
+    def _narrow(self, query):
+        clauses, narrowed = [], False
+        for key, condition in query.items():
+            if key in ("$or", "$and"):
+                parts = [self._narrow(clause) for clause in condition]
+                narrowed = narrowed or parts != condition
+                clauses.append({key: parts})
+                continue
+            clauses.append({key: condition})
+            keyword = substring_keyword(condition) if key in TRIGRAM_FIELDS else None
+            ids = self.candidates(key, keyword) if keyword else None
+            if ids is not None:
+                clauses.append({"$or": [{"_id": {"$in": ids}}, {"_id": {"$gt": self._last_id}}]})
+                narrowed = True
+        if not narrowed:
+            return query
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def narrow(self, query):
+        """Restrict the literal substring regexes of a query to their trigram candidates.
+
+        Returns the query unchanged when the index is not built or nothing can be narrowed.
+        Never reads MongoDB, so it is safe on an event loop: a due refresh runs in a
+        background thread, and until it is done the sightings above the last indexed
+        ``_id`` stay candidates.
+        """
+        if not self._built:
+            return query
+        if time.monotonic() - self._refreshed_at > self.refresh_interval:
+            self._schedule_refresh()
+        with self._lock:
+            if self._last_id is None:
+                return query
+            return self._narrow(query)
+
+    def stats(self):
+        """Report the indexed rows, distinct trigrams and posting-list memory per field."""
+        with self._lock:
+            return {
+                "rows": len(self._ids),
+                "fields": {
+                    field: {
+                        "trigrams": len(postings),
+                        "bytes": sum(rows.itemsize * len(rows) for rows in postings.values())
+                    }
+                    for field, postings in self._postings.items()
+                }
+            }
+
+
+trigram_index = TrigramIndex()
@@ -0,0 +1,104 @@
+"""Throughput benchmark of POST /sightings/bulk.
+
+Generates synthetic source rows and posts them as NDJSON batches from several
+concurrent clients, then reports the documents inserted per second. It also times
+build_sighting() alone, the per-row validation work done before the insert.
+
+The rows are really inserted, so point the server at a scratch database, e.g. from
+backend/app:
+
+    MONGO_DB=UFOBench gunicorn -w 4 -b :3000 app:app
+
+then run from the backend directory:
+
+    python benchmarks/bench_ingest.py --url http://localhost:3000 [--rows 100000] [--batch 5000] [--concurrency 4]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app")))
+
+from ingest import STATE_IMAGES, UFO_IMAGES, build_sighting
+
+SHAPES = tuple(UFO_IMAGES) + ("light", "fireball", "circle", "other", "unknown")
+STATES = tuple(sorted(STATE_IMAGES))
+
+
+class NoImages:
+    """Stand-in image map so build_sighting() can be timed without MongoDB."""
+
+    def get(self, filename):
+        return None
+
+
+def make_rows(n, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        rows.append({
+            "datetime": f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/{rng.randint(1950, 2014)} {rng.randint(0, 24)}:{rng.randint(0, 59):02d}",
+            "city": f"city {rng.randint(0, 5000)}",
+            "state": rng.choice(STATES),
+            "country": "us",
+            "shape": rng.choice(SHAPES),
+            "duration (seconds)": rng.randint(1, 3600),
+            "duration (hours/min)": "a few minutes",
+            "comments": f"bench sighting {i}",
+            "date posted": "1/1/2015",
+            "latitude": round(rng.uniform(25, 49), 6),
+            "longitude": round(rng.uniform(-124, -67), 6)
+        })
+    return rows
+
+
+def post_batch(url, body):
+    connection = http.client.HTTPConnection(urlsplit(url).netloc, timeout=300)
+    connection.request("POST", "/sightings/bulk", body=body, headers={"Content-Type": "application/x-ndjson"})
+    response = connection.getresponse()
+    result = json.loads(response.read())
+    connection.close()
+    if response.status != 200:
+        raise SystemExit(f"POST /sightings/bulk failed with {response.status}: {result}")
+    return result["inserted"], result["failed"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="server to post to; without it only build_sighting() is timed")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=5000, help="rows per request")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    start = time.perf_counter()
+    for row in rows:
+        build_sighting(row, NoImages())
+    elapsed = time.perf_counter() - start
+    print(f"build_sighting: {args.rows / elapsed:,.0f} rows/s")
+
+    if not args.url:
+        return
+    bodies = [
+        "\n".join(json.dumps(row) for row in rows[i:i + args.batch]).encode("utf-8")
+        for i in range(0, len(rows), args.batch)
+    ]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda body: post_batch(args.url, body), bodies))
+    elapsed = time.perf_counter() - start
+    inserted = sum(r[0] for r in results)
+    failed = sum(r[1] for r in results)
+    print(f"{args.url}: {inserted:,} inserted, {failed:,} rejected in {elapsed:.2f}s "
+          f"({inserted / elapsed:,.0f} docs/s, {args.batch} rows x {args.concurrency} concurrent requests)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Micro-benchmark of per-page JSON serialization for search results.
+
+Compares Flask's default JSON provider with FastJSONProvider, both with orjson
+and with its standard-library fallback, for pages of 10, 100 and 1,000 sightings.
+Each timing covers serializing the page (convert_to_str) and building the response body.
+
+Run from the backend directory:
+
+    python benchmarks/bench_json.py [--repeat 200]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app")))
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+import json_provider
+from json_provider import FastJSONProvider
+from routes import convert_to_str
+
+PAGE_SIZES = (10, 100, 1000)
+SHAPES = ("light", "triangle", "circle", "disk", "fireball", "sphere", "cigar")
+
+
+def make_sightings(n, seed=0):
+    """Sightings shaped like the documents returned by the search queries."""
+    rng = random.Random(seed)
+    return [{
+        "_id": ObjectId(),
+        "city": rng.choice(("rochester", "seattle", "phoenix", "las vegas", "portland")),
+        "comments": "Bright light moving slowly across the sky then vanished " * rng.randint(1, 3),
+        "country": "us",
+        "shape": rng.choice(SHAPES),
+        "state": rng.choice(("ny", "wa", "az", "nv", "or")),
+        "location": {"type": "Point", "coordinates": [rng.uniform(-125, -70), rng.uniform(25, 49)]}
+    } for _ in range(n)]
+
+
+def page_body(provider, docs):
+    payload = {"data": [convert_to_str(doc) for doc in docs], "total": len(docs), "page": 1, "limit": len(docs)}
+    return provider.response(payload).get_data()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="serializations per page size")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    providers = [("flask default", DefaultJSONProvider(app))]
+    if json_provider.orjson is not None:
+        providers.append(("FastJSONProvider (orjson)", FastJSONProvider(app)))
+    else:
+        print("orjson is not installed; only the standard-library fallback is measured")
+
+    print(f"{'provider':<32}" + "".join(f"{n:>14,}" for n in PAGE_SIZES) + "   (microseconds per page)")
+    rows = providers + [("FastJSONProvider (stdlib)", FastJSONProvider(app))]
+    for name, provider in rows:
+        stdlib_only = name.endswith("(stdlib)")
+        saved = json_provider.orjson
+        if stdlib_only:
+            json_provider.orjson = None
+        try:
+            timings = []
+            for n in PAGE_SIZES:
+                docs = make_sightings(n)
+                page_body(provider, docs)  # warm up
+                seconds = timeit.timeit(lambda: page_body(provider, docs), number=args.repeat)
+                timings.append(seconds / args.repeat * 1e6)
+        finally:
+            json_provider.orjson = saved
+        print(f"{name:<32}" + "".join(f"{t:>14,.1f}" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Load test comparing the WSGI and ASGI serving modes.
+
+Drives a running server with a fixed number of concurrent clients for a fixed
+duration, mixing the searches and sighting detail requests the frontend makes, and
+reports throughput and latency percentiles for each server URL given.
+
+Start both modes against the same MongoDB from backend/app, e.g.
+
+    gunicorn -w 4 --threads 8 -b :3000 app:app
+    uvicorn asgi:app --workers 4 --port 3001
+
+then run from the backend directory:
+
+    python benchmarks/bench_load.py --url http://localhost:3000 --url http://localhost:3001 [--concurrency 64] [--duration 30]
+"""
+import argparse
+import http.client
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+SEARCHES = (
+    "/search_word?q=light",
+    "/search_word?q=triangle&page=2",
+    "/sightings/city/seattle",
+    "/sightings/state/ca?match=exact",
+    "/sightings/shape/disk?total=estimate",
+    "/search_nearby?lat=40.7&lon=-74.0&radius=50",
+    "/search_nearby?lat=34.05&lon=-118.24&radius=25&order=distance",
+)
+
+# Share of requests that open a sighting's details (with its two images) instead of searching
+DETAIL_SHARE = 0.3
+
+
+def sighting_ids(url):
+    host = urlsplit(url).netloc
+    connection = http.client.HTTPConnection(host, timeout=30)
+    connection.request("GET", "/search_word?q=light&fields=city")
+    ids = [doc["_id"] for doc in json.loads(connection.getresponse().read())["data"]]
+    connection.close()
+    if not ids:
+        raise SystemExit(f"{url} returned no sightings; is the dataset loaded?")
+    return ids
+
+
+def client(url, ids, deadline, seed):
+    """One keep-alive client issuing requests back to back; returns (latencies, errors)."""
+    rng = random.Random(seed)
+    host = urlsplit(url).netloc
+    connection = http.client.HTTPConnection(host, timeout=30)
+    latencies, errors = [], 0
+    while time.monotonic() < deadline:
+        path = f"/sighting/{rng.choice(ids)}" if rng.random() < DETAIL_SHARE else rng.choice(SEARCHES)
+        start = time.perf_counter()
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection(host, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+    return latencies, errors
+
+
+def run(url, concurrency, duration):
+    ids = sighting_ids(url)
+    deadline = time.monotonic() + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: client(url, ids, deadline, i), range(concurrency)))
+    latencies = sorted(l for result in results for l in result[0])
+    errors = sum(result[1] for result in results)
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / duration,
+        "p50": quantiles[49] * 1e3,
+        "p95": quantiles[94] * 1e3,
+        "p99": quantiles[98] * 1e3,
+        "errors": errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", action="append", required=True, help="server to test (repeat to compare)")
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per server")
+    args = parser.parse_args()
+
+    print(f"{'server':<28}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for url in args.url:
+        r = run(url, args.concurrency, args.duration)
+        print(f"{url:<28}{r['requests']:>10,}{r['rps']:>10,.1f}{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Latency and throughput of every API route against a synthetic dataset in a local mongod.
+
+Loads SightingGenerator rows (see synthetic.py) at the chosen scale into a scratch
+database (MONGO_DB, default UFOBench) with the dataset loader, prepares the in-memory
+structures the way `python -m app` does, then issues each route's request
+``--requests`` times from ``--concurrency`` threads through the Flask test client.
+Routes include deep pages and broad regexes. The write routes run last, against a
+scratch sighting and scratch bulk rows that are removed afterwards, so repeated
+runs time the same dataset. Results are written as JSON, and
+``--compare`` flags the routes whose p50 or p99 regressed past ``--tolerance``
+against an earlier run (exiting with status 1).
+
+Run from the backend directory with a local mongod (MONGO_AUTH=0 for one without
+authentication):
+
+    MONGO_AUTH=0 python benchmarks/bench_routes.py --scale 80k --output bench-80k.json
+    MONGO_AUTH=0 python benchmarks/bench_routes.py --scale 80k --compare bench-80k.json
+
+The dataset is only reloaded when its size differs from the scale or with --reload.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import quote
+from bson import ObjectId
+
+os.environ.setdefault("MONGO_DB", "UFOBench")
+# warm_up() below builds the in-memory structures before timing starts, not the app's first request
+os.environ.setdefault("UFO_WARMUP", "0")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import routes
+from app import app
+from clusters import cluster_pyramid
+from db import ensure_indexes, fs, imageFiles, settings, sightingComments, ufoSightings
+from facets import facet_lists
+from heatmap import sighting_points
+from loader import load_rows
+from stats import sighting_stats
+from synthetic import SightingGenerator
+from trigrams import trigram_index
+
+SCALES = {"80k": 80_000, "1m": 1_000_000, "10m": 10_000_000}
+
+# Sighting the comment route writes to: no searchable fields, and a zero-timestamp _id
+# like the loader's, so /stats never folds it in
+SCRATCH_SIGHTING_ID = ObjectId("00000000000000000000beef")
+
+# Rows POSTed to /sightings/bulk, found again by their city to be removed
+SCRATCH_CITY = "bench scratch"
+BULK_ROWS = 100
+
+# Stored in GridFS for /image when the scratch database has no images
+BENCH_IMAGE = "bench.jpg"
+
+
+def bulk_body(rows=BULK_ROWS):
+    row = {"datetime": "1/1/2000 0:00", "city": SCRATCH_CITY, "state": "zz", "country": "zz", "shape": "light"}
+    return "".join(json.dumps(row) + "\n" for _ in range(rows))
+
+
+def route_requests(sample):
+    """``(name, method, path, body)`` of the requests timed, built around loaded sightings.
+
+    ``body`` is sent as JSON, or as NDJSON when it is a string. Writes come last.
+    """
+    ids, lon, lat, city, state, image_id = sample
+    _id = ids[0]
+    west, south, east, north = lon - 0.5, lat - 0.5, lon + 0.5, lat + 0.5
+    bbox = f"{west},{south},{east},{north}"
+    return [
+        ("search_word_substring", "GET", "/search_word?q=light", None),
+        ("search_word_broad_regex", "GET", "/search_word?q=e", None),
+        ("search_word_rare", "GET", "/search_word?q=zigzag", None),
+        ("search_word_text", "GET", "/search_word?q=bright+light&mode=text", None),
+        ("search_word_deep_page", "GET", "/search_word?q=light&page=500", None),
+        ("search_word_estimate", "GET", "/search_word?q=light&total=estimate", None),
+        ("search_word_sorted_range", "GET", "/search_word?q=light&sort=-datetime&from=2000&to=2010", None),
+        ("search_word_fields", "GET", "/search_word?q=light&fields=city,state", None),
+        ("search_nearby", "GET", f"/search_nearby?lat={lat}&lon={lon}&radius=50", None),
+        ("search_nearby_by_distance", "GET", f"/search_nearby?lat={lat}&lon={lon}&radius=50&order=distance", None),
+        ("search_viewport", "GET", f"/search_viewport?bbox={bbox}", None),
+        ("sightings_country", "GET", "/sightings/country/us", None),
+        ("sightings_country_deep_page", "GET", "/sightings/country/us?page=2000", None),
+        ("sightings_state_exact", "GET", f"/sightings/state/{state}?match=exact", None),
+        ("sightings_city_prefix", "GET", f"/sightings/city/{quote(city.split()[0])}?match=prefix", None),
+        ("sightings_city_contains", "GET", f"/sightings/city/{quote(city)}", None),
+        ("sightings_shape", "GET", "/sightings/shape/disk", None),
+        ("sightings_comments_regex", "GET", "/sightings/comments/hover", None),
+        ("export_ndjson", "GET", "/sightings/shape/pyramid?format=ndjson", None),
+        ("sighting_detail", "GET", f"/sighting/{_id}", None),
+        ("sighting_detail_image_urls", "GET", f"/sighting/{_id}?images=url", None),
+        ("sighting_comments", "GET", f"/sighting/{_id}/comments", None),
+        ("sightings_batch", "POST", "/sightings/batch", {"ids": [str(i) for i in ids], "images": "url"}),
+        ("clusters", "GET", "/clusters?bbox=-125,24,-66,50&zoom=4", None),
+        ("tiles", "GET", "/tiles/3/2/3", None),
+        ("heatmap", "GET", "/heatmap?width=256&height=128", None),
+        ("timeline_year", "GET", "/timeline", None),
+        ("timeline_month_shape", "GET", "/timeline?by=month&shape=light", None),
+        ("stats_state", "GET", "/stats/state", None),
+        ("stats_country_shape", "GET", "/stats/country_shape?country=us", None),
+        ("countries", "GET", "/countries", None),
+        ("states", "GET", "/states", None),
+        ("shapes", "GET", "/shapes", None),
+        ("image", "GET", f"/image/{image_id}", None),
+        ("stats_rollups", "GET", "/stats", None),
+        ("heatmap_stats", "GET", "/heatmap/stats", None),
+        ("images_stats", "GET", "/images/stats", None),
+        ("snapshot_stats", "GET", "/snapshot/stats", None),
+        ("add_comment", "POST", f"/sighting/{SCRATCH_SIGHTING_ID}/comment", {"comment": "Benchmark comment"}),
+        ("sightings_bulk", "POST", "/sightings/bulk", bulk_body()),
+    ]
+
+
+def ensure_dataset(sightings, reload, seed):
+    if not reload and ufoSightings.estimated_document_count() == sightings:
+        return False
+    start = time.perf_counter()
+    result = load_rows(SightingGenerator(seed).rows(sightings))
+    ensure_indexes()
+    sighting_stats.rebuild()
+    print(f"Loaded {result.inserted:,} sightings in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return True
+
+
+def warm_up():
+    """Build the in-memory structures `python -m app` prepares before serving."""
+    facet_lists.warm()
+    cluster_pyramid.build()
+    sighting_points.load()
+    trigram_index.build()
+
+
+def sample_sightings(n=20):
+    """Ids of ``n`` located sightings, the coordinates, city and state of the first, and an image id."""
+    docs = list(ufoSightings.find({"location": {"$ne": None}}, {"location": 1, "city": 1, "state": 1}).limit(n))
+    lon, lat = docs[0]["location"]["coordinates"]
+    return [doc["_id"] for doc in docs], lon, lat, docs[0]["city"], docs[0]["state"], bench_image()
+
+
+def bench_image():
+    """Id of an image in GridFS: a loaded one, or a 64 KiB file stored on first use."""
+    existing = imageFiles.find_one({}, {"_id": 1})
+    if existing is not None:
+        return existing["_id"]
+    return fs.put(bytes(range(256)) * 256, filename=BENCH_IMAGE, contentType="image/jpeg")
+
+
+def remove_scratch():
+    ufoSightings.delete_one({"_id": SCRATCH_SIGHTING_ID})
+    sightingComments.delete_many({"sighting_id": SCRATCH_SIGHTING_ID})
+    ufoSightings.delete_many({"city": SCRATCH_CITY})
+
+
+@contextmanager
+def scratch_writes():
+    """Provide a fresh scratch sighting for the write routes, and remove everything they wrote afterwards."""
+    # Also what an interrupted run left behind
+    remove_scratch()
+    ufoSightings.insert_one({"_id": SCRATCH_SIGHTING_ID, "comment_count": 0, "user_comments": []})
+    try:
+        yield
+    finally:
+        remove_scratch()
+
+
+def time_route(client, method, path, body, requests, concurrency, cold):
+    """Issue one request ``requests`` times; returns the latency summary."""
+    def one(_):
+        if cold:
+            routes.total_counts.clear()
+            routes.timeline_cache.clear()
+        if isinstance(body, str):
+            payload = {"data": body, "content_type": "application/x-ndjson"}
+        else:
+            payload = {"json": body}
+        start = time.perf_counter()
+        response = client.open(path, method=method, **payload)
+        response.get_data()
+        return time.perf_counter() - start, response.status_code
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        one(None)  # warm-up
+        start = time.perf_counter()
+        results = list(pool.map(one, range(requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "method": method,
+        "path": path,
+        "requests": requests,
+        "errors": sum(1 for _, status in results if status >= 400),
+        "p50_ms": round(percentiles[49] * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "throughput_rps": round(requests / elapsed, 1)
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressions(results, baseline, tolerance):
+    """``(route, metric, before, after)`` for every p50/p99 more than ``tolerance`` slower than the baseline."""
+    found = []
+    for name, after in results["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if before is None:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if after[metric] > before[metric] * (1 + tolerance):
+                found.append((name, metric, before[metric], after[metric]))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="80k")
+    parser.add_argument("--sightings", type=int, help="exact dataset size, overriding --scale")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reload", action="store_true", help="regenerate the dataset even if its size matches")
+    parser.add_argument("--requests", type=int, default=50, help="timed requests per route")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--cold", action="store_true", help="clear the count and timeline caches before every request")
+    parser.add_argument("--route", action="append", help="only time these routes (by name)")
+    parser.add_argument("--output", help="write the results as JSON to this file (default stdout)")
+    parser.add_argument("--compare", help="results JSON of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against --compare (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    sightings = args.sightings or SCALES[args.scale]
+    ensure_dataset(sightings, args.reload, args.seed)
+    warm_up()
+
+    results = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "database": settings["MONGO_DB"],
+        "sightings": sightings,
+        "seed": args.seed,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "cold": args.cold,
+        "routes": {}
+    }
+    with app.test_client() as client, scratch_writes():
+        for name, method, path, body in route_requests(sample_sightings()):
+            if args.route and name not in args.route:
+                continue
+            results["routes"][name] = summary = time_route(client, method, path, body, args.requests, args.concurrency, args.cold)
+            print(f"{name:32} p50 {summary['p50_ms']:9.2f} ms  p99 {summary['p99_ms']:9.2f} ms  "
+                  f"{summary['throughput_rps']:8.1f} req/s  errors {summary['errors']}", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for name, metric, before, after in found:
+            print(f"REGRESSION {name} {metric}: {before:.2f} ms -> {after:.2f} ms", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark of substring search over comments with and without the trigram index.
+
+Generates synthetic sightings, then times each keyword two ways: a case-insensitive
+regex over every comment (what MongoDB's collection scan does for
+/sightings/comments/<comment>), and the trigram index's candidate lookup followed by
+the same regex over the candidates only. Both must find the same sightings.
+
+Run from the backend directory:
+
+    python benchmarks/bench_trigrams.py [--sightings 80000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app")))
+
+from bson import ObjectId
+from trigrams import TrigramIndex, TRIGRAM_FIELDS
+
+WORDS = (
+    "bright light lights moving slowly across sky then vanished orange red white green blue "
+    "hovering hovered over the lake field house trees object objects craft triangle disk cigar "
+    "sphere fireball formation silent no sound fast speed shot straight up down stopped flashing "
+    "blinking pulsating glowing huge small low high north south east west minutes seconds"
+).split()
+RARE_WORDS = ("terrific", "zigzag", "boomerang", "chevrons", "helicopter", "iridescent")
+KEYWORDS = ("terrific", "zigzag", "hover", "boomer", "orange light", "silent")
+
+
+def make_sightings(n, seed=0):
+    rng = random.Random(seed)
+    docs = []
+    for _ in range(n):
+        words = rng.choices(WORDS, k=rng.randint(8, 30))
+        if rng.random() < 0.01:
+            words.insert(rng.randrange(len(words)), rng.choice(RARE_WORDS))
+        docs.append({
+            "_id": ObjectId(),
+            "comments": " ".join(words).capitalize(),
+            "city": rng.choice(("rochester", "seattle", "phoenix", "las vegas", "portland")),
+            "state": rng.choice(("ny", "wa", "az", "nv", "or")),
+            "shape": rng.choice(("light", "disk", "triangle"))
+        })
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sightings", type=int, default=80000, help="synthetic sightings to index")
+    parser.add_argument("--repeat", type=int, default=20, help="searches per keyword and method")
+    args = parser.parse_args()
+
+    docs = make_sightings(args.sightings)
+    index = TrigramIndex()
+    seconds = timeit.timeit(lambda: index.build(docs), number=1)
+    stats = index.stats()
+    size = sum(field["bytes"] for field in stats["fields"].values())
+    print(f"indexed {args.sightings:,} sightings ({', '.join(TRIGRAM_FIELDS)}) in {seconds:.2f}s, "
+          f"{size / 2**20:.1f} MiB of posting lists")
+    by_id = {doc["_id"]: doc for doc in docs}
+
+    def scan(pattern):
+        return [doc["_id"] for doc in docs if pattern.search(doc["comments"])]
+
+    def narrowed(keyword, pattern):
+        candidates = index.candidates("comments", keyword.casefold())
+        if candidates is None:
+            return scan(pattern)
+        return [_id for _id in candidates if pattern.search(by_id[_id]["comments"])]
+
+    print(f"{'keyword':<16}{'matches':>10}{'candidates':>12}{'scan ms':>12}{'trigram ms':>12}{'speedup':>10}")
+    for keyword in KEYWORDS:
+        pattern = re.compile(keyword, re.IGNORECASE)
+        expected = scan(pattern)
+        assert narrowed(keyword, pattern) == expected, keyword
+        candidates = index.candidates("comments", keyword.casefold())
+        scan_ms = timeit.timeit(lambda: scan(pattern), number=args.repeat) / args.repeat * 1e3
+        trigram_ms = timeit.timeit(lambda: narrowed(keyword, pattern), number=args.repeat) / args.repeat * 1e3
+        shown = "scan" if candidates is None else f"{len(candidates):,}"
+        print(f"{keyword:<16}{len(expected):>10,}{shown:>12}{scan_ms:>12.2f}{trigram_ms:>12.2f}{scan_ms / trigram_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Synthetic UFO sightings shaped like ufo_scrubbed.csv, for loading benchmark databases.
+
+Rows have the source columns and a realistic skew: a few states, and within each state
+a few cities, account for most sightings (Zipf-like weights), shapes follow the
+dataset's mix, and coordinates cluster tightly around each city. The same seed
+always produces the same rows.
+
+Used by bench_routes.py; it can also write a CSV for `flask load-dataset`:
+
+    python benchmarks/synthetic.py --sightings 1000000 --output synthetic.csv
+"""
+import argparse
+import csv
+import random
+import sys
+
+COLUMNS = (
+    "datetime", "city", "state", "country", "shape", "duration (seconds)",
+    "duration (hours/min)", "comments", "date posted", "latitude", "longitude"
+)
+
+STATES = (
+    "ca", "wa", "fl", "tx", "ny", "il", "az", "pa", "oh", "mi", "nc", "or", "mo", "co", "in",
+    "va", "nj", "ga", "wi", "tn", "mn", "ma", "sc", "ct", "ky", "md", "ok", "nv", "ut", "ia",
+    "nm", "al", "ks", "ar", "id", "la", "me", "mt", "ms", "nh", "wv", "ne", "hi", "ak", "vt",
+    "ri", "sd", "de", "wy", "nd", "pr"
+)
+
+# Share of sightings per shape, roughly as in the real dataset
+SHAPES = {
+    "light": 20, "triangle": 10, "circle": 9, "fireball": 8, "other": 7, "unknown": 7,
+    "sphere": 7, "disk": 6, "oval": 5, "formation": 3, "cigar": 3, "changing": 3,
+    "flash": 2, "rectangle": 2, "cylinder": 2, "diamond": 2, "chevron": 1, "teardrop": 1,
+    "egg": 1, "cone": 0.5, "cross": 0.3, "dome": 0.1, "crescent": 0.1, "pyramid": 0.1
+}
+
+WORDS = (
+    "bright light lights moving slowly across sky then vanished orange red white green blue "
+    "hovering hovered over the lake field house trees object objects craft triangle disk cigar "
+    "sphere fireball formation silent no sound fast speed shot straight up down stopped flashing "
+    "blinking pulsating glowing huge small low high north south east west minutes seconds"
+).split()
+RARE_WORDS = ("zigzag", "boomerang", "helicopter", "iridescent", "tic tac", "satellite")
+
+CITIES_PER_STATE = 200
+
+# Box the state centres are drawn from (every state lands in the continental US)
+LON_RANGE = (-124.0, -67.0)
+LAT_RANGE = (25.0, 49.0)
+
+
+def zipf_weights(n, s=1.1):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+class SightingGenerator:
+    """Deterministic stream of synthetic source rows."""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        places = random.Random(seed + 1)
+        self.state_weights = zipf_weights(len(STATES), 0.9)
+        self.city_weights = zipf_weights(CITIES_PER_STATE)
+        self.cities = {}
+        for state in STATES:
+            lon, lat = places.uniform(*LON_RANGE), places.uniform(*LAT_RANGE)
+            self.cities[state] = [
+                (f"{state} city {i}", lon + places.gauss(0, 1.5), lat + places.gauss(0, 1.0))
+                for i in range(CITIES_PER_STATE)
+            ]
+        self.shapes = list(SHAPES)
+        self.shape_weights = list(SHAPES.values())
+
+    def row(self):
+        rng = self.rng
+        state = rng.choices(STATES, self.state_weights)[0]
+        city, lon, lat = rng.choices(self.cities[state], self.city_weights)[0]
+        words = rng.choices(WORDS, k=rng.randint(6, 30))
+        if rng.random() < 0.01:
+            words.insert(rng.randrange(len(words)), rng.choice(RARE_WORDS))
+        # Reports grow more common in recent years
+        year = int(2014 - abs(rng.gauss(0, 12))) if rng.random() < 0.97 else rng.randint(1910, 1970)
+        seconds = int(rng.lognormvariate(5, 1.5))
+        located = rng.random() < 0.99
+        return {
+            "datetime": f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/{year} {rng.randint(0, 24)}:{rng.randint(0, 59):02d}",
+            "city": city,
+            "state": state,
+            "country": "us",
+            "shape": rng.choices(self.shapes, self.shape_weights)[0],
+            "duration (seconds)": seconds,
+            "duration (hours/min)": f"{max(seconds // 60, 1)} minutes",
+            "comments": " ".join(words),
+            "date posted": f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/{min(year + 1, 2014)}",
+            "latitude": round(lat + rng.gauss(0, 0.05), 6) if located else "",
+            "longitude": round(lon + rng.gauss(0, 0.05), 6) if located else ""
+        }
+
+    def rows(self, n):
+        """``(line, row)`` pairs as loader.load_rows() takes them, numbered like CSV lines."""
+        for line in range(2, n + 2):
+            yield line, self.row()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sightings", type=int, default=80_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="CSV file to write (default stdout)")
+    args = parser.parse_args()
+
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    writer = csv.DictWriter(out, COLUMNS)
+    writer.writeheader()
+    for _, row in SightingGenerator(args.seed).rows(args.sightings):
+        writer.writerow(row)
+    if args.output:
+        out.close()
+
+
+if __name__ == "__main__":
+    main()
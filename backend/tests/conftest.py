@@ -17,9 +17,12 @@ sys.modules["db"] = db
 import io
 import pytest
 from bson import ObjectId
-from backend.app import app, ufoSightings, fs
+from pymongo.results import UpdateResult
+from backend.app import app, ufoSightings, sightingComments, sightingVersions, fs
 from backend.app import routes
 routes.init_routes(app)
+# async_routes.py imports the flat module, which may be a separate copy with its own caches
+import routes as async_base_routes
 
 app.config['TESTING'] = True
 
@@ -45,6 +48,13 @@ class FakeCursor:
         self.records = self.records[:n]
         return self
 
+    def batch_size(self, n):
+        # Batching only matters for a real server-side cursor.
+        return self
+
+    def close(self):
+        self.closed = True
+
     def __iter__(self):
         return iter(self.records)
 
@@ -159,7 +169,7 @@ def setup_mocks(monkeypatch):
 
     monkeypatch.setattr(ufoSightings, "find", fake_find)
 
-    def fake_find_one(query):
+    def fake_find_one(query, projection=None):
         _id = query.get("_id")
         if str(_id) == "000000000000000000000000":
             return None
@@ -172,7 +182,13 @@ def setup_mocks(monkeypatch):
             "image": ObjectId()
         }
     monkeypatch.setattr(ufoSightings, "find_one", fake_find_one)
-    monkeypatch.setattr(ufoSightings, "update_one", lambda query, update: None)
+    monkeypatch.setattr(ufoSightings, "update_one", lambda query, update: UpdateResult({"n": 1, "nModified": 1}, True))
+    # No sighting is left to migrate comments of (see db.migrate_sighting_comments)
+    monkeypatch.setattr(ufoSightings, "find_one_and_update", lambda query, update, projection=None: None)
+    monkeypatch.setattr(sightingComments, "insert_one", lambda doc: None)
+    # No load has happened: generation 0
+    monkeypatch.setattr(sightingVersions, "find_one", lambda query: None)
+    monkeypatch.setattr(sightingVersions, "update_one", lambda query, update, upsert=False: None)
 
     # Adjust count_documents to be consistent with fake_find results:
     def fake_count_documents(query):
@@ -186,6 +202,37 @@ def setup_mocks(monkeypatch):
             return len(cursor.records)
     monkeypatch.setattr(ufoSightings, "count_documents", fake_count_documents)
 
+    def fake_aggregate(pipeline):
+        # Emulate paginate()'s single round-trip {$match, $sort, $facet: {data, total}} pipeline
+        # on top of whichever find/count_documents fakes are active for the test.
+        stages = {name: spec for stage in pipeline for name, spec in stage.items()}
+        query = stages["$match"]
+        sort_params = list(stages["$sort"].items())
+        data_query, offset, n = query, 0, 0
+        for stage in stages["$facet"]["data"]:
+            if "$match" in stage:
+                data_query = {"$and": [query, stage["$match"]]}
+            elif "$skip" in stage:
+                offset = stage["$skip"]
+            elif "$limit" in stage:
+                n = stage["$limit"]
+        records = list(ufoSightings.find(data_query, None).sort(sort_params).skip(offset).limit(n))
+        total = ufoSightings.count_documents(query)
+        return iter([{"data": records, "total": [{"count": total}] if total else []}])
+    monkeypatch.setattr(ufoSightings, "aggregate", fake_aggregate)
+
+    # Totals and facet lists are cached across requests; start every test from a cold cache
+    routes.total_counts.clear()
+    async_base_routes.total_counts.clear()
+    async_base_routes.timeline_cache.clear()
+    routes.facet_lists.invalidate()
+    routes.image_cache.clear()
+    routes.cluster_pyramid.clear()
+    routes.sighting_points.invalidate()
+    routes.snapshot.clear()
+    routes.trigram_index.clear()
+    routes.timeline_cache.clear()
+
     def fake_fs_get(oid):
         dummy_content = b"dummy_image_content"
         return io.BytesIO(dummy_content)
@@ -102,4 +102,65 @@ def test_shapes_empty_results(client, monkeypatch):
     response = client.get("/shapes")
     assert response.status_code == 404
     data = response.get_json()
-    assert "error" in data
\ No newline at end of file
+    assert "error" in data
+
+def test_shapes_with_counts(client, monkeypatch):
+    """Test the /shapes endpoint returns values with their counts when asked to."""
+    def fake_aggregate(pipeline):
+        return [{"_id": "disk", "count": 7000}, {"_id": "cone", "count": 300}]
+
+    monkeypatch.setattr("db.ufoSightings.aggregate", fake_aggregate)
+
+    response = client.get("/shapes?counts=1")
+    assert response.status_code == 200
+    assert response.get_json() == [
+        {"value": "disk", "count": 7000},
+        {"value": "cone", "count": 300}
+    ]
+
+def test_facet_lists_are_cached(client, monkeypatch):
+    """Test the facet list is computed once and served from memory afterwards."""
+    calls = {"count": 0}
+    def fake_aggregate(pipeline):
+        calls["count"] += 1
+        return [{"_id": "US", "count": 10}]
+
+    monkeypatch.setattr("db.ufoSightings.aggregate", fake_aggregate)
+
+    assert client.get("/countries").get_json() == ["US"]
+    assert client.get("/countries").get_json() == ["US"]
+    assert calls["count"] == 1
+
+def test_facet_list_etag_revalidation(client, monkeypatch):
+    """Test an unchanged facet list answers a conditional request with 304."""
+    monkeypatch.setattr("db.ufoSightings.aggregate", lambda pipeline: [{"_id": "TX", "count": 5}])
+
+    response = client.get("/states")
+    etag = response.headers["ETag"]
+    assert etag
+
+    response = client.get("/states", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+def test_facet_list_invalidation(client, monkeypatch):
+    """Test invalidating the facet lists picks up changed data."""
+    from backend.app import routes
+    monkeypatch.setattr("db.ufoSightings.aggregate", lambda pipeline: [{"_id": "TX", "count": 5}])
+    etag = client.get("/states").headers["ETag"]
+
+    monkeypatch.setattr("db.ufoSightings.aggregate", lambda pipeline: [{"_id": "TX", "count": 6}])
+    routes.facet_lists.invalidate()
+    response = client.get("/states", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_facet_lists_follow_changes_in_other_processes(client, monkeypatch):
+    """Test a load or sync elsewhere (a new sightings generation) replaces the cached lists."""
+    monkeypatch.setattr("db.ufoSightings.aggregate", lambda pipeline: [{"_id": "TX", "count": 5}])
+    etag = client.get("/states").headers["ETag"]
+
+    monkeypatch.setattr("db.ufoSightings.aggregate", lambda pipeline: [{"_id": "TX", "count": 6}])
+    monkeypatch.setattr("db.sightingVersions.find_one", lambda query: {"_id": "sightings", "generation": 1})
+    response = client.get("/states", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
@@ -0,0 +1,150 @@
+import asyncio
+import pytest
+from bson import ObjectId
+from backend.app.asgi import AsyncDispatcher, create_async_app
+from backend.app.app import create_app
+from .conftest import FakeCursor
+import db
+# The module async_routes.py imports its caches from
+import routes
+
+DOCS = [{
+    "_id": ObjectId(),
+    "city": f"City{i}",
+    "comments": "Bright light",
+    "country": "us",
+    "shape": "light",
+    "state": "ny",
+    "location": {"coordinates": [-77.6, 43.15]}
+} for i in range(15)]
+
+
+class FakeAsyncCursor(FakeCursor):
+    async def to_list(self, length=None):
+        return list(self.records)
+
+
+@pytest.fixture
+def barrier():
+    """Each pair of fakes waiting on it only proceeds once both run at the same time."""
+    return {"parties": None}
+
+
+async def rendezvous(barrier):
+    if barrier["parties"] is None:
+        barrier["parties"] = asyncio.Barrier(2)
+    async with asyncio.timeout(1):
+        await barrier["parties"].wait()
+
+
+@pytest.fixture
+def async_db(monkeypatch, barrier):
+    queries = []
+
+    class Find(FakeAsyncCursor):
+        async def to_list(self, length=None):
+            await rendezvous(barrier)
+            return list(self.records)
+
+    def fake_find(query, projection):
+        queries.append(query)
+        return Find([dict(d) for d in DOCS])
+
+    async def fake_count_documents(query, **kwargs):
+        await rendezvous(barrier)
+        return len(DOCS)
+
+    monkeypatch.setattr(db.ufoSightingsAsync, "find", fake_find)
+    monkeypatch.setattr(db.ufoSightingsAsync, "count_documents", fake_count_documents)
+    return queries
+
+
+def get(path):
+    async def request():
+        client = create_async_app().test_client()
+        response = await client.get(path)
+        return response.status_code, await response.get_json(), response.headers
+    return asyncio.run(request())
+
+
+def test_page_and_count_run_concurrently(async_db):
+    status, data, headers = get("/sightings/city/City?fields=city")
+    assert status == 200
+    assert data["total"] == 15
+    assert [d["city"] for d in data["data"]] == [f"City{i}" for i in range(10)]
+    assert data["next_cursor"]
+    assert async_db == [{"city": {"$regex": "City", "$options": "i"}}]
+    assert headers["Access-Control-Allow-Origin"] == "*"
+
+def test_cached_total_skips_the_count(async_db, monkeypatch):
+    routes.total_counts.set(routes.query_key({"shape": {"$regex": "light", "$options": "i"}}), 15)
+
+    class Find(FakeAsyncCursor):
+        pass
+
+    monkeypatch.setattr(db.ufoSightingsAsync, "find", lambda query, projection: Find([dict(d) for d in DOCS]))
+    status, data, _ = get("/sightings/shape/light?page=2")
+    assert status == 200 and data["total"] == 15
+    assert len(data["data"]) == 5
+
+def test_nearby_distance_order_with_date_range(monkeypatch):
+    pipelines = []
+
+    async def fake_aggregate(pipeline):
+        pipelines.append(pipeline)
+        return FakeAsyncCursor([dict(d, distance_miles=0.0) for d in DOCS[:3]])
+
+    async def fake_count_documents(query, **kwargs):
+        return 3
+
+    monkeypatch.setattr(db.ufoSightingsAsync, "aggregate", fake_aggregate)
+    monkeypatch.setattr(db.ufoSightingsAsync, "count_documents", fake_count_documents)
+    status, data, _ = get("/search_nearby?lat=43.15&lon=-77.6&radius=10&order=distance&from=2000")
+    assert status == 200 and data["total"] == 3
+    assert pipelines[0][0]["$geoNear"]["query"] == {"sighted_at": {"$gte": routes.parse_date("2000")}}
+
+def test_async_validation_errors():
+    assert get("/search_word")[0] == 400
+    assert get("/search_nearby?lat=x&lon=1&radius=1")[0] == 400
+    assert get("/sightings/city/x?match=fuzzy")[0] == 400
+
+def test_sighting_images_are_fetched_concurrently(monkeypatch, barrier):
+    oid, image_id, ufo_image_id = ObjectId(), ObjectId(), ObjectId()
+
+    async def fake_find_one(query):
+        return {"_id": oid, "city": "Rochester", "image": image_id, "ufo_image": ufo_image_id, "location": None}
+
+    class GridOut:
+        content_type = "image/png"
+
+        def __init__(self, file_id):
+            self.file_id = file_id
+
+        async def read(self):
+            return str(self.file_id).encode()
+
+    async def fake_get(file_id):
+        await rendezvous(barrier)
+        return GridOut(file_id)
+
+    monkeypatch.setattr(db.ufoSightingsAsync, "find_one", fake_find_one)
+    monkeypatch.setattr(db.fsAsync, "get", fake_get)
+    status, data, _ = get(f"/sighting/{oid}")
+    assert status == 200
+    assert data["_id"] == str(oid)
+    assert routes.image_cache.stats()["entries"] == 2
+    assert data["image"] != data["ufo_image"]
+
+def test_dispatcher_routes_requests():
+    dispatcher = AsyncDispatcher(create_async_app(), create_app())
+
+    def scope(path, method="GET", query=b""):
+        return {"type": "http", "path": path, "method": method, "query_string": query}
+
+    assert dispatcher.handles(scope("/search_word", query=b"q=light"))
+    assert dispatcher.handles(scope("/sighting/abc"))
+    assert dispatcher.handles({"type": "lifespan"})
+    assert not dispatcher.handles(scope("/countries"))
+    assert not dispatcher.handles(scope("/sighting/abc/comment", "POST"))
+    assert not dispatcher.handles(scope("/search_word", query=b"q=light&format=csv"))
+    assert not dispatcher.handles(scope("/search_word", "OPTIONS"))
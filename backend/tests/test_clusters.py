@@ -0,0 +1,81 @@
+import pytest
+from bson import ObjectId
+from backend.app import ufoSightings
+from backend.app import routes
+from .conftest import FakeCursor
+
+ROCHESTER = [-77.61, 43.16]
+BUFFALO = [-78.88, 42.89]
+SEATTLE = [-122.33, 47.61]
+
+
+def sighting(coordinates, shape):
+    return {"_id": ObjectId(), "location": {"type": "Point", "coordinates": coordinates}, "shape": shape}
+
+
+@pytest.fixture
+def sightings(monkeypatch):
+    docs = [sighting(ROCHESTER, "disk")] * 3 + [sighting(BUFFALO, "light")] + [sighting(SEATTLE, "light")] * 2
+    docs = [dict(d, _id=ObjectId()) for d in docs]
+    queries = []
+
+    def fake_find(query, projection):
+        queries.append(query)
+        records = docs
+        if "_id" in query:
+            records = [d for d in docs if d["_id"] > query["_id"]["$gt"]]
+        return FakeCursor(list(records))
+
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    return docs, queries
+
+
+def test_world_view_is_one_cluster_per_region(client, sightings):
+    data = client.get("/clusters?bbox=-180,-85,180,85&zoom=0").get_json()
+    assert data["zoom"] == 0
+    clusters = sorted(data["clusters"], key=lambda c: c["longitude"])
+    # At zoom 0 the grid is 8x8 over the world: Seattle and western NY are separate cells
+    assert [c["count"] for c in clusters] == [2, 4]
+    east = clusters[1]
+    assert east["shape"] == "disk"
+    assert east["latitude"] == pytest.approx((3 * 43.16 + 42.89) / 4)
+
+def test_bbox_limits_clusters(client, sightings):
+    data = client.get("/clusters?bbox=-80,42,-76,44&zoom=6").get_json()
+    assert sum(c["count"] for c in data["clusters"]) == 4
+    assert len(data["clusters"]) == 2
+
+def test_zoom_is_clamped(client, sightings):
+    data = client.get("/clusters?bbox=-80,42,-76,44&zoom=18").get_json()
+    assert data["zoom"] == 12
+
+def test_tile_endpoint(client, sightings):
+    # Tile 0/0/0 covers the world
+    data = client.get("/tiles/0/0/0").get_json()
+    assert sum(c["count"] for c in data["clusters"]) == 6
+    assert client.get("/tiles/1/2/0").status_code == 404
+    assert client.get("/tiles/4000000000/0/0").status_code == 404
+    assert client.get("/tiles/22/4194303/0").status_code == 200
+
+def test_incremental_refresh_and_updates(sightings):
+    docs, queries = sightings
+    pyramid = routes.cluster_pyramid
+    pyramid.build()
+
+    docs.append(sighting(SEATTLE, "disk"))
+    pyramid.refresh()
+    assert queries[-1]["_id"]["$gt"] == docs[-2]["_id"]
+    assert sum(c["count"] for c in pyramid.tile(0, 0, 0)) == 7
+
+    moved = dict(docs[0], location={"coordinates": SEATTLE})
+    pyramid.remove(docs[0])
+    pyramid.add(moved)
+    _, clusters = pyramid.clusters(0, -130, 40, -120, 50)
+    assert [c["count"] for c in clusters] == [4]
+
+def test_invalid_cluster_params(client):
+    assert client.get("/clusters?bbox=-80,42,-76,44").status_code == 400
+    assert client.get("/clusters?bbox=-80,44,-76,42&zoom=3").status_code == 400
+    # float() accepts nan and inf, which pass the ordering check
+    assert client.get("/clusters?bbox=nan,42,-76,44&zoom=3").status_code == 400
+    assert client.get("/clusters?bbox=-80,42,inf,44&zoom=3").status_code == 400
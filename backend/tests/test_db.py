@@ -0,0 +1,144 @@
+import sys
+import pytest
+from bson import ObjectId
+from pymongo import ReadPreference
+from pymongo.results import UpdateResult
+from backend.app import ufoSightings
+from backend.app.app import create_app
+import db
+
+
+@pytest.fixture
+def fresh_client(monkeypatch):
+    """A not-yet-connected data-access layer whose MongoClient records its arguments."""
+    created = []
+
+    class FakeClient:
+        def __init__(self, uri, **kwargs):
+            created.append((uri, kwargs))
+
+    monkeypatch.setattr(db, "MongoClient", FakeClient)
+    monkeypatch.setattr(db, "_client", None)
+    monkeypatch.setattr(db, "_async_client", None)
+    monkeypatch.setattr(db, "_collections", {})
+    monkeypatch.setattr(db, "settings", dict(db.settings))
+    return created
+
+
+def test_client_is_created_lazily_with_settings(fresh_client):
+    db.configure({"MONGO_URI": "mongodb://replica-a,replica-b/?replicaSet=rs0", "MONGO_MAX_POOL_SIZE": 20, "SECRET_KEY": "x"})
+    assert fresh_client == []
+
+    client = db.get_client()
+    assert db.get_client() is client
+    uri, options = fresh_client[0]
+    assert len(fresh_client) == 1
+    assert uri == "mongodb://replica-a,replica-b/?replicaSet=rs0"
+    assert options == {
+        "maxPoolSize": 20,
+        "minPoolSize": 0,
+        "serverSelectionTimeoutMS": 5000,
+        "compressors": "zlib",
+        "readPreference": "secondaryPreferred"
+    }
+
+def test_configure_after_connecting(fresh_client):
+    db.get_client()
+    db.configure({"MONGO_MAX_POOL_SIZE": db.settings["MONGO_MAX_POOL_SIZE"]})
+    with pytest.raises(RuntimeError):
+        db.configure({"MONGO_MAX_POOL_SIZE": 5})
+
+def test_create_app_configures_database(fresh_client):
+    create_app({"MONGO_MIN_POOL_SIZE": 4, "MONGO_READ_PREFERENCE": "nearest"})
+    assert fresh_client == []
+    assert db.settings["MONGO_MIN_POOL_SIZE"] == 4
+    assert db.settings["MONGO_READ_PREFERENCE"] == "nearest"
+
+def test_first_request_starts_warm_up_once(monkeypatch):
+    module = sys.modules[create_app.__module__]
+    calls = []
+    monkeypatch.setattr(module, "warm_up", lambda config: calls.append(config["UFO_SNAPSHOT"]))
+    monkeypatch.setattr(module, "_warm_up_thread", None)
+
+    create_app({"WARM_UP": False}).test_client().get("/missing")
+    assert module._warm_up_thread is None
+
+    client = create_app({"WARM_UP": True, "UFO_SNAPSHOT": True}).test_client()
+    client.get("/missing")
+    client.get("/missing")
+    module._warm_up_thread.join(1)
+    assert calls == [True]
+
+def test_reads_are_routed_by_read_preference(monkeypatch):
+    monkeypatch.setattr(db, "_client", None)
+    monkeypatch.setattr(db, "_collections", {})
+    monkeypatch.setattr(db, "settings", dict(db.settings, MONGO_URI="mongodb://localhost:1/"))
+    try:
+        collection = db.LazyCollection("GeoUFOSightings")
+        assert collection.read_preference == ReadPreference.SECONDARY_PREFERRED
+        with db.primary_reads():
+            assert collection.read_preference == ReadPreference.PRIMARY
+        assert collection.read_preference == ReadPreference.SECONDARY_PREFERRED
+    finally:
+        db.get_client().close()
+
+def test_comment_route_reads_from_primary(client, monkeypatch):
+    reads = []
+
+    def fake_find_one(query):
+        reads.append(db._primary_reads.get())
+        return {"_id": query["_id"]}
+
+    def fake_update_one(query, update):
+        reads.append(db._primary_reads.get())
+        return UpdateResult({"n": 1, "nModified": 1}, True)
+
+    monkeypatch.setattr(ufoSightings, "find_one", fake_find_one)
+    monkeypatch.setattr(ufoSightings, "update_one", fake_update_one)
+    oid = ObjectId()
+    client.post(f"/sighting/{oid}/comment", json={"comment": "Saw it too"})
+    client.get(f"/sighting/{oid}")
+    assert reads == [True, False]
+
+def test_migrate_user_comments(monkeypatch):
+    sighting_id = ObjectId()
+    comments = [f"comment {i}" for i in range(8)]
+    inserted, updates, claims = [], [], []
+
+    def fake_find_one_and_update(query, update, projection):
+        claims.append(update["$set"][db.MIGRATION_MARKER])
+        return {"_id": sighting_id, "user_comments": comments}
+
+    monkeypatch.setattr(ufoSightings, "find", lambda query, projection: [{"_id": sighting_id}])
+    monkeypatch.setattr(ufoSightings, "find_one_and_update", fake_find_one_and_update)
+    monkeypatch.setattr(ufoSightings, "update_one", lambda query, update: updates.append((query, update)))
+    monkeypatch.setattr(db.sightingComments, "delete_many", lambda query: None)
+    monkeypatch.setattr(db.sightingComments, "insert_many", inserted.extend)
+
+    assert db.migrate_user_comments() == 8
+    assert [c["comment"] for c in inserted] == comments
+    assert all(c["sighting_id"] == sighting_id for c in inserted)
+    # Only the process holding the claim completes the migration
+    assert updates == [(
+        {"_id": sighting_id, db.MIGRATION_MARKER: claims[0]},
+        {"$set": {"comment_count": 8, "user_comments": comments[-5:]}, "$unset": {db.MIGRATION_MARKER: ""}}
+    )]
+
+def test_migration_claimed_elsewhere_waits(monkeypatch):
+    """A second process neither deletes nor reinserts the comments another one is migrating."""
+    sighting = {"_id": ObjectId()}
+    polls = []
+
+    def fake_find_one(query, projection):
+        polls.append(query)
+        if len(polls) == 2:
+            # The other process finished
+            sighting["comment_count"] = 3
+        return dict(sighting)
+
+    monkeypatch.setattr(ufoSightings, "find_one_and_update", lambda query, update, projection: None)
+    monkeypatch.setattr(ufoSightings, "find_one", fake_find_one)
+    monkeypatch.setattr(db.sightingComments, "delete_many", lambda query: pytest.fail("deleted comments of a claimed sighting"))
+    monkeypatch.setattr(db, "MIGRATION_POLL_INTERVAL", 0)
+    assert db.migrate_sighting_comments(sighting["_id"]) == 0
+    assert len(polls) == 2
@@ -0,0 +1,71 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+from bson import ObjectId
+from backend.app import ufoSightings
+from .conftest import FakeCursor
+
+
+def make_docs(n):
+    return [{
+        "_id": ObjectId(),
+        "city": f"City{i}",
+        "comments": "Disk hovering, then gone",
+        "country": "us",
+        "shape": "disk",
+        "state": "ny",
+        "location": {"coordinates": [-77.6, 43.15]}
+    } for i in range(n)]
+
+
+@pytest.fixture
+def export_cursor(monkeypatch):
+    docs = make_docs(2500)
+    state = {}
+
+    def fake_find(query, projection):
+        state["query"] = query
+        state["projection"] = projection
+        state["cursor"] = FakeCursor(list(docs))
+        return state["cursor"]
+
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    state["docs"] = docs
+    return state
+
+
+def test_export_ndjson(client, export_cursor):
+    response = client.get("/sightings/shape/disk?format=ndjson")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.is_streamed
+    lines = response.get_data().decode("utf-8").splitlines()
+    assert len(lines) == 2500
+    assert json.loads(lines[0])["_id"] == str(export_cursor["docs"][0]["_id"])
+    assert export_cursor["cursor"].closed
+
+def test_export_csv_with_fieldset(client, export_cursor):
+    response = client.get("/sightings/shape/disk?format=csv&fields=city,latitude")
+    assert response.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(response.get_data().decode("utf-8"))))
+    assert len(rows) == 2500
+    assert rows[1] == {"_id": str(export_cursor["docs"][1]["_id"]), "city": "City1", "latitude": "43.15"}
+    assert export_cursor["projection"] == {"city": 1, "location.coordinates": 1}
+
+def test_export_gzip(client, export_cursor):
+    response = client.get("/search_word?q=disk&format=ndjson", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    lines = gzip.decompress(response.get_data()).decode("utf-8").splitlines()
+    assert len(lines) == 2500
+
+def test_export_closes_cursor_on_disconnect(client, export_cursor):
+    response = client.get("/search_nearby?lat=43&lon=-77&radius=10&format=ndjson", buffered=False)
+    next(iter(response.response))
+    response.close()
+    assert export_cursor["cursor"].closed
+
+def test_export_invalid_format(client):
+    response = client.get("/sightings/city/TestCity?format=xml")
+    assert response.status_code == 400
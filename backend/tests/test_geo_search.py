@@ -0,0 +1,117 @@
+import pytest
+from bson import ObjectId
+from backend.app import ufoSightings
+from backend.app import routes
+from .conftest import FakeCursor
+
+
+@pytest.fixture
+def geo_near(monkeypatch):
+    # 25 sightings, several sharing a distance, as $geoNear would annotate them
+    docs = [{
+        "_id": ObjectId(),
+        "city": f"City{i}",
+        "location": {"coordinates": [-77.6, 43.15]},
+        "distance_miles": float(i // 3)
+    } for i in range(25)]
+    pipelines = []
+
+    def fake_aggregate(pipeline):
+        pipelines.append(pipeline)
+        records = sorted(docs, key=lambda d: (d["distance_miles"], d["_id"]))
+        for stage in pipeline:
+            if "$match" in stage:
+                after = stage["$match"]["$or"]
+                d, last_id = after[1]["distance_miles"], after[1]["_id"]["$gt"]
+                records = [r for r in records if (r["distance_miles"], r["_id"]) > (d, last_id)]
+            elif "$skip" in stage:
+                records = records[stage["$skip"]:]
+            elif "$limit" in stage:
+                records = records[:stage["$limit"]]
+        return iter(records)
+
+    monkeypatch.setattr(ufoSightings, "aggregate", fake_aggregate)
+    monkeypatch.setattr(ufoSightings, "count_documents", lambda query: len(docs))
+    return docs, pipelines
+
+
+def test_nearby_distance_order(client, geo_near):
+    docs, pipelines = geo_near
+    data = client.get("/search_nearby?lat=43.15&lon=-77.6&radius=10&order=distance").get_json()
+    assert data["total"] == 25
+    assert [d["distance_miles"] for d in data["data"]] == sorted(d["distance_miles"] for d in data["data"])
+
+    geo = pipelines[0][0]["$geoNear"]
+    assert geo["near"] == {"type": "Point", "coordinates": [-77.6, 43.15]}
+    assert geo["maxDistance"] == pytest.approx(10 * 1609.344)
+    assert geo["distanceMultiplier"] == pytest.approx(1 / 1609.344)
+    assert "minDistance" not in geo
+
+def test_nearby_distance_cursor_walks_every_sighting_once(client, geo_near):
+    docs, pipelines = geo_near
+    seen, cursor = [], None
+    while True:
+        url = "/search_nearby?lat=43.15&lon=-77.6&radius=10&order=distance"
+        data = client.get(url + (f"&cursor={cursor}" if cursor else "")).get_json()
+        seen.extend(d["_id"] for d in data["data"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    expected = sorted(docs, key=lambda d: (d["distance_miles"], d["_id"]))
+    assert seen == [str(d["_id"]) for d in expected]
+    # Later pages prune nearer points with minDistance instead of skipping
+    assert pipelines[1][0]["$geoNear"]["minDistance"] > 0
+    assert not any("$skip" in stage for p in pipelines for stage in p)
+
+def test_nearby_distance_order_with_date_range(client, geo_near):
+    docs, pipelines = geo_near
+    data = client.get("/search_nearby?lat=43.15&lon=-77.6&radius=10&order=distance&from=2000&to=2005").get_json()
+    assert data["total"] == 25
+    query = pipelines[0][0]["$geoNear"]["query"]
+    # The radius is applied by maxDistance; only the date range is left to filter by
+    assert "location" not in str(query)
+    assert set(query["sighted_at"]) == {"$gte", "$lt"}
+
+def test_nearby_total_and_pages_share_one_radius():
+    query, near = routes.nearby_query({"lat": "43.15", "lon": "-77.6", "radius": "10", "order": "distance"})
+    radians = query["location"]["$geoWithin"]["$centerSphere"][1]
+    max_distance = routes.nearest_pipeline(query, near, 1)[0]["$geoNear"]["maxDistance"]
+    # $geoNear measures meters on a sphere of EARTH_RADIUS_METERS
+    assert radians * routes.EARTH_RADIUS_METERS == pytest.approx(max_distance)
+
+def test_nearby_invalid_order(client):
+    response = client.get("/search_nearby?lat=43&lon=-77&radius=10&order=random")
+    assert response.status_code == 400
+
+def test_viewport_search(client, monkeypatch):
+    captured = {}
+
+    def fake_find(query, projection):
+        captured["query"] = query
+        return FakeCursor([])
+
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    monkeypatch.setattr(ufoSightings, "count_documents", lambda query, **kwargs: 0)
+    response = client.get("/search_viewport?bbox=-78,42,-77,43&total=estimate")
+    assert response.status_code == 200
+    polygon = captured["query"]["location"]["$geoWithin"]["$geometry"]
+    ring = polygon["coordinates"][0]
+    assert ring[0] == ring[-1] == [-78.0, 42]
+    assert {tuple(p) for p in ring} >= {(-78.0, 42), (-77.0, 42), (-77.0, 43), (-78.0, 43)}
+
+def test_viewport_across_antimeridian_is_split():
+    query = routes.viewport_query(170, 0, -170, 5)
+    rings = [c["location"]["$geoWithin"]["$geometry"]["coordinates"][0] for c in query["$or"]]
+    spans = sorted((min(p[0] for p in ring), max(p[0] for p in ring)) for ring in rings)
+    assert spans == [(-180.0, -170.0), (170.0, 180.0)]
+
+def test_viewport_invalid_bbox(client):
+    assert client.get("/search_viewport").status_code == 400
+    assert client.get("/search_viewport?bbox=1,2,3").status_code == 400
+    assert client.get("/search_viewport?bbox=-78,43,-77,42").status_code == 400
+    assert client.get("/search_viewport?bbox=nan,42,-77,43").status_code == 400
+    assert client.get("/search_viewport?bbox=-78,42,inf,43").status_code == 400
+
+def test_nearby_rejects_non_finite_values(client):
+    assert client.get("/search_nearby?lat=nan&lon=-77&radius=10").status_code == 400
+    assert client.get("/search_nearby?lat=43&lon=-77&radius=inf&order=distance").status_code == 400
@@ -0,0 +1,85 @@
+import pytest
+from bson import ObjectId
+from backend.app import ufoSightings
+from backend.app import routes
+from backend.app.heatmap import sighting_year
+from .conftest import FakeCursor
+
+
+def sighting(lon, lat, shape, state, when):
+    return {
+        "_id": ObjectId(),
+        "location": {"type": "Point", "coordinates": [lon, lat]},
+        "shape": shape,
+        "state": state,
+        "datetime": when
+    }
+
+
+@pytest.fixture
+def sightings(monkeypatch):
+    docs = [
+        sighting(-77.6, 43.1, "disk", "ny", "10/10/1999 20:30"),
+        sighting(-77.5, 43.2, "light", "ny", "6/1/2005 21:00"),
+        sighting(-122.3, 47.6, "light", "wa", "7/4/2005 22:15"),
+        sighting(-122.4, 47.5, "light", "wa", "unknown"),
+        sighting(179.5, 10.0, "sphere", None, "1/1/2010 00:00"),
+        {"_id": ObjectId(), "location": None, "shape": "disk"}
+    ]
+    queries = []
+
+    def fake_find(query, projection):
+        queries.append(query)
+        records = docs
+        if "_id" in query:
+            records = [d for d in docs if d["_id"] > query["_id"]["$gt"]]
+        return FakeCursor(list(records))
+
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    return docs, queries
+
+
+def test_world_heatmap(client, sightings):
+    data = client.get("/heatmap?width=4&height=2").get_json()
+    assert data["total"] == 5
+    # Rows run north to south: every sighting is in the northern half
+    assert data["grid"] == [[2, 2, 0, 1], [0, 0, 0, 0]]
+    assert data["max"] == 2
+
+def test_heatmap_bbox_and_resolution(client, sightings):
+    data = client.get("/heatmap?bbox=-80,42,-76,44&width=2&height=2").get_json()
+    assert data["grid"] == [[0, 2], [0, 0]]
+
+def test_heatmap_filters(client, sightings):
+    assert client.get("/heatmap?shape=Light").get_json()["total"] == 3
+    assert client.get("/heatmap?state=wa&shape=light").get_json()["total"] == 2
+    assert client.get("/heatmap?year=2005").get_json()["total"] == 2
+    assert client.get("/heatmap?shape=cigar").get_json()["total"] == 0
+
+def test_heatmap_across_antimeridian(client, sightings):
+    data = client.get("/heatmap?bbox=170,0,-170,20&width=2&height=1").get_json()
+    assert data["grid"] == [[1, 0]]
+
+def test_heatmap_refresh_and_stats(client, sightings):
+    docs, queries = sightings
+    points = routes.sighting_points
+    points.load()
+    docs.append(sighting(-77.6, 43.1, "disk", "ny", "2/2/2020 10:00"))
+    points.refresh()
+    assert queries[-1]["_id"]["$gt"] == docs[-2]["_id"]
+
+    stats = client.get("/heatmap/stats").get_json()
+    assert stats["points"] == 6
+    assert stats["arrays"]["lon"] == 6 * 8
+    assert stats["bytes"] == sum(stats["arrays"].values())
+
+def test_invalid_heatmap_params(client):
+    assert client.get("/heatmap?bbox=1,2,3").status_code == 400
+    assert client.get("/heatmap?bbox=-180,nan,180,90").status_code == 400
+    assert client.get("/heatmap?width=0").status_code == 400
+    assert client.get("/heatmap?height=5000").status_code == 400
+    assert client.get("/heatmap?year=recent").status_code == 400
+
+def test_sighting_year():
+    assert sighting_year({"datetime": "10/10/1949 20:30"}) == 1949
+    assert sighting_year({"datetime": ""}) is None
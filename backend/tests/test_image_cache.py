@@ -0,0 +1,70 @@
+import io
+import base64
+import pytest
+from bson import ObjectId
+from backend.app import ufoSightings, fs
+from backend.app.images import ImageCache
+
+
+@pytest.fixture
+def gridfs_reads(monkeypatch):
+    reads = []
+
+    def fake_fs_get(oid):
+        reads.append(oid)
+        return io.BytesIO(b"x" * 100)
+
+    monkeypatch.setattr(fs, "get", fake_fs_get)
+    return reads
+
+
+def test_cache_hits_after_first_read(gridfs_reads):
+    cache = ImageCache()
+    file_id = ObjectId()
+    assert cache.get(file_id).data == b"x" * 100
+    assert cache.get(str(file_id)).data == b"x" * 100
+    assert gridfs_reads == [file_id]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+def test_base64_encoding_is_cached(gridfs_reads):
+    cache = ImageCache()
+    file_id = ObjectId()
+    encoded = cache.get_base64(file_id)
+    assert base64.b64decode(encoded) == b"x" * 100
+    assert cache.get_base64(file_id) is encoded
+    assert cache.stats()["bytes"] == 100 + len(encoded)
+
+def test_lru_eviction_respects_byte_budget(gridfs_reads):
+    cache = ImageCache(max_bytes=250)
+    first, second, third = ObjectId(), ObjectId(), ObjectId()
+    cache.get(first)
+    cache.get(second)
+    cache.get(first)  # first is now the most recently used
+    cache.get(third)
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 200
+    cache.get(first)
+    assert gridfs_reads == [first, second, third]
+
+def test_warm_preloads_referenced_images(gridfs_reads, monkeypatch):
+    state_img, ufo_img = ObjectId(), ObjectId()
+    refs = {"image": [state_img, None], "ufo_image": [ufo_img, state_img]}
+    monkeypatch.setattr(ufoSightings, "distinct", lambda field: refs[field])
+    cache = ImageCache()
+    cache.warm()
+    assert sorted(gridfs_reads) == sorted([state_img, ufo_img])
+    assert cache.stats()["entries"] == 2
+
+def test_detail_view_reads_gridfs_once(client, gridfs_reads, monkeypatch):
+    image_id = ObjectId()
+    monkeypatch.setattr(ufoSightings, "find_one", lambda query: {"_id": query["_id"], "image": image_id})
+    for _ in range(3):
+        data = client.get(f"/sighting/{ObjectId()}").get_json()
+        assert base64.b64decode(data["image"]) == b"x" * 100
+    assert gridfs_reads == [image_id]
+
+    stats = client.get("/images/stats").get_json()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
@@ -0,0 +1,117 @@
+import datetime
+import json
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from pymongo.results import InsertManyResult
+from backend.app import ufoSightings, imageFiles
+import ingest
+
+ROW = {
+    "datetime": "10/10/1999 24:00",
+    "city": "Rochester",
+    "state": "ny",
+    "country": "us",
+    "shape": "disk",
+    "duration (seconds)": 120,
+    "comments": "Bright disk over the lake",
+    "latitude": "43.15",
+    "longitude": -77.6
+}
+
+
+@pytest.fixture
+def image_files(monkeypatch):
+    files = {name: ObjectId() for name in ("ny.jpg", "unknown_state.jpg", "disk_a.jpg", "disk_b.jpg", "disk_c.jpg", "default.jpg")}
+    queries = []
+
+    def fake_find(query, projection):
+        queries.append(query)
+        return [{"_id": file_id, "filename": name} for name, file_id in files.items()]
+
+    monkeypatch.setattr(imageFiles, "find", fake_find)
+    ingest.image_refs.invalidate()
+    yield files, queries
+    ingest.image_refs.invalidate()
+
+
+@pytest.fixture
+def inserted(monkeypatch):
+    batches = []
+
+    def fake_insert_many(docs, ordered=True):
+        assert ordered is False
+        batches.append(list(docs))
+        return InsertManyResult([ObjectId() for _ in docs], True)
+
+    monkeypatch.setattr(ufoSightings, "insert_many", fake_insert_many)
+    return batches
+
+
+def test_build_sighting(image_files):
+    files, queries = image_files
+    doc = ingest.build_sighting(dict(ROW))
+    assert doc["location"] == {"type": "Point", "coordinates": [-77.6, 43.15]}
+    assert doc["sighted_at"] == datetime.datetime(1999, 10, 11)
+    assert doc["city_lc"] == "rochester"
+    # New sightings take their first comment without a migration
+    assert (doc["comment_count"], doc["user_comments"]) == (0, [])
+    assert doc["image"] == files["ny.jpg"]
+    assert doc["ufo_image"] in {files["disk_a.jpg"], files["disk_b.jpg"], files["disk_c.jpg"]}
+    # The illustration is the same on every run, and the file map is read once
+    assert ingest.build_sighting(dict(ROW))["ufo_image"] == doc["ufo_image"]
+    assert len(queries) == 1
+
+    doc = ingest.build_sighting(dict(ROW, state="zz", shape="blob", latitude="", longitude=""))
+    assert doc["location"] is None
+    assert doc["image"] == files["unknown_state.jpg"]
+    assert doc["ufo_image"] == files["default.jpg"]
+
+@pytest.mark.parametrize("row, message", [
+    (dict(ROW, datetime="sometime"), "Invalid datetime"),
+    (dict(ROW, latitude="north"), "Invalid latitude"),
+    (dict(ROW, longitude=-200), "longitude out of range"),
+    (dict(ROW, latitude=""), "given together"),
+    (dict(ROW, city=12), "Invalid city"),
+    (dict(ROW, comments={"text": "hi"}), "Invalid comments"),
+    (dict(ROW, **{"duration (seconds)": [60]}), r"Invalid duration \(seconds\)"),
+    (dict(ROW, **{"duration (hours/min)": True}), "Invalid duration"),
+    (dict(ROW, **{"date posted": {"$date": 0}}), "Invalid date posted"),
+    (dict(ROW, image="x"), "Unknown fields image"),
+    ([1, 2], "Expected a JSON object"),
+])
+def test_build_sighting_validation(image_files, row, message):
+    with pytest.raises(ValueError, match=message):
+        ingest.build_sighting(row)
+
+def test_bulk_ingest_reports_bad_rows(client, image_files, inserted):
+    body = "\n".join([
+        json.dumps(ROW),
+        "{not json",
+        json.dumps(dict(ROW, datetime="")),
+        "",
+        json.dumps(dict(ROW, city="Buffalo"))
+    ])
+    response = client.post("/sightings/bulk", data=body, content_type="application/x-ndjson")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["inserted"] == 2
+    assert [error["line"] for error in data["errors"]] == [2, 3]
+    assert data["errors"][0]["error"].startswith("Invalid JSON")
+    assert [doc["city"] for doc in inserted[0]] == ["Rochester", "Buffalo"]
+
+def test_bulk_ingest_batches_and_write_errors(image_files, monkeypatch):
+    batches = []
+
+    def fake_insert_many(docs, ordered=True):
+        batches.append(len(docs))
+        if len(batches) == 2:
+            raise BulkWriteError({"nInserted": 1, "writeErrors": [{"index": 1, "errmsg": "duplicate key"}]})
+        return InsertManyResult([ObjectId() for _ in docs], True)
+
+    monkeypatch.setattr(ufoSightings, "insert_many", fake_insert_many)
+    rows = [(line, dict(ROW)) for line in range(1, 6)]
+    count, errors = ingest.ingest_rows(rows, batch_size=3)
+    assert batches == [3, 2]
+    assert count == 4
+    assert errors == [{"line": 5, "error": "duplicate key"}]
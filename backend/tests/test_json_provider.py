@@ -0,0 +1,40 @@
+import datetime
+import pytest
+from bson import ObjectId
+from flask import Flask
+from backend.app import json_provider
+from backend.app.json_provider import FastJSONProvider
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def provider(request, monkeypatch):
+    if request.param == "orjson" and json_provider.orjson is None:
+        pytest.skip("orjson is not installed")
+    if request.param == "stdlib":
+        monkeypatch.setattr(json_provider, "orjson", None)
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    yield app.json
+
+
+def test_encodes_objectid_and_datetime(provider):
+    oid = ObjectId()
+    doc = {"_id": oid, "seen": datetime.datetime(1949, 10, 10, 20, 30), "city": "san marcos"}
+    assert provider.loads(provider.dumps(doc)) == {
+        "_id": str(oid),
+        "seen": "1949-10-10T20:30:00",
+        "city": "san marcos"
+    }
+
+def test_keeps_key_order(provider):
+    assert provider.dumps({"b": 1, "a": 2}).replace(" ", "") == '{"b":1,"a":2}'
+
+def test_response(provider):
+    oid = ObjectId()
+    response = provider.response({"_id": oid})
+    assert response.mimetype == "application/json"
+    assert response.get_json() == {"_id": str(oid)}
+
+def test_rejects_unknown_types(provider):
+    with pytest.raises(TypeError):
+        provider.dumps({"value": object()})
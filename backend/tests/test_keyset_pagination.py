@@ -0,0 +1,82 @@
+from bson import ObjectId
+from backend.app import ufoSightings
+from backend.app import routes
+from .conftest import FakeCursor
+
+
+def make_docs(n):
+    return [{
+        "_id": ObjectId(),
+        "city": f"TestCity{i}",
+        "comments": "TestComment",
+        "country": "US",
+        "shape": "circle",
+        "state": "TS",
+        "location": {"coordinates": [-80.0, 40.0]}
+    } for i in range(n)]
+
+
+def test_page_response_includes_next_cursor(client):
+    # 15 "$or" records: page 1 has a next cursor, page 2 is the last page
+    data = client.get("/search_word?q=test&page=1").get_json()
+    assert data["next_cursor"]
+    data2 = client.get("/search_word?q=test&page=2").get_json()
+    assert data2["next_cursor"] is None
+
+def test_cursor_resumes_after_last_id(client, monkeypatch):
+    docs = make_docs(25)
+    seen_queries = []
+
+    def fake_find(query, projection):
+        seen_queries.append(query)
+        records = sorted(docs, key=lambda d: d["_id"])
+        if "$and" in query:
+            last_id = query["$and"][1]["_id"]["$gt"]
+            records = [d for d in records if d["_id"] > last_id]
+        return FakeCursor(records)
+
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    monkeypatch.setattr(ufoSightings, "count_documents", lambda query: len(docs))
+
+    collected = []
+    url = "/sightings/shape/circle"
+    cursor = None
+    while True:
+        data = client.get(url + (f"?cursor={cursor}" if cursor else "")).get_json()
+        assert data["total"] == 25
+        collected.extend(d["_id"] for d in data["data"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+
+    assert collected == [str(d["_id"]) for d in sorted(docs, key=lambda d: d["_id"])]
+    # Cursor pages never skip: every keyset query starts from the previous page's last _id
+    assert all("$and" in q for q in seen_queries[1:])
+
+def test_after_alias_is_accepted(client, monkeypatch):
+    captured = {}
+
+    def fake_find(query, projection):
+        captured["query"] = query
+        return FakeCursor([])
+
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    token = routes.encode_cursor({"_id": ObjectId()})
+    response = client.get(f"/sightings/city/TestCity?after={token}")
+    assert response.status_code == 200
+    assert "$and" in captured["query"]
+
+def test_invalid_cursor(client):
+    response = client.get("/sightings/state/TS?cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+def test_keyset_filter_on_secondary_sort_field():
+    last_id = ObjectId()
+    token = routes.encode_cursor({"_id": last_id, "city": "Rochester"}, "city")
+    value, decoded_id = routes.decode_cursor(token)
+    assert (value, decoded_id) == ("Rochester", last_id)
+    assert routes.keyset_filter((value, decoded_id), "city", -1) == {"$or": [
+        {"city": {"$lt": "Rochester"}},
+        {"city": "Rochester", "_id": {"$lt": last_id}}
+    ]}
@@ -0,0 +1,222 @@
+import pytest
+from pymongo.results import DeleteResult, InsertManyResult
+from backend.app import imageFiles, ingestCheckpoints, sightingComments
+import loader
+
+CSV = """datetime,city,state,country,shape,duration (seconds),duration (hours/min),comments,date posted,latitude,longitude 
+10/10/1949 20:30,san marcos,tx,us,cylinder,2700,45 minutes,This event took place in early fall around 1949-50,4/27/2004,29.8830556,-97.9411111
+10/10/1956 21:00,edna,tx,us,circle,20,1/2 hour,My older brother and twin sister were leaving the only Edna theater,1/17/2004,28.9783333,-96.6458333
+10/10/1960 20:00,kaneohe,hi,us,light,900,15 minutes,AS a Marine 1st Lt. flying an FJ4B fighter/attack aircraft,1/22/2004,21.4180556,-157.8036111
+10/10/1960 20:00,kaneohe,hi,us,light,900,15 minutes,AS a Marine 1st Lt. flying an FJ4B fighter/attack aircraft,1/22/2004,21.4180556,-157.8036111
+10/10/1961 19:00,bristol,tn,us,other,300,5 minutes,My father is now 89 my brother 52 the girl with us now 51,4/27/2007,36.5950000,33q.200088
+"""
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self.batches = []
+        self.events = []
+        self.docs = []
+
+    def find(self, query, projection):
+        ids = query["_id"]["$in"]
+        return [doc for doc in self.docs if doc["_id"] in ids and "source_fingerprint" not in doc]
+
+    def drop(self):
+        self.events.append("drop")
+
+    def insert_many(self, docs, ordered=True):
+        self.batches.append(docs)
+        return InsertManyResult([doc["_id"] for doc in docs], True)
+
+    def create_indexes(self, indexes):
+        self.events.append(("create_indexes", len(indexes)))
+
+    def rename(self, name, dropTarget=False):
+        self.events.append(("rename", name, dropTarget))
+
+
+@pytest.fixture
+def staging(monkeypatch, tmp_path):
+    collections = {}
+
+    class FakeDatabase:
+        def __getitem__(self, name):
+            return collections.setdefault(name, FakeCollection(name))
+
+    monkeypatch.setattr(loader, "get_database", lambda: FakeDatabase())
+    monkeypatch.setattr(imageFiles, "find", lambda query, projection: [])
+    monkeypatch.setattr(sightingComments, "aggregate", lambda pipeline: collections.setdefault("comment_merges", []).append(pipeline))
+    monkeypatch.setattr(sightingComments, "distinct", lambda field: collections.get("commented", []))
+    monkeypatch.setattr(sightingComments, "bulk_write", lambda operations, ordered: collections.setdefault("comment_moves", []).extend(operations))
+    path = tmp_path / "ufo_scrubbed.csv"
+    path.write_text(CSV)
+    return collections, str(path)
+
+
+def test_load_csv(staging, monkeypatch):
+    collections, path = staging
+    bumps = []
+    monkeypatch.setattr(loader, "bump_sightings_generation", lambda: bumps.append(True))
+    result = loader.load_csv(path, batch_size=2, workers=2)
+    assert result.inserted == 4
+    assert result.rejected == 1
+    assert result.errors == [{"line": 6, "error": "Invalid longitude: '33q.200088'"}]
+
+    collection = collections["GeoUFOSightings_loading"]
+    assert sorted(len(batch) for batch in collection.batches) == [2, 2]
+    # Indexes are built after the load, then the staging collection replaces the live one
+    assert collection.events == ["drop", ("create_indexes", 12), ("rename", "GeoUFOSightings", True)]
+    # Comment counts and previews are carried over from the comments collection
+    assert collections["comment_merges"][0][-1]["$merge"]["into"] == "GeoUFOSightings_loading"
+    # Running servers rebuild their in-memory indexes over the new collection
+    assert bumps == [True]
+
+    docs = [doc for batch in collection.batches for doc in batch]
+    first = next(doc for doc in docs if doc["city"] == "san marcos")
+    assert first["duration (seconds)"] == 2700
+    assert first["location"]["coordinates"] == [-97.9411111, 29.8830556]
+    # Duplicate rows still get distinct ids
+    assert len({doc["_id"] for doc in docs}) == 4
+
+def test_load_keeps_comments_of_sightings_built_elsewhere(staging):
+    """Sightings from build_project_db.js have ordinary ObjectIds; their comments follow them to the new ids."""
+    collections, path = staging
+    old = [
+        # The two identical Kaneohe rows, oldest first, and a sighting no row matches
+        {"_id": loader.ObjectId(f"{i:024x}"), "datetime": "10/10/1960 20:00", "city": "kaneohe", "state": "hi", "country": "us",
+         "shape": "light", "location": {"type": "Point", "coordinates": [-157.8036111, 21.4180556]}}
+        for i in (1, 2)
+    ] + [{"_id": loader.ObjectId(f"{3:024x}"), "datetime": "1/1/2000 0:00", "city": "gone", "location": None}]
+    collections["GeoUFOSightings"] = FakeCollection("GeoUFOSightings")
+    collections["GeoUFOSightings"].docs = old
+    collections["commented"] = [doc["_id"] for doc in old]
+
+    loader.load_csv(path)
+    docs = [doc for batch in collections["GeoUFOSightings_loading"].batches for doc in batch]
+    kaneohe = [doc["_id"] for doc in docs if doc["city"] == "kaneohe"]
+    moves = {op._filter["sighting_id"]: op._doc["$set"]["sighting_id"] for op in collections["comment_moves"]}
+    assert moves == {old[0]["_id"]: kaneohe[0], old[1]["_id"]: kaneohe[1]}
+
+
+def test_load_is_deterministic(staging):
+    collections, path = staging
+    loader.load_csv(path)
+    first = [doc["_id"] for doc in collections["GeoUFOSightings_loading"].batches[0]]
+    collections.clear()
+    loader.load_csv(path)
+    assert [doc["_id"] for doc in collections["GeoUFOSightings_loading"].batches[0]] == first
+    # Ids sort below every ObjectId generated at insert time
+    assert all(oid.generation_time.year == 1970 for oid in first)
+
+
+class FakeSightings:
+    """Live collection for sync_csv(): documents by _id, with the calls it makes."""
+
+    def __init__(self, docs=()):
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.writes = []
+
+    def find(self, query, projection):
+        if "_id" in query:
+            return [self.docs[i] for i in query["_id"]["$in"] if i in self.docs]
+        return [doc for doc in self.docs.values() if "source_fingerprint" in doc]
+
+    def bulk_write(self, operations, ordered=True):
+        for op in operations:
+            _id = op._filter["_id"]
+            self.writes.append(_id)
+            if _id not in self.docs:
+                self.docs[_id] = dict(op._doc.get("$setOnInsert", {}), _id=_id)
+            self.docs[_id].update(op._doc["$set"])
+
+    def delete_many(self, query):
+        ids = [i for i in query["_id"]["$in"] if self.docs.pop(i, None)]
+        return DeleteResult({"n": len(ids)}, True)
+
+
+@pytest.fixture
+def stat_changes(monkeypatch):
+    changes = []
+    monkeypatch.setattr(loader.sighting_stats, "update_many", changes.extend)
+    return changes
+
+
+@pytest.fixture
+def checkpoints(monkeypatch):
+    saved = {}
+    monkeypatch.setattr(ingestCheckpoints, "find_one", lambda query: saved.get(query["_id"]))
+    monkeypatch.setattr(ingestCheckpoints, "update_one", lambda query, update, upsert: saved.setdefault(query["_id"], {}).update(update["$set"]))
+    monkeypatch.setattr(ingestCheckpoints, "delete_one", lambda query: saved.pop(query["_id"], None))
+    return saved
+
+
+def loaded(staging):
+    """The documents a full load of the test CSV writes."""
+    collections, path = staging
+    loader.load_csv(path)
+    return [doc for batch in collections["GeoUFOSightings_loading"].batches for doc in batch]
+
+
+def test_sync_writes_only_changes(staging, checkpoints, stat_changes, monkeypatch):
+    _, path = staging
+    docs = loaded(staging)
+    api_sighting = {"_id": loader.ObjectId(), "city": "added through the API"}
+    live = FakeSightings(docs + [api_sighting])
+    live.docs[docs[0]["_id"]]["comment_count"] = 3
+    monkeypatch.setattr(loader, "get_collection", lambda name, primary: live)
+
+    # Edna's comment changes, the first Kaneohe row is gone and a new row is added
+    lines = CSV.splitlines()
+    lines[2] = lines[2].replace("leaving the only Edna theater", "leaving the theater")
+    del lines[3]
+    lines.append("7/4/2005 22:00,seattle,wa,us,light,60,1 minute,Fireworks?,7/5/2005,47.6,-122.3")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+    result = loader.sync_csv(path)
+    assert (result.inserted, result.updated, result.unchanged, result.removed, result.rejected) == (1, 1, 2, 1, 1)
+    assert len(live.writes) == 2
+    assert live.docs[docs[1]["_id"]]["comments"] == "My older brother and twin sister were leaving the theater"
+    # Updates keep the comment summary; API sightings are never removed
+    assert live.docs[docs[0]["_id"]]["comment_count"] == 3
+    seattle = next(doc for doc in live.docs.values() if doc.get("city") == "seattle")
+    assert (seattle["comment_count"], seattle["user_comments"]) == (0, [])
+    assert api_sighting["_id"] in live.docs
+    assert checkpoints == {}
+    # The /stats rollups follow the update, the insert and the removal
+    assert [(old and old["city"], new and new["city"]) for old, new in stat_changes] == [
+        ("edna", "edna"), (None, "seattle"), ("kaneohe", None)
+    ]
+
+    # Nothing changed since: nothing is written
+    live.writes.clear()
+    assert loader.sync_csv(path).unchanged == 4
+    assert live.writes == []
+
+def test_sync_resumes_after_interruption(staging, checkpoints, stat_changes, monkeypatch):
+    _, path = staging
+    live = FakeSightings()
+    monkeypatch.setattr(loader, "get_collection", lambda name, primary: live)
+    real_bulk_write = live.bulk_write
+    calls = []
+
+    def failing_bulk_write(operations, ordered=True):
+        calls.append(len(operations))
+        if len(calls) == 2:
+            raise ConnectionError("connection lost")
+        real_bulk_write(operations, ordered)
+    live.bulk_write = failing_bulk_write
+
+    with pytest.raises(ConnectionError):
+        loader.sync_csv(path, batch_size=2)
+    assert list(checkpoints.values())[0]["line"] == 3
+
+    live.bulk_write = real_bulk_write
+    result = loader.sync_csv(path, batch_size=2)
+    assert result.resumed_from == 3
+    # The first batch is not compared again, and counts carry over from the interrupted run
+    assert sorted(live.writes) == sorted(doc["_id"] for doc in live.docs.values())
+    assert (result.inserted, result.rejected, result.removed) == (4, 1, 0)
+    assert checkpoints == {}
@@ -0,0 +1,47 @@
+import pytest
+from backend.app import ufoSightings
+from backend.app import routes
+from .conftest import FakeCursor
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    captured = {}
+
+    def fake_find(query, projection):
+        captured["query"] = query
+        return FakeCursor([])
+
+    def fake_aggregate(pipeline):
+        captured["query"] = pipeline[0]["$match"]
+        return iter([{"data": [], "total": []}])
+
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    monkeypatch.setattr(ufoSightings, "aggregate", fake_aggregate)
+    return captured
+
+
+def test_exact_match_uses_shadow_field(client, captured):
+    response = client.get("/sightings/city/Rochester?match=exact")
+    assert response.status_code == 200
+    assert captured["query"] == {"city_lc": "rochester"}
+
+def test_prefix_match_is_anchored_and_escaped(client, captured):
+    response = client.get("/sightings/state/N.?match=prefix")
+    assert response.status_code == 200
+    assert captured["query"] == {"state_lc": {"$regex": "^n\\."}}
+
+def test_contains_is_the_default(client, captured):
+    client.get("/sightings/shape/Disk")
+    assert captured["query"] == {"shape": {"$regex": "Disk", "$options": "i"}}
+    client.get("/sightings/country/us?match=contains")
+    assert captured["query"] == {"country": {"$regex": "us", "$options": "i"}}
+
+def test_invalid_match_mode(client):
+    response = client.get("/sightings/country/US?match=fuzzy")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+def test_field_query_modes():
+    assert routes.field_query("country", "US", "exact") == {"country_lc": "us"}
+    assert routes.field_query("shape", "cig", "prefix") == {"shape_lc": {"$regex": "^cig"}}
@@ -0,0 +1,74 @@
+import pytest
+from bson import ObjectId
+from pymongo.errors import ExecutionTimeout
+from backend.app import ufoSightings
+from backend.app import routes
+from .conftest import FakeCursor
+
+
+def make_docs(n):
+    return [{
+        "_id": ObjectId(),
+        "city": "TestCity",
+        "comments": "TestComment",
+        "country": "US",
+        "shape": "disk",
+        "state": "TS",
+        "location": {"coordinates": [-80.0, 40.0]}
+    } for i in range(n)]
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    docs = make_docs(11)
+    calls = {"aggregate": 0, "find": 0}
+
+    def fake_aggregate(pipeline):
+        calls["aggregate"] += 1
+        assert "$facet" in pipeline[-1]
+        return iter([{"data": docs, "total": [{"count": 42}]}])
+
+    def fake_find(query, projection):
+        calls["find"] += 1
+        return FakeCursor(list(docs))
+
+    def fail_count(query, **kwargs):
+        raise AssertionError("count_documents should not be called")
+
+    monkeypatch.setattr(ufoSightings, "aggregate", fake_aggregate)
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    monkeypatch.setattr(ufoSightings, "count_documents", fail_count)
+    return calls
+
+
+def test_first_page_fetches_page_and_total_in_one_aggregation(client, calls):
+    data = client.get("/sightings/shape/disk?page=1").get_json()
+    assert data["total"] == 42
+    assert data["total_estimated"] is False
+    assert len(data["data"]) == 10
+    assert calls == {"aggregate": 1, "find": 0}
+
+def test_total_is_cached_across_page_turns(client, calls):
+    client.get("/sightings/shape/disk?page=1")
+    data = client.get("/sightings/shape/disk?page=2").get_json()
+    assert data["total"] == 42
+    assert calls == {"aggregate": 1, "find": 1}
+
+def test_estimated_total_skips_exact_count(client, calls, monkeypatch):
+    monkeypatch.setattr(ufoSightings, "count_documents", lambda query, **kwargs: kwargs["limit"])
+    data = client.get("/sightings/shape/disk?total=estimate").get_json()
+    assert data["total"] == routes.ESTIMATE_COUNT_CAP
+    assert data["total_estimated"] is True
+    assert calls == {"aggregate": 0, "find": 1}
+
+def test_estimated_total_falls_back_to_collection_count(client, calls, monkeypatch):
+    def slow_count(query, **kwargs):
+        raise ExecutionTimeout("operation exceeded time limit")
+    monkeypatch.setattr(ufoSightings, "count_documents", slow_count)
+    monkeypatch.setattr(ufoSightings, "estimated_document_count", lambda: 80332)
+    data = client.get("/sightings/shape/disk?total=estimate").get_json()
+    assert data["total"] == 80332
+    assert data["total_estimated"] is True
+
+def test_query_key_is_order_independent():
+    assert routes.query_key({"a": 1, "b": 2}) == routes.query_key({"b": 2, "a": 1})
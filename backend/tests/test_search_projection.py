@@ -0,0 +1,63 @@
+import pytest
+from bson import ObjectId
+from backend.app import ufoSightings
+from backend.app import routes
+from .conftest import FakeCursor
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    captured = {}
+
+    def fake_aggregate(pipeline):
+        captured["pipeline"] = pipeline
+        doc = {
+            "_id": ObjectId(),
+            "city": "Rochester",
+            "comments": "Bright light",
+            "country": "us",
+            "shape": "light",
+            "state": "ny",
+            "location": {"coordinates": [-77.6, 43.15]}
+        }
+        return iter([{"data": [doc], "total": [{"count": 1}]}])
+
+    def fake_find(query, projection):
+        captured["projection"] = projection
+        return FakeCursor([])
+
+    monkeypatch.setattr(ufoSightings, "aggregate", fake_aggregate)
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    return captured
+
+
+def test_search_sends_projection(client, captured):
+    client.get("/sightings/city/Rochester")
+    project = captured["pipeline"][-1]["$facet"]["data"][-1]["$project"]
+    assert project == {
+        "city": 1, "comments": 1, "country": 1, "shape": 1, "state": 1,
+        "location.coordinates": 1, "_id": 1
+    }
+
+def test_sparse_fieldset(client, captured):
+    data = client.get("/sightings/city/Rochester?fields=city,latitude").get_json()
+    assert data["data"][0].keys() == {"_id", "city", "latitude"}
+    assert data["data"][0]["latitude"] == 43.15
+    project = captured["pipeline"][-1]["$facet"]["data"][-1]["$project"]
+    assert project == {"city": 1, "location.coordinates": 1, "_id": 1}
+
+def test_sparse_fieldset_on_cached_page(client, captured):
+    client.get("/search_word?q=light&fields=shape")
+    client.get("/search_word?q=light&fields=shape&page=2")
+    assert captured["projection"] == {"shape": 1, "_id": 1}
+
+def test_invalid_fieldset(client):
+    response = client.get("/search_nearby?lat=40&lon=-80&radius=5&fields=city,user_comments")
+    assert response.status_code == 400
+    assert "user_comments" in response.get_json()["error"]
+
+def test_convert_to_str_handles_missing_location():
+    doc = {"_id": ObjectId(), "city": "Nowhere", "location": None}
+    result = routes.convert_to_str(doc)
+    assert result["latitude"] is None and result["longitude"] is None
+    assert result["state"] == "N/A"
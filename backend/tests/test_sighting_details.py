@@ -1,6 +1,12 @@
 import base64
+import datetime
+import io
+import pytest
 from bson import ObjectId
-from backend.app import ufoSightings
+from gridfs.errors import NoFile
+from pymongo.results import UpdateResult
+from backend.app import ufoSightings, sightingComments, fs
+from .conftest import FakeCursor
 
 def test_get_sighting_not_found(client, monkeypatch):
     monkeypatch.setattr(ufoSightings, "find_one", lambda query: None)
@@ -26,25 +32,210 @@ def test_get_sighting_with_image(client, monkeypatch):
     assert decoded == b"dummy_image_content"
 
 def test_add_comment_sighting_not_found(client, monkeypatch):
-    monkeypatch.setattr(ufoSightings, "find_one", lambda query: None)
+    monkeypatch.setattr(ufoSightings, "update_one", lambda query, update: UpdateResult({"n": 0, "nModified": 0}, True))
     response = client.post("/sighting/000000000000000000000000/comment", json={"comment": "Test"})
     assert response.status_code == 404
 
 def test_add_comment_empty(client, monkeypatch):
     test_oid = ObjectId()
-    monkeypatch.setattr(ufoSightings, "find_one", lambda query: {"_id": test_oid})
     response = client.post(f"/sighting/{str(test_oid)}/comment", json={"comment": " "})
     assert response.status_code == 400
+    assert client.post(f"/sighting/{test_oid}/comment", json=["Test"]).status_code == 400
+    assert client.post(f"/sighting/{test_oid}/comment", json={"comment": 5}).status_code == 400
 
 def test_add_comment_valid(client, monkeypatch):
     test_oid = ObjectId()
-    monkeypatch.setattr(ufoSightings, "find_one", lambda query: {"_id": test_oid, "user_comments": []})
-    update_called = {"flag": False}
+    updates, inserts = [], []
     def fake_update_one(query, update):
-        update_called["flag"] = True
+        updates.append((query, update))
+        return UpdateResult({"n": 1, "nModified": 1}, True)
+    monkeypatch.setattr(ufoSightings, "find_one", lambda query: pytest.fail("comments need no existence check"))
     monkeypatch.setattr(ufoSightings, "update_one", fake_update_one)
+    monkeypatch.setattr(sightingComments, "insert_one", inserts.append)
     response = client.post(f"/sighting/{str(test_oid)}/comment", json={"comment": "Test comment"})
     data = response.get_json()
     assert response.status_code == 200
     assert data.get("success") is True
-    assert update_called["flag"] is True
+    # One conditional update keeps a count and only the latest comments on the sighting
+    assert updates == [({"_id": test_oid, "comment_count": {"$exists": True}}, {
+        "$inc": {"comment_count": 1},
+        "$push": {"user_comments": {"$each": ["Test comment"], "$slice": -5}}
+    })]
+    assert inserts[0]["sighting_id"] == test_oid
+    assert inserts[0]["comment"] == "Test comment"
+
+def test_add_comment_migrates_unmigrated_sighting(client, monkeypatch):
+    # A sighting from before the comments collection, with more comments than the preview keeps
+    legacy = [f"old {i}" for i in range(7)]
+    sighting = {"_id": ObjectId(), "user_comments": list(legacy)}
+    stored = []
+
+    def fake_find_one_and_update(query, update, projection):
+        # Claiming the sighting for the migration
+        if "comment_count" in sighting or "comments_migrating" in sighting:
+            return None
+        sighting.update(update["$set"])
+        return dict(sighting)
+
+    def fake_update_one(query, update):
+        if query.get("comment_count") == {"$exists": True} and "comment_count" not in sighting:
+            return UpdateResult({"n": 0, "nModified": 0}, True)
+        if "$set" in update:
+            assert sighting["comments_migrating"] == query["comments_migrating"]
+            sighting.update(update["$set"])
+            del sighting["comments_migrating"]
+        else:
+            sighting["comment_count"] += update["$inc"]["comment_count"]
+            push = update["$push"]["user_comments"]
+            sighting["user_comments"] = (sighting["user_comments"] + push["$each"])[push["$slice"]:]
+        return UpdateResult({"n": 1, "nModified": 1}, True)
+
+    monkeypatch.setattr(ufoSightings, "find_one_and_update", fake_find_one_and_update)
+    monkeypatch.setattr(ufoSightings, "update_one", fake_update_one)
+    monkeypatch.setattr(sightingComments, "delete_many", lambda query: None)
+    monkeypatch.setattr(sightingComments, "insert_many", stored.extend)
+    monkeypatch.setattr(sightingComments, "insert_one", stored.append)
+
+    response = client.post(f"/sighting/{sighting['_id']}/comment", json={"comment": "new"})
+    assert response.status_code == 200
+    assert sighting["comment_count"] == 8
+    assert sighting["user_comments"] == legacy[-4:] + ["new"]
+    assert [c["comment"] for c in stored] == legacy + ["new"]
+
+def test_get_comments_pages(client, monkeypatch):
+    sighting_id = ObjectId()
+    base = datetime.datetime(2025, 1, 1)
+    comments = [
+        {"_id": ObjectId(), "comment": f"c{i}", "created_at": base + datetime.timedelta(minutes=i)}
+        for i in range(25)
+    ]
+    queries = []
+    def fake_find(query, projection):
+        queries.append(query)
+        records = comments
+        if "$and" in query:
+            value = query["$and"][1]["$or"][0]["created_at"]["$lt"]
+            records = [c for c in comments if c["created_at"] < value]
+        return FakeCursor(list(records))
+    monkeypatch.setattr(sightingComments, "find", fake_find)
+    monkeypatch.setattr(sightingComments, "count_documents", lambda query: len(comments))
+
+    data = client.get(f"/sighting/{sighting_id}/comments").get_json()
+    assert queries[0] == {"sighting_id": sighting_id}
+    assert data["total"] == 25
+    assert [c["comment"] for c in data["data"]][:3] == ["c24", "c23", "c22"]
+    assert len(data["data"]) == 20
+
+    data = client.get(f"/sighting/{sighting_id}/comments?cursor={data['next_cursor']}").get_json()
+    assert [c["comment"] for c in data["data"]] == ["c4", "c3", "c2", "c1", "c0"]
+    assert data["next_cursor"] is None
+
+def test_get_comments_invalid(client):
+    assert client.get("/sighting/nope/comments").status_code == 400
+    assert client.get(f"/sighting/{ObjectId()}/comments?cursor=nope").status_code == 400
+
+def test_detail_comment_count_of_unmigrated_sighting(client, monkeypatch):
+    monkeypatch.setattr(ufoSightings, "find_one", lambda query: {"_id": query["_id"], "user_comments": ["a", "b"]})
+    data = client.get(f"/sighting/{ObjectId()}?images=url").get_json()
+    assert data["comment_count"] == 2
+    assert data["user_comments"] == ["a", "b"]
+
+class FakeGridOut(io.BytesIO):
+    def __init__(self, data, filename="disk_a.jpg"):
+        super().__init__(data)
+        self.length = len(data)
+        self.filename = filename
+        self.content_type = None
+
+def test_get_sighting_image_urls(client):
+    response = client.get(f"/sighting/{str(ObjectId())}?images=url")
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data["image_url"].startswith("/image/")
+    assert data["ufo_image_url"] is None
+    assert "image" not in data
+
+def test_get_sighting_invalid_images_mode(client):
+    response = client.get(f"/sighting/{str(ObjectId())}?images=inline")
+    assert response.status_code == 400
+
+def test_get_image(client, monkeypatch):
+    file_id = ObjectId()
+    monkeypatch.setattr(fs, "get", lambda oid: FakeGridOut(b"0123456789"))
+    response = client.get(f"/image/{file_id}")
+    assert response.status_code == 200
+    assert response.data == b"0123456789"
+    assert response.mimetype == "image/jpeg"
+    assert response.content_length == 10
+    assert response.get_etag() == (str(file_id), False)
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == 365 * 24 * 3600
+
+def test_get_image_range_request(client, monkeypatch):
+    monkeypatch.setattr(fs, "get", lambda oid: FakeGridOut(b"0123456789"))
+    response = client.get(f"/image/{ObjectId()}", headers={"Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert response.data == b"2345"
+    assert response.headers["Content-Range"] == "bytes 2-5/10"
+
+def test_get_image_not_modified(client, monkeypatch):
+    file_id = str(ObjectId())
+    monkeypatch.setattr(fs, "get", lambda oid: FakeGridOut(b"0123456789"))
+    response = client.get(f"/image/{file_id}", headers={"If-None-Match": f'"{file_id}"'})
+    assert response.status_code == 304
+
+def test_get_image_not_found(client, monkeypatch):
+    def missing(oid):
+        raise NoFile(oid)
+    monkeypatch.setattr(fs, "get", missing)
+    assert client.get(f"/image/{ObjectId()}").status_code == 404
+    assert client.get("/image/not-an-id").status_code == 400
+
+def test_batch_details_single_query_with_shared_images(client, monkeypatch):
+    state_img, ufo_img = ObjectId(), ObjectId()
+    ids = [ObjectId(), ObjectId(), ObjectId()]
+    queries = []
+
+    def fake_find(query, projection):
+        queries.append(query)
+        return [{
+            "_id": oid,
+            "city": "TestCity",
+            "image": state_img,
+            "ufo_image": ufo_img,
+            "location": {"coordinates": [-80.0, 40.0]}
+        } for oid in query["_id"]["$in"] if oid != ids[2]]
+
+    reads = []
+    def fake_fs_get(oid):
+        reads.append(oid)
+        return io.BytesIO(b"dummy_image_content")
+
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    monkeypatch.setattr(fs, "get", fake_fs_get)
+    response = client.post("/sightings/batch", json={"ids": [str(i) for i in ids]})
+    assert response.status_code == 200
+    data = response.get_json()
+
+    assert len(queries) == 1
+    assert sorted(reads) == sorted([state_img, ufo_img])
+    assert set(data["data"]) == {str(ids[0]), str(ids[1])}
+    assert data["missing"] == [str(ids[2])]
+    detail = data["data"][str(ids[0])]
+    assert detail["latitude"] == 40.0
+    assert base64.b64decode(data["images"][detail["image_id"]]) == b"dummy_image_content"
+    assert detail["ufo_image_id"] == str(ufo_img)
+
+def test_batch_details_image_urls(client, monkeypatch):
+    img = ObjectId()
+    monkeypatch.setattr(ufoSightings, "find", lambda query, projection: [{"_id": query["_id"]["$in"][0], "image": img}])
+    data = client.post("/sightings/batch", json={"ids": [str(ObjectId())], "images": "url"}).get_json()
+    assert data["images"] == {str(img): f"/image/{img}"}
+
+def test_batch_details_validation(client):
+    assert client.post("/sightings/batch", json={}).status_code == 400
+    assert client.post("/sightings/batch", json=[str(ObjectId())]).status_code == 400
+    assert client.post("/sightings/batch", json="ids").status_code == 400
+    assert client.post("/sightings/batch", data="not json").status_code == 400
+    assert client.post("/sightings/batch", json={"ids": ["nope"]}).status_code == 400
+    assert client.post("/sightings/batch", json={"ids": [str(ObjectId())] * 101}).status_code == 400
@@ -0,0 +1,130 @@
+import datetime
+import time
+import pytest
+from bson import ObjectId
+from backend.app import ufoSightings
+from backend.app import routes
+from .conftest import FakeCursor
+
+
+def sighting(city, state, shape, comments, coordinates, sighted_at=None):
+    return {
+        "_id": ObjectId(),
+        "city": city,
+        "state": state,
+        "country": "us",
+        "shape": shape,
+        "comments": comments,
+        "location": {"type": "Point", "coordinates": coordinates} if coordinates else None,
+        "sighted_at": sighted_at
+    }
+
+
+@pytest.fixture
+def snapshot(monkeypatch):
+    docs = [sighting("Rochester", "ny", "disk", "Bright disk over the lake", [-77.61, 43.16], datetime.datetime(2005, 7, 4, 21, 30))]
+    docs += [sighting("Rochester Hills", "mi", "light", f"Orange light {i}", [-83.15, 42.66]) for i in range(12)]
+    docs += [
+        sighting("Buffalo", "ny", "light", "Hovering lights", [-78.88, 42.89]),
+        sighting("Seattle", "wa", "triangle", "Black triangle", [-122.33, 47.61]),
+        sighting("Nowhere", "ny", "cigar", "No coordinates", None)
+    ]
+
+    def mongo(*args, **kwargs):
+        raise AssertionError("MongoDB should not be queried")
+
+    monkeypatch.setattr(ufoSightings, "find", lambda query, projection: FakeCursor(list(docs)))
+    routes.snapshot.build()
+    for method in ("find", "aggregate", "count_documents"):
+        monkeypatch.setattr(ufoSightings, method, mongo)
+    return docs
+
+
+def test_field_search_from_snapshot(client, snapshot):
+    data = client.get("/sightings/city/roch").get_json()
+    assert data["total"] == 13
+    assert len(data["data"]) == 10
+    assert data["data"][0] == routes.convert_to_str(snapshot[0])
+
+    assert client.get("/sightings/city/Rochester?match=exact").get_json()["total"] == 1
+    assert client.get("/sightings/city/rochester h?match=prefix").get_json()["total"] == 12
+    assert client.get("/sightings/state/NY?match=exact").get_json()["total"] == 3
+
+def test_keyword_and_regex_search_from_snapshot(client, snapshot):
+    assert client.get("/search_word?q=LIGHT").get_json()["total"] == 13
+    assert client.get("/search_word?q=^black").get_json()["total"] == 1
+    assert client.get("/sightings/comments/orange light 1[01]").get_json()["total"] == 2
+
+def test_snapshot_cursor_walks_every_match_once(client, snapshot):
+    first = client.get("/sightings/shape/light?fields=city").get_json()
+    second = client.get(f"/sightings/shape/light?cursor={first['next_cursor']}").get_json()
+    ids = [d["_id"] for d in first["data"] + second["data"]]
+    assert ids == [str(d["_id"]) for d in snapshot if d["shape"] == "light"]
+    assert first["data"][0].keys() == {"_id", "city"}
+    assert second["next_cursor"] is None
+
+def test_radius_search_from_snapshot(client, snapshot):
+    data = client.get("/search_nearby?lat=43&lon=-78&radius=100").get_json()
+    assert {d["city"] for d in data["data"]} == {"Rochester", "Buffalo"}
+
+    data = client.get("/search_nearby?lat=42.9&lon=-78.9&radius=300&order=distance").get_json()
+    assert data["total"] == 14
+    assert [d["city"] for d in data["data"][:2]] == ["Buffalo", "Rochester"]
+    assert data["data"][0]["distance_miles"] == pytest.approx(1.3, abs=0.1)
+
+    rest = client.get(f"/search_nearby?lat=42.9&lon=-78.9&radius=300&order=distance&cursor={data['next_cursor']}")
+    distances = [d["distance_miles"] for d in data["data"] + rest.get_json()["data"]]
+    assert len(distances) == 14 and distances == sorted(distances)
+
+def test_snapshot_returns_sighted_at(client, snapshot):
+    data = client.get("/sightings/shape/disk?fields=city,sighted_at").get_json()
+    assert data["data"][0]["city"] == "Rochester"
+    assert "2005" in data["data"][0]["sighted_at"]
+    data = client.get("/sightings/shape/cigar?fields=sighted_at").get_json()
+    assert data["data"][0]["sighted_at"] == "N/A"
+
+def test_unsupported_and_stale_queries_use_mongodb(client, snapshot, monkeypatch):
+    queries = []
+
+    def fake_find(query, projection):
+        queries.append(query)
+        return FakeCursor([])
+
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    monkeypatch.setattr(ufoSightings, "count_documents", lambda query, **kwargs: 0)
+    client.get("/search_viewport?bbox=-78,42,-77,43&total=estimate")
+    assert queries
+
+    monkeypatch.setattr(routes.snapshot, "max_staleness", 0)
+    time.sleep(0.01)
+    client.get("/sightings/city/roch?total=estimate")
+    assert queries[-1] == {"city": {"$regex": "roch", "$options": "i"}}
+
+def test_snapshot_file_round_trip(client, snapshot, tmp_path):
+    path = tmp_path / "sightings.npz"
+    routes.snapshot.save(path)
+    before = client.get("/search_word?q=light").get_json()
+    dated = client.get("/sightings/shape/disk?fields=sighted_at").get_json()
+    routes.snapshot.clear()
+    routes.snapshot.load(path)
+    assert client.get("/search_word?q=light").get_json() == before
+    assert client.get("/sightings/shape/disk?fields=sighted_at").get_json() == dated
+
+    stats = client.get("/snapshot/stats").get_json()
+    assert stats["rows"] == 16 and stats["serving"]
+    assert stats["bytes"] > 0
+
+def test_snapshot_saved_ahead_of_time_serves_until_rebuilt(client, snapshot, tmp_path, monkeypatch):
+    """A file written by save-snapshot long before startup still answers the first searches."""
+    path = tmp_path / "sightings.npz"
+    routes.snapshot._columns.built_at -= 86400
+    routes.snapshot.save(path)
+    routes.snapshot.clear()
+    routes.snapshot.load(path)
+    stats = client.get("/snapshot/stats").get_json()
+    assert stats["age_seconds"] > 86400 and stats["serving"]
+
+    # The first rebuild replaces it, and from then on built snapshots age as usual
+    monkeypatch.setattr(ufoSightings, "find", lambda query, projection: FakeCursor(list(snapshot)))
+    routes.snapshot.build()
+    assert routes.snapshot.stats()["age_seconds"] < 60
@@ -0,0 +1,212 @@
+import datetime
+import pytest
+from bson import ObjectId
+from backend.app import ufoSightings, routes
+from backend.app.stats import META_ID, SightingStats, merge_pipeline
+from .conftest import FakeCursor
+import db
+
+
+class FakeSummaries:
+    """Summary collection keeping the documents the stats module writes."""
+
+    def __init__(self, name="SightingStats", live=None):
+        self.name = name
+        self.live = live or self
+        self.docs = {}
+
+    @staticmethod
+    def _key(_id):
+        return repr(_id)
+
+    def find_one(self, query):
+        return self.docs.get(self._key(query["_id"]))
+
+    def find_one_and_update(self, query, update):
+        doc = self.find_one(query)
+        if doc is None or doc.get("last_id") != query["last_id"]:
+            return None
+        doc.update(update["$set"])
+        return doc
+
+    def insert_one(self, doc):
+        self.docs[self._key(doc["_id"])] = dict(doc)
+
+    def create_index(self, keys):
+        pass
+
+    def rename(self, name, dropTarget=False):
+        # A rebuild's staging collection replacing the summaries
+        assert name == self.live.name and dropTarget
+        self.live.docs = self.docs
+
+    def bulk_write(self, operations, ordered=True):
+        for op in operations:
+            _id = op._filter["_id"]
+            doc = self.docs.setdefault(self._key(_id), dict(op._doc["$setOnInsert"], _id=_id, count=0))
+            doc["count"] += op._doc["$inc"]["count"]
+
+    def merge(self, rollup, counts):
+        for key, count in counts.items():
+            _id = {"rollup": rollup, "key": dict(key)}
+            doc = self.docs.setdefault(self._key(_id), {"_id": _id, "rollup": rollup, "key": dict(key), "count": 0})
+            doc["count"] += count
+
+    def find(self, query, projection):
+        docs = [
+            d for d in self.docs.values()
+            if d.get("rollup") == query["rollup"] and d["count"] > 0
+            and all(d["key"].get(k[4:]) == v for k, v in query.items() if k.startswith("key."))
+        ]
+        return FakeCursor(docs)
+
+
+def sighting(shape, state, year):
+    return {
+        "_id": ObjectId(),
+        "shape": shape,
+        "state": state,
+        "country": "us",
+        "sighted_at": datetime.datetime(year, 7, 4) if year else None
+    }
+
+
+@pytest.fixture
+def summaries(monkeypatch):
+    docs = [sighting("light", "ny", 1999), sighting("light", "wa", 2005), sighting("disk", "ny", 2005)]
+    summaries = FakeSummaries()
+    collections = {summaries.name: summaries}
+    matches = []
+
+    class FakeDatabase:
+        def __getitem__(self, name):
+            return collections.setdefault(name, FakeSummaries(name, summaries))
+
+    def fake_find(query, projection):
+        # The newest _id lookup
+        return FakeCursor(list(docs))
+
+    def fake_aggregate(pipeline):
+        # Emulate a merge_pipeline() run over the sightings in its _id range
+        match = pipeline[0]["$match"]["_id"]
+        rollup = pipeline[-1]["$merge"] and pipeline[2]["$project"]["rollup"]["$literal"]
+        matches.append(match)
+        fields = list(pipeline[1]["$group"]["_id"])
+        counts = {}
+        for doc in docs:
+            if "$gt" in match and doc["_id"] <= match["$gt"] or doc["_id"] > match["$lte"]:
+                continue
+            values = dict(doc, year=doc["sighted_at"].year if doc["sighted_at"] else None)
+            key = tuple((field, values[field]) for field in fields)
+            counts[key] = counts.get(key, 0) + 1
+        collections[pipeline[-1]["$merge"]["into"]].merge(rollup, counts)
+        return iter([])
+
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    monkeypatch.setattr(ufoSightings, "aggregate", fake_aggregate)
+    monkeypatch.setattr(routes.sighting_stats, "_checked_at", 0.0)
+    for method in ("find", "find_one", "find_one_and_update", "insert_one", "bulk_write"):
+        monkeypatch.setattr(db.sightingStats, method, getattr(summaries, method))
+    monkeypatch.setattr(db.sightingStats, "database", FakeDatabase())
+    return docs, summaries, matches
+
+
+def test_merge_pipeline():
+    pipeline = merge_pipeline("state_year", {"_id": {"$gt": 1}})
+    assert pipeline[1]["$group"]["_id"] == {"state": {"$ifNull": ["$state", None]}, "year": {"$year": "$sighted_at"}}
+    merge = pipeline[-1]["$merge"]
+    assert merge["into"] == "SightingStats" and merge["on"] == "_id"
+    # Counts of keys already in the summary are added to, not replaced
+    assert merge["whenMatched"] == [{"$set": {"count": {"$add": ["$count", "$$new.count"]}}}]
+
+def test_stats_endpoint_builds_and_reads_rollups(client, summaries):
+    data = client.get("/stats/state").get_json()
+    assert data["fields"] == ["state"]
+    assert data["buckets"] == [{"state": "ny", "count": 2}, {"state": "wa", "count": 1}]
+    assert data["total"] == 3
+
+    data = client.get("/stats/state_shape?state=NY").get_json()
+    assert sorted((b["shape"], b["count"]) for b in data["buckets"]) == [("disk", 1), ("light", 1)]
+    assert client.get("/stats/year?year=2005").get_json()["total"] == 2
+
+def test_refresh_folds_in_only_new_sightings(summaries):
+    docs, store, matches = summaries
+    stats = SightingStats()
+    stats.refresh()
+    assert store.find_one({"_id": META_ID})["last_id"] == docs[-1]["_id"]
+
+    docs.append(sighting("light", "ny", 2010))
+    matches.clear()
+    assert stats.refresh() == (docs[2]["_id"], docs[3]["_id"])
+    assert all(match == {"$gt": docs[2]["_id"], "$lte": docs[3]["_id"]} for match in matches)
+    assert stats.rollup("shape") == [{"shape": "light", "count": 3}, {"shape": "disk", "count": 1}]
+
+    # Nothing new: no pipelines run
+    matches.clear()
+    assert stats.refresh() is None
+    assert matches == []
+
+def test_refresh_skips_synced_sightings(summaries):
+    docs, store, matches = summaries
+    stats = SightingStats()
+    stats.refresh()
+    del docs[:]
+    stats.rebuild()
+    # A sync inserts a loaded sighting (zero timestamp, ordered by hash) and counts it itself
+    synced = dict(sighting("disk", "wa", 2010), _id=ObjectId("00000000ffffffff00000000"))
+    docs.append(synced)
+    stats.update_many([(None, synced)])
+    matches.clear()
+    assert stats.refresh() is None
+    assert matches == []
+    assert stats.rollup("shape") == [{"shape": "disk", "count": 1}]
+
+def test_refresh_range_is_claimed_once(summaries, monkeypatch):
+    docs, store, matches = summaries
+    stats = SightingStats()
+    stats.refresh()
+    docs.append(sighting("disk", "wa", 2010))
+    # Another worker moved the high-water mark after this one read it
+    monkeypatch.setattr(db.sightingStats, "find_one_and_update", lambda query, update: None)
+    matches.clear()
+    assert stats.refresh() is None
+    assert matches == []
+
+def test_update_moves_counts(summaries):
+    docs, store, _ = summaries
+    stats = SightingStats()
+    stats.refresh()
+    old = docs[0]
+    new = dict(old, shape="disk")
+    # Only the rollups involving shape change
+    assert stats.update(old, new) == 6
+    assert stats.rollup("shape") == [{"shape": "disk", "count": 2}, {"shape": "light", "count": 1}]
+    assert stats.rollup("state") == [{"state": "ny", "count": 2}, {"state": "wa", "count": 1}]
+
+def test_update_many_counts_inserts_and_deletes(summaries):
+    docs, store, _ = summaries
+    stats = SightingStats()
+    stats.refresh()
+    stats.update_many([(None, sighting("disk", "wa", 2010)), (docs[1], None)])
+    assert stats.rollup("shape") == [{"shape": "disk", "count": 2}, {"shape": "light", "count": 1}]
+    assert stats.rollup("state") == [{"state": "ny", "count": 2}, {"state": "wa", "count": 1}]
+
+def test_overlapping_rebuilds_do_not_add_up(summaries, monkeypatch):
+    merge = ufoSightings.aggregate
+    others = []
+
+    def aggregate(pipeline):
+        if not others:
+            # Another worker starts its own rebuild while this one is merging
+            others.append(SightingStats())
+            others[0].rebuild()
+        return merge(pipeline)
+
+    monkeypatch.setattr(ufoSightings, "aggregate", aggregate)
+    stats = SightingStats()
+    stats.rebuild()
+    assert stats.rollup("state") == [{"state": "ny", "count": 2}, {"state": "wa", "count": 1}]
+
+def test_invalid_stats_requests(client, summaries):
+    assert client.get("/stats/color").status_code == 404
+    assert client.get("/stats/year?year=last").status_code == 400
@@ -0,0 +1,76 @@
+from bson import ObjectId
+from backend.app import ufoSightings
+
+
+def test_search_word_invalid_mode(client):
+    response = client.get("/search_word?q=test&mode=fuzzy")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+def test_search_word_explicit_substring_mode(client):
+    # mode=substring keeps the regex $or semantics (15 records in the fake collection)
+    data = client.get("/search_word?q=test&mode=substring").get_json()
+    assert data["total"] == 15
+    assert len(data["data"]) == 10
+
+def test_search_word_text_mode(client, monkeypatch):
+    captured = {}
+
+    def fake_aggregate(pipeline):
+        captured["pipeline"] = pipeline
+        docs = [{
+            "_id": ObjectId(),
+            "city": "Rochester",
+            "comments": "Bright lights hovering",
+            "country": "US",
+            "shape": "light",
+            "state": "NY",
+            "location": {"coordinates": [-77.6, 43.15]},
+            "score": 1.5 - i / 10
+        } for i in range(11)]
+        return iter([{"data": docs, "total": [{"count": 12}]}])
+
+    monkeypatch.setattr(ufoSightings, "aggregate", fake_aggregate)
+    response = client.get("/search_word?q=hovering&mode=text")
+    assert response.status_code == 200
+    data = response.get_json()
+
+    pipeline = captured["pipeline"]
+    assert pipeline[0] == {"$match": {"$text": {"$search": "hovering"}}}
+    assert pipeline[1] == {"$addFields": {"score": {"$meta": "textScore"}}}
+    assert pipeline[2] == {"$sort": {"score": -1, "_id": 1}}
+
+    assert data["total"] == 12
+    assert data["data"][0]["score"] == 1.5
+    # Relevance order is paged by offset only
+    assert data["next_cursor"] is None
+
+def test_search_word_text_mode_cached_total_sorts_by_score(client, monkeypatch):
+    captured = {}
+
+    class Cursor:
+        def sort(self, sort_params):
+            captured["sort"] = sort_params
+            return self
+
+        def skip(self, offset):
+            captured["skip"] = offset
+            return self
+
+        def limit(self, n):
+            return self
+
+        def __iter__(self):
+            return iter([])
+
+    def fake_find(query, projection):
+        captured["projection"] = projection
+        return Cursor()
+
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    monkeypatch.setattr(ufoSightings, "count_documents", lambda query, **kwargs: 3)
+    response = client.get("/search_word?q=hovering&mode=text&page=2&total=estimate")
+    assert response.status_code == 200
+    assert captured["sort"] == [("score", {"$meta": "textScore"}), ("_id", 1)]
+    assert captured["projection"]["score"] == {"$meta": "textScore"}
+    assert captured["skip"] == 10
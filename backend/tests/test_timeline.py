@@ -0,0 +1,69 @@
+import datetime
+from bson import ObjectId
+from backend.app import ufoSightings
+from backend.app.db import parse_sighting_datetime
+from .conftest import FakeCursor
+
+
+def test_parse_sighting_datetime():
+    assert parse_sighting_datetime("10/10/1949 20:30") == datetime.datetime(1949, 10, 10, 20, 30)
+    assert parse_sighting_datetime("1/2/2005 7:05") == datetime.datetime(2005, 1, 2, 7, 5)
+    # Midnight is written as 24:00 of the day before
+    assert parse_sighting_datetime("12/31/1999 24:00") == datetime.datetime(2000, 1, 1)
+    assert parse_sighting_datetime("unknown") is None
+    assert parse_sighting_datetime(None) is None
+
+def test_date_range_filter(client, monkeypatch):
+    queries = []
+    monkeypatch.setattr(ufoSightings, "find", lambda query, projection: queries.append(query) or FakeCursor([]))
+    monkeypatch.setattr(ufoSightings, "count_documents", lambda query: 0)
+
+    response = client.get("/sightings/shape/disk?from=1999&to=2000-06-30&page=1")
+    assert response.status_code == 200
+    assert queries[0]["$and"][1] == {"sighted_at": {
+        "$gte": datetime.datetime(1999, 1, 1),
+        "$lt": datetime.datetime(2000, 7, 1)
+    }}
+
+def test_sort_by_datetime(client, monkeypatch):
+    docs = [
+        {"_id": ObjectId(), "city": "a", "sighted_at": datetime.datetime(2001, 1, 1)},
+        {"_id": ObjectId(), "city": "b", "sighted_at": datetime.datetime(1999, 1, 1)},
+        {"_id": ObjectId(), "city": "c", "sighted_at": datetime.datetime(2005, 1, 1)}
+    ]
+    queries = []
+    monkeypatch.setattr(ufoSightings, "find", lambda query, projection: queries.append(query) or FakeCursor(list(docs)))
+    monkeypatch.setattr(ufoSightings, "count_documents", lambda query: len(docs))
+
+    data = client.get("/search_word?q=a&sort=-datetime&page=1&fields=city,sighted_at").get_json()
+    assert [d["city"] for d in data["data"]] == ["c", "a", "b"]
+    assert "2005" in data["data"][0]["sighted_at"]
+    # Undated sightings are left out of date-ordered results
+    assert {"sighted_at": {"$ne": None}} in queries[0]["$and"]
+
+def test_invalid_date_arguments(client):
+    assert client.get("/search_word?q=a&from=yesterday").status_code == 400
+    assert client.get("/search_word?q=a&sort=city").status_code == 400
+    assert client.get("/timeline?to=31/12/1999").status_code == 400
+    assert client.get("/timeline?by=week").status_code == 400
+
+def test_timeline(client, monkeypatch):
+    pipelines = []
+
+    def fake_aggregate(pipeline):
+        pipelines.append(pipeline)
+        return iter([{"bucket": 1999, "count": 3}, {"bucket": 2000, "count": 4}])
+    monkeypatch.setattr(ufoSightings, "aggregate", fake_aggregate)
+
+    data = client.get("/timeline?from=1999&shape=Disk").get_json()
+    assert data == {"by": "year", "buckets": [{"bucket": 1999, "count": 3}, {"bucket": 2000, "count": 4}], "total": 7}
+    assert pipelines[0][0] == {"$match": {"sighted_at": {"$gte": datetime.datetime(1999, 1, 1)}, "shape": "disk"}}
+    assert pipelines[0][1]["$group"]["_id"] == {"$year": "$sighted_at"}
+
+    # Repeated requests are answered from the cache
+    client.get("/timeline?from=1999&shape=disk")
+    assert len(pipelines) == 1
+
+    client.get("/timeline?by=hour")
+    assert pipelines[1][0] == {"$match": {"sighted_at": {"$ne": None}}}
+    assert pipelines[1][1]["$group"]["_id"] == {"$hour": "$sighted_at"}
@@ -0,0 +1,151 @@
+import re
+import threading
+import pytest
+from bson import ObjectId
+from backend.app import ufoSightings, sightingVersions
+from backend.app import routes
+from .conftest import FakeCursor
+
+COMMENTS = [
+    "Terrific bright light hovering over the lake",
+    "Two orange lights HOVERED then shot off",
+    "Black triangle, no sound",
+    "Cigar shaped object",
+    "Hover hover hover",
+    "TERRIFIC flash&#44 then nothing"
+]
+
+
+def matches(doc, query):
+    """Evaluate the query operators used by the routes and the trigram index."""
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "_id":
+            if "$in" in condition and doc["_id"] not in condition["$in"]:
+                return False
+            if "$gt" in condition and not doc["_id"] > condition["$gt"]:
+                return False
+        else:
+            value = doc.get(key)
+            flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+            if not isinstance(value, str) or not re.search(condition["$regex"], value, flags):
+                return False
+    return True
+
+
+@pytest.fixture
+def index(monkeypatch):
+    docs = [{
+        "_id": ObjectId(),
+        "comments": comment,
+        "city": city,
+        "state": "ny",
+        "shape": "light"
+    } for comment, city in zip(COMMENTS, ["Rochester", "Buffalo", "Ithaca", "Rochester", "Albany", 42])]
+
+    def fake_find(query, projection):
+        return FakeCursor([d for d in docs if matches(d, query)])
+
+    monkeypatch.setattr(ufoSightings, "find", fake_find)
+    monkeypatch.setattr(ufoSightings, "count_documents", lambda query: len([d for d in docs if matches(d, query)]))
+    routes.trigram_index.build()
+    return docs
+
+
+@pytest.mark.parametrize("keyword", ["terrific", "hover", "HOVER", "lights", "roch", "ches", "zzz", "light hov"])
+def test_narrowed_query_has_identical_results(index, keyword):
+    for field in ("comments", "city"):
+        query = {field: {"$regex": keyword, "$options": "i"}}
+        narrowed = routes.trigram_index.narrow(query)
+        assert narrowed != query
+        assert [d for d in index if matches(d, narrowed)] == [d for d in index if matches(d, query)]
+
+def test_candidates_are_narrowed(index):
+    narrowed = routes.trigram_index.narrow({"comments": {"$regex": "terrific", "$options": "i"}})
+    assert narrowed["$and"][0] == {"comments": {"$regex": "terrific", "$options": "i"}}
+    candidates = narrowed["$and"][1]["$or"][0]["_id"]["$in"]
+    assert candidates == [index[0]["_id"], index[5]["_id"]]
+    # Sightings inserted after the last refresh remain candidates
+    assert narrowed["$and"][1]["$or"][1] == {"_id": {"$gt": index[-1]["_id"]}}
+
+@pytest.mark.parametrize("condition", [
+    {"$regex": "ho", "$options": "i"},
+    {"$regex": "hover.*lake", "$options": "i"},
+    {"$regex": "hover", "$options": ""},
+    {"$regex": "café", "$options": "i"}
+])
+def test_patterns_are_not_narrowed(index, condition):
+    query = {"comments": condition}
+    assert routes.trigram_index.narrow(query) is query
+
+def test_search_word_narrows_every_leg(client, index):
+    response = client.get("/search_word?q=terrific")
+    assert response.status_code == 200
+    assert [d["_id"] for d in response.get_json()["data"]] == [str(index[0]["_id"]), str(index[5]["_id"])]
+
+    response = client.get("/sightings/comments/hover")
+    assert response.get_json()["total"] == 3
+
+def test_too_many_candidates(index, monkeypatch):
+    trigram_index = routes.trigram_index
+    monkeypatch.setattr(trigram_index, "max_candidates", 1)
+    query = {"comments": {"$regex": "hover", "$options": "i"}}
+    assert trigram_index.narrow(query) is query
+
+def test_load_triggers_rebuild(index, monkeypatch):
+    trigram_index = routes.trigram_index
+    query = {"comments": {"$regex": "glowing", "$options": "i"}}
+    assert [d for d in index if matches(d, trigram_index.narrow(query))] == []
+
+    # A dataset load writes sightings with ids below the last indexed one
+    index.insert(0, {"_id": ObjectId("000000000000000000000001"), "comments": "Glowing orb", "city": "Utica"})
+    monkeypatch.setattr(sightingVersions, "find_one", lambda query: {"_id": "sightings", "generation": 1})
+    monkeypatch.setattr(trigram_index, "refresh_interval", 0)
+    # The search that finds the index due starts a background rebuild instead of waiting for it
+    trigram_index.narrow(query)
+    trigram_index._refresh_thread.join(5)
+    narrowed = trigram_index.narrow(query)
+    trigram_index._refresh_thread.join(5)
+    assert [d["comments"] for d in index if matches(d, narrowed)] == ["Glowing orb"]
+
+def test_searches_use_the_old_index_during_a_rebuild(index):
+    trigram_index = routes.trigram_index
+    query = {"comments": {"$regex": "terrific", "$options": "i"}}
+    started, release = threading.Event(), threading.Event()
+
+    def slow_docs():
+        started.set()
+        release.wait(5)
+        yield {"_id": index[0]["_id"], "comments": "Glowing orb"}
+
+    rebuild = threading.Thread(target=trigram_index.build, args=(slow_docs(),))
+    rebuild.start()
+    try:
+        assert started.wait(5)
+        # Narrowed by the previous index without waiting for the rebuild
+        assert [d["_id"] for d in index if matches(d, trigram_index.narrow(query))] == [index[0]["_id"], index[5]["_id"]]
+    finally:
+        release.set()
+        rebuild.join()
+    assert trigram_index.stats()["rows"] == 1
+
+def test_narrow_leaves_refreshes_to_a_thread(index, monkeypatch):
+    """narrow() runs on the ASGI event loop, so it must not read MongoDB itself."""
+    trigram_index = routes.trigram_index
+    readers = []
+    monkeypatch.setattr(sightingVersions, "find_one", lambda query: readers.append(threading.current_thread()))
+    monkeypatch.setattr(trigram_index, "refresh_interval", 0)
+    trigram_index.narrow({"comments": {"$regex": "terrific", "$options": "i"}})
+    trigram_index._refresh_thread.join(5)
+    assert readers and threading.current_thread() not in readers
+
+def test_index_stats(index):
+    stats = routes.trigram_index.stats()
+    assert stats["rows"] == len(index)
+    assert stats["fields"]["comments"]["trigrams"] > 0
+    assert stats["fields"]["city"]["bytes"] > 0
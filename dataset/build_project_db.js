@@ -79,6 +79,37 @@ geoUFOColl.updateMany(
     },
     {
       $unset: ["longitude", "latitude"] // Remove original properties
+    },
+    {
+      // Lower-cased shadow copies so exact and prefix matches can use an index
+      $set: {
+        city_lc: { $toLower: "$city" },
+        state_lc: { $toLower: "$state" },
+        country_lc: { $toLower: "$country" },
+        shape_lc: { $toLower: "$shape" }
+      }
+    },
+    {
+      // The raw "M/D/YYYY H:MM" datetime as a BSON date ($dateFromParts rolls "24:00" over to the next day)
+      $set: {
+        sighted_at: {
+          $let: {
+            vars: {
+              date: { $split: [{ $arrayElemAt: [{ $split: [{ $toString: "$datetime" }, " "] }, 0] }, "/"] },
+              time: { $split: [{ $ifNull: [{ $arrayElemAt: [{ $split: [{ $toString: "$datetime" }, " "] }, 1] }, "0:00"] }, ":"] }
+            },
+            in: {
+              $dateFromParts: {
+                year: { $convert: { input: { $arrayElemAt: ["$$date", 2] }, to: "int", onError: null, onNull: null } },
+                month: { $convert: { input: { $arrayElemAt: ["$$date", 0] }, to: "int", onError: 1, onNull: 1 } },
+                day: { $convert: { input: { $arrayElemAt: ["$$date", 1] }, to: "int", onError: 1, onNull: 1 } },
+                hour: { $convert: { input: { $arrayElemAt: ["$$time", 0] }, to: "int", onError: 0, onNull: 0 } },
+                minute: { $convert: { input: { $arrayElemAt: ["$$time", 1] }, to: "int", onError: 0, onNull: 0 } }
+              }
+            }
+          }
+        }
+      }
     }
   ]
 );
@@ -91,6 +122,13 @@ geoUFOColl.createIndex({ location: "2dsphere" });
 geoUFOColl.createIndex({ city: 1 });       // Add index on city column
 geoUFOColl.createIndex({ state: 1 });      // Add index on state column
 geoUFOColl.createIndex({ country: 1 });    // Add index on country column
+geoUFOColl.createIndex({ shape: 1 });      // Add index on shape column
+geoUFOColl.createIndex({ city_lc: 1 });    // Indexes for exact/prefix matching on the shadow fields
+geoUFOColl.createIndex({ state_lc: 1 });
+geoUFOColl.createIndex({ country_lc: 1 });
+geoUFOColl.createIndex({ shape_lc: 1 });
+geoUFOColl.createIndex({ sighted_at: 1 });           // Date-range filters, sort=datetime and /timeline
+geoUFOColl.createIndex({ shape: 1, sighted_at: 1 }); // /timeline?shape=
 
 print("\nIndexes:");
 printjson(geoUFOColl.getIndexes());